@@ -0,0 +1,312 @@
+"""阈值告警：声明式规则，随每次快照增量判断（每条规则每个节拍 O(1)，不回看历史）
+
+规则写法（一行一条，# 开头为注释）：
+
+    序列 比较 阈值 [for 持续时间] [clear 恢复阈值] [warning|critical] [notify] [run "命令"]
+
+    cpu > 90 for 30s clear 80 critical notify
+    disk.write > 500MB for 5s
+    mem >= 85 for 1m clear 80 run "logger -t notos 内存告警"
+    cpu_temp > 90 notify
+
+序列名与历史记录相同（cpu、mem、net.recv、disk.write ...）。阈值可以带 K/M/G（按 1024）
+或 %；持续时间可以用 ms/s/m/h。clear 是回差：越过阈值并持续足够久后开始告警，直到数值
+回到恢复阈值的另一侧才解除，避免在阈值附近来回跳。
+
+    python main_v1.2.py --alert "cpu > 90 for 30s clear 80" --alerts ~/.notos_alerts
+"""
+import os
+import sys
+from types import MappingProxyType
+
+WARNING = 'warning'
+CRITICAL = 'critical'
+LEVELS = (WARNING, CRITICAL)
+
+# 比较符 -> (是否越过阈值, 是否回到恢复阈值另一侧)
+OPERATORS = {
+    '>': (lambda v, t: v > t, lambda v, c: v <= c),
+    '>=': (lambda v, t: v >= t, lambda v, c: v < c),
+    '<': (lambda v, t: v < t, lambda v, c: v >= c),
+    '<=': (lambda v, t: v <= t, lambda v, c: v > c),
+}
+
+SIZE_SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+DURATION_SUFFIXES = (('ms', 0.001), ('s', 1), ('m', 60), ('h', 3600))
+
+
+def parse_number(text):
+    """'90'、'90%'、'500MB'、'1.5G'、'500MB/s' -> 浮点数"""
+    upper = text.upper()
+    for unit in ('/S', 'B', '%'):
+        if upper.endswith(unit):
+            upper = upper[:-len(unit)]
+    suffix = upper[-1:] if upper[-1:] in SIZE_SUFFIXES else ''
+    number = upper[:-1] if suffix else upper
+    return float(number) * SIZE_SUFFIXES[suffix]
+
+
+def parse_duration(text):
+    """'30s'、'1m'、'500ms'、'2h'、'10'（秒）-> 秒数"""
+    for suffix, scale in DURATION_SUFFIXES:
+        if text.endswith(suffix) and not (suffix == 's' and text.endswith('ms')):
+            return float(text[:-len(suffix)]) * scale
+    return float(text)
+
+
+class AlertRule:
+    """一条规则及其判断状态"""
+
+    def __init__(self, text, series, operator, threshold, duration=0.0, clear=None,
+                 level=WARNING, notify=False, command=None):
+        self.text = text
+        self.series = series
+        self.provider = series.partition('.')[0]
+        self.operator = operator
+        self.threshold = threshold
+        self.duration = duration
+        self.clear = threshold if clear is None else clear
+        self.level = level
+        self.notify = notify
+        self.command = command
+        self.exceeds, self.recovered = OPERATORS[operator]
+
+        self.since = None  # 开始越过阈值的时间（尚未告警）
+        self.firing = False
+        self.value = None
+
+    def update(self, timestamp, value):
+        """用最新的数值推进状态，状态变化（开始/解除告警）时返回 True"""
+        self.value = value
+        if self.firing:
+            if self.recovered(value, self.clear):
+                self.firing = False
+                self.since = None
+                return True
+            return False
+        if not self.exceeds(value, self.threshold):
+            self.since = None
+            return False
+        if self.since is None:
+            self.since = timestamp
+        if timestamp - self.since >= self.duration:
+            self.firing = True
+            return True
+        return False
+
+    def __repr__(self):
+        return f"AlertRule({self.text!r})"
+
+
+def parse_rule(text):
+    """解析一行规则，格式错误时抛 ValueError"""
+    import shlex
+
+    try:
+        tokens = shlex.split(text, comments=True)
+    except ValueError as e:
+        raise ValueError(f"无法解析告警规则 {text!r}: {e}")
+    if len(tokens) < 3 or tokens[1] not in OPERATORS:
+        raise ValueError(f"告警规则应为 '序列 比较 阈值 ...'，比较符为 {'/'.join(OPERATORS)}: {text!r}")
+
+    options = {}
+    rest = iter(tokens[3:])
+    try:
+        threshold = parse_number(tokens[2])
+        for token in rest:
+            if token == 'for':
+                options['duration'] = parse_duration(next(rest))
+            elif token == 'clear':
+                options['clear'] = parse_number(next(rest))
+            elif token in LEVELS:
+                options['level'] = token
+            elif token == 'notify':
+                options['notify'] = True
+            elif token == 'run':
+                options['command'] = next(rest)
+            else:
+                raise ValueError(f"未知的选项 {token!r}")
+    except StopIteration:
+        raise ValueError(f"告警规则 {text!r} 的最后一个选项缺少参数")
+    except ValueError as e:
+        raise ValueError(f"告警规则 {text!r} 有误: {e}")
+    return AlertRule(text.strip(), tokens[0], tokens[1], threshold, **options)
+
+
+def load_rules(texts=(), paths=()):
+    """从命令行文本和规则文件中读取全部规则"""
+    rules = [parse_rule(text) for text in texts]
+    for path in paths:
+        with open(os.path.expanduser(path), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    rules.append(parse_rule(line))
+    return rules
+
+
+# Windows 上用 PowerShell 弹出 Toast 通知。借用 PowerShell 自己的 AppUserModelID，不需要
+# 安装快捷方式或第三方模块；标题和内容通过环境变量传进去，不用处理命令行转义
+WINDOWS_TOAST_SCRIPT = """
+$manager = [Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime]
+$template = $manager::GetTemplateContent([Windows.UI.Notifications.ToastTemplateType]::ToastText02)
+$texts = $template.GetElementsByTagName('text')
+[void]$texts.Item(0).AppendChild($template.CreateTextNode($env:NOTOS_NOTIFY_TITLE))
+[void]$texts.Item(1).AppendChild($template.CreateTextNode($env:NOTOS_NOTIFY_MESSAGE))
+$toast = [Windows.UI.Notifications.ToastNotification]::new($template)
+$manager::CreateToastNotifier('{1AC14E77-02E7-4E5D-B744-2EB1AE5198B7}\\WindowsPowerShell\\v1.0\\powershell.exe').Show($toast)
+"""
+
+
+def desktop_notify(title, message):
+    """发送桌面通知（Linux 用 notify-send，macOS 用 osascript，Windows 用 PowerShell 的 Toast），
+    发不出去时返回 False"""
+    # 界面启动时总会导入本模块（注册命令行参数），subprocess 等只在真正发通知时才导入
+    import json
+    import shutil
+    import subprocess
+
+    env = None
+    creationflags = 0
+    try:
+        if sys.platform == 'darwin':
+            # AppleScript 的字符串字面量与 JSON 的转义规则兼容
+            script = f"display notification {json.dumps(message)} with title {json.dumps(title)}"
+            command = ['osascript', '-e', script]
+        elif os.name == 'nt':
+            # 只有 Windows PowerShell（5.x）能直接加载 WinRT 类型，PowerShell 7 的 pwsh 不行
+            powershell = shutil.which('powershell')
+            if powershell is None:
+                return False
+            command = [powershell, '-NoProfile', '-NonInteractive', '-Command', WINDOWS_TOAST_SCRIPT]
+            env = dict(os.environ, NOTOS_NOTIFY_TITLE=title, NOTOS_NOTIFY_MESSAGE=message)
+            creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        elif shutil.which('notify-send'):
+            command = ['notify-send', '-a', 'NotosIsland', title, message]
+        else:
+            return False
+        subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, env=env, creationflags=creationflags)
+        return True
+    except OSError:
+        return False
+
+
+class AlertEngine:
+    """按序列分组保存规则；每个快照只查看有规则的序列，每条规则 O(1)"""
+
+    def __init__(self, rules, providers, notifier=desktop_notify, instruments=None):
+        self.rules = list(rules)
+        self.providers = list(providers)
+        self.notifier = notifier
+        self.instruments = instruments
+        known = set()
+        for provider in self.providers:
+            if provider.fields:
+                known.update(f"{provider.name}.{field}" for field in provider.fields)
+            else:
+                known.add(provider.name)
+        unknown = sorted({rule.series for rule in self.rules} - known)
+        if unknown:
+            raise ValueError(f"告警规则中的序列不存在（或对应的指标未启用）: {', '.join(unknown)}")
+
+        self.by_series = {}
+        for rule in self.rules:
+            self.by_series.setdefault(rule.series, []).append(rule)
+        # 只展开有规则的提供者
+        watched = {rule.provider for rule in self.rules}
+        self.watched = [p for p in self.providers if p.name in watched]
+
+        self.firing = set()
+        self.firing_rules = ()  # 正在告警的规则（按文字排序），整体替换，其他线程可以直接读取
+        # 各指标当前最高的告警级别，整体替换，界面线程读取时不需要加锁
+        self.active = MappingProxyType({})
+        self.events = 0
+        self.processes = []  # 尚未结束的钩子命令
+
+    def evaluate(self, timestamp, values):
+        """用一次快照的原始数值推进所有规则，返回本次状态变化的规则列表"""
+        changed = []
+        for provider in self.watched:
+            for series, value in provider.series(values.get(provider.name)):
+                rules = self.by_series.get(series)
+                if rules is None:
+                    continue
+                for rule in rules:
+                    if rule.update(timestamp, value):
+                        changed.append(rule)
+        if changed:
+            for rule in changed:
+                if rule.firing:
+                    self.firing.add(rule)
+                else:
+                    self.firing.discard(rule)
+            active = {}
+            for rule in self.firing:
+                if active.get(rule.provider) != CRITICAL:
+                    active[rule.provider] = rule.level
+            self.active = MappingProxyType(active)
+            self.firing_rules = tuple(sorted(self.firing, key=lambda rule: rule.text))
+            self.events += len(changed)
+            for rule in changed:
+                self.dispatch(rule)
+        if self.processes:
+            self.processes = [p for p in self.processes if p.poll() is None]
+        return changed
+
+    def dispatch(self, rule):
+        """告警开始/解除时发通知、运行钩子命令（都不等待完成）"""
+        state = "告警" if rule.firing else "解除"
+        message = f"{rule.text}（当前 {rule.value:g}）"
+        if rule.notify and self.notifier is not None:
+            try:
+                if not self.notifier(f"NotosIsland {state}", message):
+                    self.report("alerts.notify", RuntimeError("没有可用的桌面通知程序或无法启动"))
+            except Exception as e:
+                # 通知失败不能影响规则判断和钩子命令
+                self.report("alerts.notify", e)
+        if rule.command:
+            import subprocess
+
+            env = dict(os.environ, NOTOS_ALERT_RULE=rule.text, NOTOS_ALERT_SERIES=rule.series,
+                       NOTOS_ALERT_VALUE=repr(rule.value), NOTOS_ALERT_LEVEL=rule.level,
+                       NOTOS_ALERT_STATE='firing' if rule.firing else 'resolved')
+            try:
+                self.processes.append(subprocess.Popen(rule.command, shell=True, env=env,
+                                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL))
+            except OSError as e:
+                self.report("alerts.command", OSError(f"无法运行告警命令 {rule.command!r}: {e}"))
+
+    def report(self, where, error):
+        """有 Instrumentation 时记进诊断数据，否则输出到 stderr"""
+        if self.instruments is not None:
+            self.instruments.record_error(where, error)
+        else:
+            print(error, file=sys.stderr)
+
+    def describe(self, provider_name):
+        """某个指标上正在告警的规则（悬停提示用）"""
+        return [rule.text for rule in self.firing_rules if rule.provider == provider_name]
+
+    def publisher(self, callback):
+        """包装采集线程的回调：先判断规则，再交给原来的回调"""
+        def publish(snapshot):
+            self.evaluate(snapshot.timestamp, snapshot.values)
+            callback(snapshot)
+        return publish
+
+
+def add_alert_arguments(parser):
+    parser.add_argument('--alert', action='append', default=[], metavar='RULE',
+                        help="告警规则，可重复，例如 \"cpu > 90 for 30s clear 80 critical notify\"；"
+                             "notify 在 Linux 上用 notify-send，macOS 上用 osascript，Windows 上用 PowerShell 弹出通知")
+    parser.add_argument('--alerts', action='append', default=[], metavar='FILE',
+                        help="告警规则文件，每行一条")
+
+
+def create_engine(args, providers, notifier=desktop_notify):
+    """按命令行参数创建告警引擎，没有规则时返回 None；规则有误时抛 ValueError/OSError"""
+    rules = load_rules(args.alert, args.alerts)
+    if not rules:
+        return None
+    return AlertEngine(rules, providers, notifier=notifier)
@@ -0,0 +1,121 @@
+"""系统计数器的读取后端：默认使用 psutil，Linux 上可以换成直接读 /proc 的 procfs 后端
+
+    python main_v1.2.py --backend procfs
+"""
+import os
+
+psutil = None  # 第一次用到时由 load_psutil 导入（导入要几十毫秒，不放在窗口显示之前）
+
+
+def load_psutil():
+    """导入并返回 psutil 模块；基准测试会事先把 backends.psutil 换成假的"""
+    global psutil
+    if psutil is None:
+        import psutil as module
+
+        psutil = module
+    return psutil
+
+
+class WholeDisks:
+    """判断磁盘名是不是整块磁盘（/sys/block 下有对应目录），分区（sda1、nvme0n1p2）不是；结果按名称缓存
+
+    分区的读写已经计入所在的磁盘，一起统计会让总数翻倍。
+    """
+
+    def __init__(self, sys_block='/sys/block'):
+        self.sys_block = sys_block
+        self._cache = {}
+
+    def __call__(self, name):
+        whole = self._cache.get(name)
+        if whole is None:
+            whole = self._cache[name] = os.path.exists(os.path.join(self.sys_block, name.replace('/', '!')))
+        return whole
+
+
+class PsutilBackend:
+    """通过 psutil 读取（所有平台可用）"""
+
+    name = 'psutil'
+    # 按设备计数器中两个字节数字段的名称；procfs 后端直接返回 (a, b) 元组，对应 None
+    fields = {
+        'net': ('bytes_recv', 'bytes_sent'),
+        'disk': ('read_bytes', 'write_bytes'),
+    }
+
+    def __init__(self):
+        # perdisk=True 时 psutil 不过滤分区（Linux 上会把 sda 和 sda1 都列出来），这里自己去掉；
+        # 其他平台列出的本来就是整块磁盘
+        self.whole_disks = WholeDisks() if os.path.isdir('/sys/block') else None
+
+    def cpu_percent(self):
+        return load_psutil().cpu_percent()
+
+    def cpu_times_percpu(self):
+        """各逻辑 CPU 的累计时间：(总时间列表, 空闲时间列表)，差值由调用方计算"""
+        totals = []
+        idles = []
+        for times in load_psutil().cpu_times(percpu=True):
+            # guest/guest_nice 已经包含在 user/nice 中（Linux），不能重复计算
+            totals.append(sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0))
+            idles.append(times.idle + getattr(times, 'iowait', 0))
+        return totals, idles
+
+    def memory_percent(self):
+        return load_psutil().virtual_memory().percent
+
+    def net_counters(self):
+        """{网卡名: 计数器}"""
+        return load_psutil().net_io_counters(pernic=True)
+
+    def disk_counters(self):
+        """{磁盘名: 计数器}，只包含整块磁盘，不包含分区"""
+        counters = load_psutil().disk_io_counters(perdisk=True)
+        if self.whole_disks is None:
+            return counters
+        whole_disks = self.whole_disks
+        return {name: counter for name, counter in counters.items() if whole_disks(name)}
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    'psutil': PsutilBackend,
+    'procfs': 'procfs:ProcfsBackend',
+}
+
+current = PsutilBackend()
+
+
+def create(name):
+    """按名称创建后端，procfs 在非 Linux 上会抛 OSError"""
+    spec = BACKENDS[name]
+    if isinstance(spec, str):
+        import importlib
+
+        module_name, class_name = spec.split(':')
+        spec = getattr(importlib.import_module(module_name), class_name)
+    return spec()
+
+
+def select(name):
+    """切换当前后端（在创建指标提供者之前调用），auto 表示 Linux 上优先 procfs"""
+    global current
+    if name == 'auto':
+        try:
+            backend = create('procfs')
+        except OSError:
+            backend = PsutilBackend()
+    else:
+        backend = create(name)
+    current.close()
+    current = backend
+    return current
+
+
+def add_backend_argument(parser):
+    parser.add_argument('--backend', choices=['psutil', 'procfs', 'auto'], default='psutil',
+                        help="系统计数器的读取方式：psutil（默认）、procfs（仅 Linux，直接读 /proc）、"
+                             "auto（Linux 上用 procfs）")
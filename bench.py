@@ -0,0 +1,519 @@
+"""性能基准：测量采样和界面绘制热点路径的耗时与内存分配
+
+使用固定数据的假 psutil 和假GPU数据源，结果与本机硬件状态无关，在没有GPU的 Linux 上也能复现；
+界面部分使用 Qt 的 offscreen 平台，不需要显示器。
+
+    python bench.py                     # 运行并与基线比较
+    python bench.py --save-baseline     # 把每次调用的分配字节数保存为基线（随仓库提交）
+    python bench.py --save-timings      # 把本机的耗时保存下来，以后在本机运行时一起比较
+    python bench.py --only format_speed,paint
+    python bench.py --only startup      # 启动耗时：导入、构造窗口、第一次绘制、第一次显示数据
+"""
+import argparse
+import atexit
+import gc
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import alerts
+import backends
+import devices
+from collector import MetricCollector
+from exporter import render
+from health import OK
+from providers import REGISTRY, format_speed, names_list
+from scheduler import HEADLESS, SamplingScheduler
+from store import series_names
+
+REAL_PSUTIL = backends.load_psutil()
+HERE = os.path.dirname(os.path.abspath(__file__))
+# 随仓库提交的基线只有分配字节数：它与机器快慢无关，换一台机器也能直接比较
+DEFAULT_BASELINE = os.path.join(HERE, 'bench_baseline.json')
+# 耗时只在同一台机器上有意义，只和本机记录的结果比较（不提交）
+DEFAULT_TIMINGS = os.path.join(HERE, 'bench_timings.local.json')
+
+# 单项基准的结果（耗时单位为微秒，alloc 为每次调用的临时分配字节数）
+Result = namedtuple('Result', ['name', 'runs', 'p50', 'p99', 'mean', 'alloc'])
+
+
+class FakeCounters:
+    """按固定步长递增的计数器，模拟 psutil 的 namedtuple"""
+
+    def __init__(self, **steps):
+        self.steps = steps
+        self.type = namedtuple('counters', steps)
+        self.ticks = 0
+
+    def __call__(self, *args, **kwargs):
+        self.ticks += 1
+        return self.type(*(step * self.ticks for step in self.steps.values()))
+
+
+class FakeDeviceCounters:
+    """按设备的计数器（pernic=True / perdisk=True），第 i 个设备的步长是基础步长的 i+1 倍"""
+
+    def __init__(self, names, **steps):
+        self.counters = FakeCounters(**steps)
+        self.names = names
+
+    def __call__(self, *args, **kwargs):
+        total = self.counters()
+        return {name: self.counters.type(*(value * (i + 1) for value in total))
+                for i, name in enumerate(self.names)}
+
+
+class FakeProcess:
+    __slots__ = ('pid', 'info')
+
+    def __init__(self, pid, info):
+        self.pid = pid
+        self.info = info
+
+    def name(self):
+        return f"proc{self.pid}"
+
+
+class FakeProcessIter:
+    """固定数量的进程，每次遍历所有进程的 CPU 时间和 I/O 都前进一步"""
+
+    cputimes = namedtuple('pcputimes', ['user', 'system'])
+    meminfo = namedtuple('pmem', ['rss', 'vms'])
+    pio = namedtuple('pio', ['read_count', 'write_count', 'read_bytes', 'write_bytes'])
+
+    def __init__(self, count):
+        self.ticks = 0
+        self.processes = [
+            FakeProcess(pid, {'create_time': 1000.0 + pid, 'memory_info': self.meminfo(pid << 16, pid << 17)})
+            for pid in range(1, count + 1)
+        ]
+
+    def __call__(self, attrs=None, ad_value=None):
+        self.ticks += 1
+        cpu_times = self.cputimes(0.05 * self.ticks, 0.01 * self.ticks)
+        io = self.pio(self.ticks, self.ticks, 4096 * self.ticks, 8192 * self.ticks)
+        for proc in self.processes:
+            proc.info['cpu_times'] = cpu_times
+            proc.info['io_counters'] = io
+            yield proc
+
+
+class FakePsutil:
+    """只实现指标提供者用到的接口，返回可复现的数据
+
+    网卡模拟一台跑着几百个容器的主机：两块物理网卡、回环和 200 个 veth，进程有 5000 个。
+    """
+
+    svmem = namedtuple('svmem', ['total', 'available', 'percent', 'used', 'free'])
+    scputimes = namedtuple('scputimes', ['user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq',
+                                         'steal', 'guest', 'guest_nice'])
+    cpu_count = 256  # 按核心的指标按一台 256 个逻辑 CPU 的机器测
+
+    def __init__(self):
+        nics = ['eth0', 'wlan0', 'lo', 'docker0'] + [f'veth{i:03d}' for i in range(200)]
+        self.net_io_counters = FakeDeviceCounters(nics, bytes_sent=12345, bytes_recv=1234567,
+                                                  packets_sent=10, packets_recv=900)
+        disks = ['nvme0n1', 'sda', 'dm-0', 'loop0']
+        self.disk_io_counters = FakeDeviceCounters(disks, read_bytes=4096 * 25, write_bytes=4096 * 300,
+                                                   read_count=25, write_count=300)
+        self.process_iter = FakeProcessIter(5000)
+        self.Error = Exception
+        self._cpu = 0
+
+    def cpu_percent(self, interval=None, percpu=False):
+        self._cpu = (self._cpu + 7) % 100
+        return float(self._cpu)
+
+    def cpu_times(self, percpu=False):
+        # 第 i 个核心每次前进 i % 100 个百分点的忙碌时间
+        self._ticks = getattr(self, '_ticks', 0) + 1
+        t = self._ticks
+        return [self.scputimes(0.01 * t * (i % 100), 0.0, 0.0, 0.01 * t * (100 - i % 100), 0.0, 0.0, 0.0,
+                               0.0, 0.0, 0.0) for i in range(self.cpu_count if percpu else 1)]
+
+    def virtual_memory(self):
+        return self.svmem(16 << 30, 8 << 30, 50.0, 8 << 30, 8 << 30)
+
+
+class FakeGpuSource:
+    """固定两块GPU的数据源"""
+
+    def read(self):
+        return [(37.0, 55.0), (63.0, 61.0)]
+
+    def health_state(self):
+        return OK, "bench: 假GPU数据"
+
+
+def make_fake_sysfs(path):
+    """一棵假的 sysfs：coretemp 的整颗CPU温度 + 8 个核心温度，再加一个 ACPI thermal zone"""
+    hwmon = os.path.join(path, 'sys', 'class', 'hwmon', 'hwmon0')
+    zone = os.path.join(path, 'sys', 'class', 'thermal', 'thermal_zone0')
+    os.makedirs(hwmon)
+    os.makedirs(zone)
+    files = {
+        os.path.join(hwmon, 'name'): 'coretemp',
+        os.path.join(hwmon, 'temp1_label'): 'Package id 0',
+        os.path.join(hwmon, 'temp1_input'): '61000',
+        os.path.join(zone, 'type'): 'acpitz',
+        os.path.join(zone, 'temp'): '40000',
+    }
+    for core in range(8):
+        files[os.path.join(hwmon, f'temp{core + 2}_label')] = f'Core {core}'
+        files[os.path.join(hwmon, f'temp{core + 2}_input')] = str(55000 + core * 500)
+    for file_path, text in files.items():
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+def make_fake_proc(path, cpus=256):
+    """procfs 后端用到的四个文件，/proc/stat 中有 cpus 个核心和一行很长的中断统计"""
+    os.makedirs(os.path.join(path, 'net'))
+    lines = ["cpu  " + " ".join(str(v * cpus) for v in (4705, 150, 1120, 1664416, 1120, 0, 180, 0, 0, 0))]
+    for cpu in range(cpus):
+        lines.append(f"cpu{cpu} " + " ".join(str(v + cpu) for v in (4705, 150, 1120, 1664416, 1120, 0, 180, 0, 0, 0)))
+    lines.append("intr 1234567 " + " ".join("0" for _ in range(4000)))
+    lines.append("ctxt 123456789")
+    files = {
+        'stat': "\n".join(lines),
+        'meminfo': "MemTotal:       16384000 kB\nMemFree:         8000000 kB\nMemAvailable:    8192000 kB",
+        'net/dev': "Inter-|   Receive\n face |bytes\n  eth0: 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16",
+        'diskstats': "   8       0 sda 1 2 3 4 5 6 7 8 9 10 11",
+    }
+    for name, text in files.items():
+        with open(os.path.join(path, name), 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+def install_fakes():
+    """把提供者用到的 psutil、GPU 数据源和温度传感器替换成假的"""
+    backends.psutil = FakePsutil()
+    # 假磁盘名在本机的 /sys/block 下不存在，不做整块磁盘的判断
+    backends.current.whole_disks = None
+    sysfs = tempfile.mkdtemp(prefix='notos_bench_sysfs_')
+    atexit.register(shutil.rmtree, sysfs, ignore_errors=True)
+    make_fake_sysfs(sysfs)
+    os.environ['NOTOS_SYSFS_ROOT'] = sysfs
+    # 每次调用都重新读取计数器，而不是命中同一轮的缓存
+    devices.CounterReader.cache_time = 0
+
+    from gpu_providers import GpuUsageProvider, GpuTempProvider
+
+    def fake_open(self):
+        self.source = FakeGpuSource()
+
+    def fake_close(self):
+        self.source = None
+
+    for cls in (GpuUsageProvider, GpuTempProvider):
+        fake = type('Bench' + cls.__name__, (cls,), {'open': fake_open, 'close': fake_close})
+        REGISTRY.register(cls.name, fake)
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(name, func, runs, warmup=20):
+    """测量 func 的耗时分布和每次调用的临时内存分配"""
+    for _ in range(warmup):
+        func()
+
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timings = []
+        clock = time.perf_counter_ns
+        for _ in range(runs):
+            start = clock()
+            func()
+            timings.append((clock() - start) / 1000.0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # 内存分配单独测一轮，避免 tracemalloc 的开销影响耗时
+    alloc_runs = max(runs // 10, 10)
+    tracemalloc.start()
+    total = 0
+    for _ in range(alloc_runs):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    timings.sort()
+    return Result(name, runs, percentile(timings, 0.5), percentile(timings, 0.99),
+                  sum(timings) / len(timings), total / alloc_runs)
+
+
+def sampling_benchmarks(runs):
+    """采集线程中的热点：每个提供者的采样 + 一整轮采样
+
+    基准组是生成器，逐个给出 (名称, 函数, 次数)，由调用方决定是否测量。
+    """
+    collector = full_collector()
+    for provider in collector.providers:
+        provider.health.reset()
+        yield f"sample.{provider.name}", lambda p=provider: collector.sample_provider(p, time.monotonic()), runs
+    yield "sample.all", lambda: full_sample(collector), runs
+    snapshot = full_sample(collector)
+    yield "exporter.render", lambda: render(snapshot, collector.providers), runs
+    engine = alert_engine(collector.providers)
+    yield "alerts.evaluate", lambda: engine.evaluate(snapshot.timestamp, snapshot.values), runs
+    yield "format_speed", lambda: (format_speed(512), format_speed(123456), format_speed(98765432)), runs
+    collector.close()
+
+
+def alert_engine(providers, count=300):
+    """几百条规则（各序列轮流、带持续时间和回差），不发通知"""
+    names = series_names(providers)
+    rules = [alerts.parse_rule(f"{names[i % len(names)]} > {i} for {i % 30}s clear {i * 0.9:.1f}")
+             for i in range(count)]
+    return alerts.AlertEngine(rules, providers, notifier=None)
+
+
+def full_collector():
+    """不受界面状态影响的采集器"""
+    providers = REGISTRY.create()
+    return MetricCollector(providers, scheduler=SamplingScheduler(providers, mode=HEADLESS))
+
+
+def full_sample(collector):
+    """忘掉上次采样时间，让所有指标都到期，测量完整的一轮"""
+    collector.scheduler.last.clear()
+    return collector.sample()
+
+
+def backend_benchmarks(runs):
+    """psutil 与 procfs 两个后端读取本机真实计数器的对比（只在 Linux 上运行）"""
+    try:
+        procfs = backends.create('procfs')
+    except (OSError, AttributeError):
+        return
+    # 其他基准组使用假 psutil，这里临时换回真的
+    fake, backends.psutil = backends.psutil, REAL_PSUTIL
+    try:
+        for backend in (backends.PsutilBackend(), procfs):
+            for name in ('cpu_percent', 'memory_percent', 'net_counters', 'disk_counters', 'cpu_times_percpu'):
+                yield f"backend.{backend.name}.{name}", getattr(backend, name), runs
+    finally:
+        backends.psutil = fake
+        procfs.close()
+
+    # 256 个核心的 /proc/stat（本机核心数可能很少），只测解析
+    root = tempfile.mkdtemp(prefix='notos_bench_proc_')
+    try:
+        make_fake_proc(root)
+        procfs = backends.create('procfs').__class__(root=root)
+        yield "backend.procfs.cpu_times_percpu.256", procfs.cpu_times_percpu, runs
+        procfs.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def load_main_module():
+    """main_v1.2.py 的文件名不能直接 import，按路径加载"""
+    spec = importlib.util.spec_from_file_location('notos_main', os.path.join(HERE, 'main_v1.2.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def ui_benchmarks(runs):
+    """界面热点：应用快照、绘制、调整大小、悬停展开/收起"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtGui import QColor, QLinearGradient, QPainter, QPixmap
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    main = load_main_module()
+    monitor = main.SystemMonitor()
+    # 基准里不需要后台采集，快照由这里手动生成
+    monitor.collector_thread.stop()
+    monitor.show()
+    app.processEvents()
+
+    collector = full_collector()
+    snapshots = [full_sample(collector), full_sample(collector)]
+    yield "update_data.same", lambda: monitor.update_data(snapshots[0]), runs
+
+    def update_changed():
+        # 两个文字不同的快照交替应用，测量真正需要 setText 的路径
+        snapshots.reverse()
+        monitor.update_data(snapshots[0])
+
+    yield "update_data.changed", update_changed, runs
+    yield "paintEvent.color", monitor.repaint, runs
+
+    image = QPixmap(900, 300)
+    image.fill(QColor(40, 60, 90))
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, 900, 300)
+    gradient.setColorAt(0, QColor(200, 80, 40))
+    gradient.setColorAt(1, QColor(40, 80, 200))
+    painter.fillRect(image.rect(), gradient)
+    painter.end()
+    monitor.bg_image = image
+    yield "paintEvent.image", monitor.repaint, runs
+    yield "adjust_size", monitor.adjust_size, runs
+
+    # 每帧只滚动一列、画最新的一列，耗时应与宽度无关
+    from render import Sparkline
+
+    for width in (70, 700):
+        sparkline = Sparkline(width=width, fixed_max=100)
+        counter = iter(range(10 ** 9))
+        yield f"sparkline.push.{width}", lambda s=sparkline, c=counter: s.push(next(c) % 100), runs
+    yield "advance_sparklines", monitor.advance_sparklines, runs
+
+    # 256 个核心的热力条：填充像素数据 + 一次绘制
+    if monitor.heatmap_widget is not None:
+        cores = [tuple(float((i * 7 + step) % 101) for i in range(256)) for step in range(2)]
+        monitor.heatmap_widget.set_values(cores[0])
+
+        def heatmap_frame():
+            cores.reverse()
+            monitor.heatmap_widget.set_values(cores[0])
+            monitor.heatmap_widget.repaint()
+
+        yield "heatmap.256", heatmap_frame, runs
+
+    def hover_cycle():
+        monitor.enterEvent(None)
+        monitor.leaveEvent(None)
+
+    yield "hover_cycle", hover_cycle, max(runs // 4, 20)
+
+    collector.close()
+    monitor.hide()
+    app.processEvents()
+
+
+def startup_benchmarks(runs):
+    """启动耗时：在子进程中运行 main_v1.2.py --startup-report，每个阶段给出一项
+
+    子进程使用真实的数据源（只继承假的 sysfs），所以这组结果与机器有关，适合在同一台机器上
+    跨版本比较。与其他基准组不同，这里直接给出测量结果。
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    stages = {}
+    for _ in range(max(runs // 100, 3)):
+        output = subprocess.run([sys.executable, os.path.join(HERE, 'main_v1.2.py'), '--startup-report'],
+                                env=env, capture_output=True, text=True, timeout=60).stdout
+        lines = output.strip().splitlines()
+        if not lines:
+            continue
+        for stage, ms in json.loads(lines[-1]).items():
+            stages.setdefault(stage, []).append(ms * 1000.0)
+    for stage, timings in stages.items():
+        timings.sort()
+        yield Result(f"startup.{stage}", len(timings), percentile(timings, 0.5), percentile(timings, 0.99),
+                     sum(timings) / len(timings), 0.0)
+
+
+def compare(results, baseline, tolerance, min_delta=2.0, min_alloc_delta=256):
+    """与基线比较，返回回退的项目说明列表；基线里有哪几项就比较哪几项
+
+    p99 抖动较大，允许的比例放宽一倍；绝对差值小于 min_delta 微秒的不算回退。每次调用的分配
+    字节数按同样的比例比较，差值小于 min_alloc_delta 字节的不算（解释器内部缓存的抖动）。
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+        for key, factor in (('p50', 1), ('p99', 2)):
+            if key not in base:
+                continue
+            limit = max(base[key] * (1 + tolerance * factor), base[key] + min_delta)
+            value = getattr(result, key)
+            if value > limit:
+                regressions.append(f"{result.name} {key}: {value:.1f}us > 基线 {base[key]:.1f}us "
+                                   f"(+{(value / base[key] - 1) * 100:.0f}%)")
+        if 'alloc' in base:
+            limit = max(base['alloc'] * (1 + tolerance), base['alloc'] + min_alloc_delta)
+            if result.alloc > limit:
+                regressions.append(f"{result.name} alloc: {result.alloc:.0f}B > 基线 {base['alloc']:.0f}B")
+    return regressions
+
+
+def save_results(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    print(f"基线已保存到 {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NotosIsland 性能基准")
+    parser.add_argument('--runs', type=int, default=500, help="每项测量次数")
+    parser.add_argument('--only', type=names_list, default=None, metavar='PREFIX[,PREFIX...]',
+                        help="只运行名称以这些前缀开头的项目")
+    parser.add_argument('--no-ui', action='store_true', help="跳过需要 PyQt5 的界面基准")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="分配字节数的基线文件（随仓库提交）")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次的分配字节数保存为基线")
+    parser.add_argument('--timings', default=DEFAULT_TIMINGS,
+                        help="本机耗时的基线文件，存在时才比较耗时（不要提交）")
+    parser.add_argument('--save-timings', action='store_true', help="把本次的耗时保存为本机的耗时基线")
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help="允许相对基线变慢（或多分配）的比例，p99 放宽一倍，默认 0.3（30%%）")
+    args = parser.parse_args(argv)
+
+    install_fakes()
+    groups = [sampling_benchmarks, backend_benchmarks]
+    if not args.no_ui:
+        groups.append(ui_benchmarks)
+        # 启动基准要启动好几个子进程，只在明确选中时运行
+        if args.only and any(prefix.startswith('startup') for prefix in args.only):
+            groups.append(startup_benchmarks)
+
+    results = []
+    print(f"{'项目':<32}{'p50(us)':>10}{'p99(us)':>10}{'mean(us)':>10}{'alloc(B)':>10}")
+    for group in groups:
+        for item in group(args.runs):
+            name = item[0]
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            result = item if isinstance(item, Result) else measure(*item)
+            results.append(result)
+            print(f"{result.name:<32}{result.p50:>10.1f}{result.p99:>10.1f}{result.mean:>10.1f}"
+                  f"{result.alloc:>10.0f}")
+
+    saved = False
+    if args.save_baseline:
+        save_results(args.baseline, {r.name: {'alloc': r.alloc} for r in results})
+        saved = True
+    if args.save_timings:
+        save_results(args.timings, {r.name: {'p50': r.p50, 'p99': r.p99} for r in results})
+        saved = True
+    if saved:
+        return 0
+
+    regressions = []
+    for path, what in ((args.baseline, "分配字节数"), (args.timings, "耗时")):
+        if not os.path.exists(path):
+            print(f"没有{what}基线 {path}，跳过比较")
+            continue
+        with open(path, encoding='utf-8') as f:
+            regressions.extend(compare(results, json.load(f), args.tolerance))
+    if regressions:
+        print("性能回退：")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    print("与基线相比没有回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from health import OK, UNAVAILABLE
+from scheduler import SamplingScheduler
+
+# 一次采样的不可变快照，由采集线程生成后整体交给界面
+# values: 指标名 -> 原始数值；texts: 指标名 -> 标签文字；health: 指标名 -> (状态, 说明)
+Snapshot = namedtuple('Snapshot', ['timestamp', 'values', 'texts', 'health'])
+
+
+class MetricCollector:
+    """负责按调度器安排的时间采样各提供者，不依赖任何界面组件
+
+    每个提供者都包了一层 ProviderHealth：失败会被记住并指数退避，连续失败过多会熔断，
+    确认不可用的数据源不再消耗CPU。
+    """
+
+    def __init__(self, providers, history=None, instruments=None, scheduler=None, open_providers=True):
+        self.providers = list(providers)
+        self.history = history  # 可选的 MetricHistory，每次成功采样都会写入
+        self.instruments = instruments  # 可选的 Instrumentation，记录每个指标的采样耗时
+        self.scheduler = scheduler or SamplingScheduler(self.providers)
+        self.values = {}
+        self.texts = {}
+        self.opened = False
+
+        for provider in self.providers:
+            self.texts[provider.name] = f"{provider.title}{provider.placeholder}"
+        # 界面把打开数据源（扫描传感器、启动 nvidia-smi 等）留给采集线程，窗口先显示占位文字；
+        # 回放历史或使用共享采集进程时根本不打开
+        if open_providers:
+            self.open()
+
+    def open(self):
+        """打开所有数据源（只执行一次），打不开的标记为不可用"""
+        if self.opened:
+            return
+        self.opened = True
+        for provider in self.providers:
+            try:
+                provider.open()
+            except Exception as e:
+                provider.health.mark_unavailable(e)
+
+    def sample(self):
+        """采样所有到期的指标，返回不可变快照"""
+        now = time.monotonic()
+        for provider in self.scheduler.due(now):
+            self.scheduler.mark(provider, now)
+            self.sample_provider(provider, now)
+
+        return Snapshot(
+            timestamp=now,
+            values=MappingProxyType(dict(self.values)),
+            texts=MappingProxyType(dict(self.texts)),
+            health=self.health_snapshot(),
+        )
+
+    def sample_provider(self, provider, now):
+        """在健康状态保护下采样单个提供者"""
+        health = provider.health
+        if not health.should_sample():
+            # 跳过期间的差值跨度不对，恢复后重新取基准
+            provider.reset()
+            return
+        try:
+            start = time.perf_counter()
+            value = provider.sample()
+            if self.instruments is not None:
+                self.instruments.observe(f"sample.{provider.name}", time.perf_counter() - start)
+            self.texts[provider.name] = provider.text(value)
+            self.values[provider.name] = value
+            health.record_success()
+            if self.history is not None:
+                for series_name, series_value in provider.series(value):
+                    self.history.append(series_name, now, series_value)
+        except Exception as e:
+            provider.reset()
+            self.texts[provider.name] = f"{provider.title}Err"
+            health.record_failure(e)
+
+    def replay(self, series_values, health_text):
+        """用一条历史记录（{序列名: 数值}）代替采样，生成同样的快照"""
+        now = time.monotonic()
+        health = {}
+        for provider in self.providers:
+            value = provider.restore(series_values)
+            if value is None:
+                health[provider.name] = (UNAVAILABLE, f"{health_text}（没有记录）")
+                continue
+            health[provider.name] = (OK, health_text)
+            self.texts[provider.name] = provider.text(value)
+            self.values[provider.name] = value
+            if self.history is not None:
+                for series_name, series_value in provider.series(value):
+                    self.history.append(series_name, now, series_value)
+
+        return Snapshot(
+            timestamp=now,
+            values=MappingProxyType(dict(self.values)),
+            texts=MappingProxyType(dict(self.texts)),
+            health=MappingProxyType(health),
+        )
+
+    def apply(self, snapshot):
+        """采用别处（共享采集进程）生成的快照：记下数值，变化了的写入历史记录"""
+        now = time.monotonic()
+        for provider in self.providers:
+            value = snapshot.values.get(provider.name)
+            if value is None or value == self.values.get(provider.name):
+                continue
+            self.values[provider.name] = value
+            if self.history is not None:
+                for series_name, series_value in provider.series(value):
+                    self.history.append(series_name, now, series_value)
+        self.texts.update(snapshot.texts)
+        return snapshot
+
+    def stale(self, health_text):
+        """数据源暂时没有了（共享采集进程退出）：保留最后的数值和文字，所有指标标为不可用"""
+        return Snapshot(
+            timestamp=time.monotonic(),
+            values=MappingProxyType(dict(self.values)),
+            texts=MappingProxyType(dict(self.texts)),
+            health=MappingProxyType({p.name: (UNAVAILABLE, health_text) for p in self.providers}),
+        )
+
+    def health_snapshot(self):
+        """各提供者状态的只读副本：名称 -> (状态, 说明)"""
+        return MappingProxyType({p.name: p.health_state() for p in self.providers})
+
+    def close(self):
+        """释放采样用到的外部资源"""
+        for provider in self.providers:
+            try:
+                provider.close()
+            except Exception as e:
+                # 退出时关不掉也只是少释放一个资源，不能影响其他提供者的关闭
+                if self.instruments is not None:
+                    self.instruments.record_error(f"close.{provider.name}", e)
+
+
+class CollectorThread(threading.Thread):
+    """后台采集线程：在调度器给出的时间醒来采样，并通过回调交出快照"""
+
+    def __init__(self, collector, callback):
+        super().__init__(name="NotosCollector", daemon=True)
+        self.collector = collector
+        self.callback = callback
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def run(self):
+        instruments = self.collector.instruments
+        scheduler = self.collector.scheduler
+        self.collector.open()
+        for provider in self.collector.providers:
+            try:
+                provider.watch(lambda provider=provider: self.wake(provider))
+            except Exception as e:
+                if instruments is not None:
+                    instruments.record_error(f"watch.{provider.name}", e)
+        planned = time.monotonic()
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            try:
+                snapshot = self.collector.sample()
+                if instruments is not None:
+                    # 节拍抖动：实际醒来时间相对计划时间的偏差（被 wake() 提前唤醒时不算）
+                    if not self._wake_event.is_set():
+                        instruments.observe('jitter', abs(start - planned))
+                    instruments.observe('tick', time.monotonic() - start)
+                self.callback(snapshot)
+            except Exception as e:
+                if instruments is not None:
+                    instruments.record_error('collector', e)
+
+            self._wake_event.clear()
+            planned = scheduler.next_wakeup()
+            self._wake_event.wait(max(planned - time.monotonic(), 0))
+
+    def wake(self, provider=None):
+        """界面状态变化后立即重新调度（例如展开时马上刷新第二行）
+
+        给出提供者时（事件驱动的指标有新事件）让它立即到期，马上采样一次。
+        """
+        if provider is not None:
+            self.collector.scheduler.expire(provider)
+        self._wake_event.set()
+
+    def stop(self, timeout=2.0):
+        """停止采集线程"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        self.collector.close()
@@ -0,0 +1,302 @@
+import fnmatch
+import threading
+import time
+from collections import deque, namedtuple
+from operator import attrgetter
+
+import backends
+
+# 默认排除的设备：回环、容器/虚拟网桥，以及叠在物理磁盘之上的 LVM/加密卷、软 RAID，
+# 它们的流量已经计入底层设备，再加一次会让总数虚高
+DEFAULT_EXCLUDES = {
+    'net': ('lo', 'lo0', 'Loopback*', 'veth*', 'docker*', 'br-*', 'virbr*'),
+    'disk': ('loop*', 'ram*', 'zram*', 'dm-*', 'md*'),
+}
+
+# 一次读取的结果（字节/秒）：totals 为所有保留设备之和，devices 为 [(设备名, 速率a, 速率b), ...]，
+# peaks 为高精度采样下区间内总速率的峰值（未开启时为 None）
+DeviceSample = namedtuple('DeviceSample', ['totals', 'devices', 'peaks'])
+
+
+class DeviceFilter:
+    """按通配符包含/排除设备，判断结果按设备名缓存
+
+    主机上有几百个 veth 时，每个名字只在第一次出现时做一次 fnmatch。
+    """
+
+    max_cached = 4096  # 容器频繁创建销毁时设备名会不断变化，缓存超过上限就清空
+
+    def __init__(self, include=(), exclude=()):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self._cache = {}
+
+    def matches(self, name):
+        result = self._cache.get(name)
+        if result is None:
+            if len(self._cache) >= self.max_cached:
+                self._cache.clear()
+            result = self._cache[name] = self._match(name)
+        return result
+
+    def _match(self, name):
+        if self.include and not any(fnmatch.fnmatchcase(name, p) for p in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(name, p) for p in self.exclude)
+
+    def describe(self):
+        parts = []
+        if self.include:
+            parts.append("包含 " + ",".join(self.include))
+        if self.exclude:
+            parts.append("排除 " + ",".join(self.exclude))
+        return "；".join(parts) or "全部设备"
+
+
+FILTERS = {kind: DeviceFilter(exclude=patterns) for kind, patterns in DEFAULT_EXCLUDES.items()}
+
+
+# 高精度采样的间隔（秒），None 表示关闭；由 --high-res 设置
+HIGH_RES_INTERVAL = None
+# 高精度采样保留多长时间的子区间速率（秒），要覆盖最慢的使用者的采样间隔
+HIGH_RES_WINDOW = 120.0
+
+
+def compute_rates(counters, prev, elapsed, wanted, getter):
+    """一次遍历算出所有保留设备的速率
+
+    返回 (本次计数 {设备名: (a, b)}, [(设备名, 速率a, 速率b), ...], (总速率a, 总速率b))。
+    """
+    current = {}
+    devices = []
+    total_a = total_b = 0
+    for name, counter in counters.items():
+        if not wanted(name):
+            continue
+        pair = current[name] = getter(counter) if getter is not None else counter
+        old = prev.get(name)
+        if old is None or elapsed <= 0:
+            continue
+        delta_a = pair[0] - old[0]
+        delta_b = pair[1] - old[1]
+        if delta_a < 0 or delta_b < 0:
+            # 计数器回绕或设备被重建，这一轮不计
+            continue
+        rate_a = int(delta_a / elapsed)
+        rate_b = int(delta_b / elapsed)
+        total_a += rate_a
+        total_b += rate_b
+        devices.append((name, rate_a, rate_b))
+    return current, devices, (total_a, total_b)
+
+
+class CounterReader:
+    """读取按设备的累计计数器，同一轮采样内的多次读取只调用一次 psutil"""
+
+    cache_time = 0.1
+
+    def __init__(self, read_counters):
+        self.read_counters = read_counters
+        self.high_res = None  # 开启高精度采样时的 HighResSampler
+        # 采集线程和高精度线程都会读取；procfs 后端的读缓冲区不能同时使用
+        self.lock = threading.Lock()
+        self._cached = None
+        self._cached_at = None
+
+    def read(self):
+        """返回 (读取时间, {设备名: 计数器})"""
+        with self.lock:
+            now = time.monotonic()
+            if self._cached_at is None or now - self._cached_at >= self.cache_time:
+                self._store(now)
+            return self._cached
+
+    def refresh(self):
+        """不管缓存，立即重新读取（高精度线程使用，读到的计数器界面节拍也可以直接用）"""
+        with self.lock:
+            return self._store(time.monotonic())
+
+    def _store(self, now):
+        self._cached = (now, self.read_counters())
+        self._cached_at = now
+        return self._cached
+
+
+class HighResSampler(threading.Thread):
+    """按很短的间隔（例如 100ms）读取计数器，记录每个子区间的总速率
+
+    界面仍按原来的节拍显示，每次显示时取上一次显示以来所有子区间的峰值，
+    这样几百毫秒的突发流量不会被 1 秒的平均值抹平。
+    """
+
+    def __init__(self, kind, reader, interval):
+        super().__init__(name=f"high-res-{kind}", daemon=True)
+        self.kind = kind
+        self.reader = reader
+        self.interval = interval
+        self.getter = counter_getter(kind)
+        self.rates = deque(maxlen=max(int(HIGH_RES_WINDOW / interval), 1))  # (结束时间, 速率a, 速率b)
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        prev, prev_time = {}, None
+        planned = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                now, counters = self.reader.refresh()
+                elapsed = now - prev_time if prev_time is not None else 0.0
+                prev, _, totals = compute_rates(counters, prev, elapsed, FILTERS[self.kind].matches,
+                                                self.getter)
+                if elapsed > 0:
+                    with self.lock:
+                        self.rates.append((now, totals[0], totals[1]))
+                prev_time = now
+            except Exception as e:
+                # 这个线程里没有地方上报，记下来在诊断信息里显示；下一轮从头计算差值
+                self.failures += 1
+                self.last_error = str(e) or type(e).__name__
+                prev, prev_time = {}, None
+            # 按计划时间推进，读取耗时不会让间隔逐渐变长
+            planned += self.interval
+            self._stop_event.wait(max(planned - time.monotonic(), 0))
+
+    def peak(self, since):
+        """since 之后结束的所有子区间中的最大速率 (a, b)，没有数据时返回 None"""
+        peak_a = peak_b = None
+        with self.lock:
+            for end, rate_a, rate_b in reversed(self.rates):
+                if end <= since:
+                    break
+                peak_a = rate_a if peak_a is None or rate_a > peak_a else peak_a
+                peak_b = rate_b if peak_b is None or rate_b > peak_b else peak_b
+        if peak_a is None:
+            return None
+        return peak_a, peak_b
+
+    def describe(self):
+        text = f"高精度采样: 每 {self.interval * 1000:.0f}ms"
+        if self.failures:
+            text += f"，出错 {self.failures} 次（最近: {self.last_error}）"
+        return text
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_readers = {}
+_users = {}
+_lock = threading.Lock()
+
+# 类别 -> 后端中读取按设备计数器的方法名
+SOURCE_SPECS = {
+    'net': 'net_counters',
+    'disk': 'disk_counters',
+}
+
+
+def counter_getter(kind):
+    """从当前后端返回的计数器中取出 (字节a, 字节b)；后端直接给出元组时为 None"""
+    fields = backends.current.fields[kind]
+    return attrgetter(*fields) if fields else None
+
+
+def acquire(kind):
+    """获取某类设备计数器读取器的共享实例（引用计数）"""
+    with _lock:
+        reader = _readers.get(kind)
+        if reader is None:
+            reader = _readers[kind] = CounterReader(getattr(backends.current, SOURCE_SPECS[kind]))
+            if HIGH_RES_INTERVAL:
+                reader.high_res = HighResSampler(kind, reader, HIGH_RES_INTERVAL)
+                reader.high_res.start()
+        _users[kind] = _users.get(kind, 0) + 1
+        return reader
+
+
+def release(kind):
+    """释放共享实例，最后一个使用者释放后丢弃"""
+    with _lock:
+        _users[kind] = _users.get(kind, 0) - 1
+        if _users[kind] <= 0:
+            reader = _readers.pop(kind, None)
+            _users.pop(kind, None)
+            if reader is not None and reader.high_res is not None:
+                reader.high_res.stop()
+
+
+class DeviceRates:
+    """把共享的计数器换算成速率，一次遍历算出所有保留设备的速率和总和
+
+    读取器是共享的，但每个使用者各自保存上一次的计数：总速率和"最忙设备"的采样间隔不同，
+    共用基准会让其中一方只看到另一方读取之后的那一小段差值。
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.reader = acquire(kind)
+        self.getter = counter_getter(kind)
+        self.prev = {}  # 设备名 -> (计数a, 计数b)
+        self.prev_time = None
+
+    @property
+    def high_res(self):
+        return self.reader is not None and self.reader.high_res is not None
+
+    def close(self):
+        if self.reader is not None:
+            release(self.kind)
+            self.reader = None
+
+    def reset(self):
+        """丢掉基准，下一次读取重新开始算差值"""
+        self.prev = {}
+        self.prev_time = None
+
+    def read(self):
+        now, counters = self.reader.read()
+        if not counters:
+            raise RuntimeError(f"没有可用的{'网络' if self.kind == 'net' else '磁盘'}计数器")
+        prev_time = self.prev_time
+        # 采样间隔随界面状态变化，按实际经过的时间换算成每秒
+        elapsed = now - prev_time if prev_time is not None else 0.0
+        self.prev, devices, totals = compute_rates(counters, self.prev, elapsed,
+                                                   FILTERS[self.kind].matches, self.getter)
+        self.prev_time = now
+
+        peaks = None
+        if self.reader.high_res is not None:
+            # 平均值来自整个区间的差值，峰值取区间内最忙的那个子区间
+            peaks = self.reader.high_res.peak(prev_time) if prev_time is not None else None
+            peaks = (max(peaks[0], totals[0]), max(peaks[1], totals[1])) if peaks else totals
+        return DeviceSample(totals, devices, peaks)
+
+
+def add_device_arguments(parser):
+    """给命令行加上设备过滤和高精度采样参数（界面和无界面模式共用）"""
+    from providers import names_list
+
+    for kind, what in (('net', "网卡"), ('disk', "磁盘")):
+        parser.add_argument(f'--{kind}-include', type=names_list, default=None, metavar='PATTERN[,...]',
+                            help=f"只统计名称匹配这些通配符的{what}（此时不再使用默认的排除规则）")
+        parser.add_argument(f'--{kind}-exclude', type=names_list, default=None, metavar='PATTERN[,...]',
+                            help=f"不统计这些{what}，默认 {','.join(DEFAULT_EXCLUDES[kind])}；传空字符串表示不排除")
+    parser.add_argument('--high-res', type=int, nargs='?', const=100, default=None, metavar='MS',
+                        help="高精度采样：每 MS 毫秒（默认 100）读取一次网络/磁盘计数器，显示每个区间的平均和峰值")
+
+
+def apply_device_arguments(args):
+    global HIGH_RES_INTERVAL
+    for kind in DEFAULT_EXCLUDES:
+        include = getattr(args, f'{kind}_include')
+        exclude = getattr(args, f'{kind}_exclude')
+        if include is None and exclude is None:
+            continue
+        if exclude is None:
+            # 明确指定了要统计哪些设备时，不再套用默认的排除规则
+            exclude = () if include else DEFAULT_EXCLUDES[kind]
+        FILTERS[kind] = DeviceFilter(include or (), exclude)
+    if args.high_res:
+        HIGH_RES_INTERVAL = args.high_res / 1000.0
@@ -0,0 +1,128 @@
+"""本机 Prometheus 抓取端点：http://127.0.0.1:<端口>/metrics
+
+    python main_v1.2.py --metrics-port 9101
+    python headless.py --metrics-port 9101 --output /dev/null
+
+每次采样后在采集线程中把全部指标渲染成一份文本（Prometheus 文本格式 0.0.4）缓存起来，
+抓取请求只是把这份字节串原样写回，不会触发新的采样；并发抓取也没有额外开销。
+"""
+import threading
+
+from health import OK
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "notos_"
+
+
+def metric_name(*parts):
+    """拼接并规范化指标名：只保留字母、数字和下划线"""
+    name = PREFIX + "_".join(part for part in parts if part)
+    return "".join(c if c.isalnum() or c == '_' else '_' for c in name)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(snapshot, providers):
+    """把一次快照渲染成 Prometheus 文本格式（bytes）"""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        # samples: [(标签字典, 数值), ...]
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value!r}")
+            else:
+                lines.append(f"{name} {value!r}")
+
+    for provider in providers:
+        # 仪表盘数值：与界面显示的是同一份原始数值，而不是格式化后的文字
+        for series_name, value in provider.series(snapshot.values.get(provider.name)):
+            field = series_name.partition('.')[2]
+            family(metric_name(series_name.replace('.', '_'), provider.unit_of(field)), 'gauge',
+                   f"{provider.title.strip(': ') or provider.name} {series_name}", [({}, float(value))])
+        # 累计计数器（例如各网卡的收发字节数）
+        for name, help_text, samples in provider.counters():
+            family(metric_name(name), 'counter', help_text, samples)
+
+    family(metric_name('provider_up'), 'gauge', "指标提供者是否正常（1 正常，0 退避/熔断/不可用）",
+           [({'provider': name}, 1.0 if state == OK else 0.0)
+            for name, (state, _) in snapshot.health.items()])
+    lines.append("")
+    return "\n".join(lines).encode('utf-8')
+
+
+class MetricsExporter:
+    """在后台线程中提供 /metrics，内容来自最近一次 update() 渲染好的缓存"""
+
+    def __init__(self, providers, host='127.0.0.1', port=9101):
+        self.providers = list(providers)
+        self.host = host
+        self.port = port
+        self.payload = b""  # 最近一次渲染的结果，整体替换，读取方不需要加锁
+        self.renders = 0
+        self.scrapes = 0
+        self.server = None
+        self.thread = None
+
+    def update(self, snapshot):
+        """在采集线程中调用：渲染一次并替换缓存"""
+        self.payload = render(snapshot, self.providers)
+        self.renders += 1
+
+    def publisher(self, callback):
+        """包装采集线程的回调：先更新缓存，再交给原来的回调"""
+        def publish(snapshot):
+            self.update(snapshot)
+            callback(snapshot)
+        return publish
+
+    def start(self):
+        """开始监听，端口被占用等情况会抛 OSError"""
+        # http.server 只在真正开启抓取端点时才导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = exporter.payload
+                exporter.scrapes += 1
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                # 不在控制台打印每次抓取
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def add_exporter_arguments(parser):
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help="在本机提供 Prometheus 抓取端点 /metrics（0 表示随机端口）")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="抓取端点监听的地址，默认只监听本机 127.0.0.1")
@@ -0,0 +1,155 @@
+import os
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+# 单块GPU的一条记录
+GpuRecord = namedtuple('GpuRecord', ['index', 'utilization', 'temperature', 'memory_used', 'memory_total'])
+
+# 查询字段顺序必须与 GpuRecord 保持一致
+QUERY_FIELDS = ['index', 'utilization.gpu', 'temperature.gpu', 'memory.used', 'memory.total']
+
+# Windows 下隐藏 nvidia-smi 的控制台窗口，其他平台没有这个标志
+CREATE_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+
+def parse_value(text):
+    """解析CSV中的单个数值，'[N/A]' 之类的无效值返回 None"""
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_line(line):
+    """解析一行 nvidia-smi CSV 输出，格式不对时返回 None"""
+    parts = [p.strip() for p in line.split(',')]
+    if len(parts) != len(QUERY_FIELDS):
+        return None
+    try:
+        index = int(parts[0])
+    except ValueError:
+        return None
+    return GpuRecord(index, *(parse_value(p) for p in parts[1:]))
+
+
+class NvidiaSmiStream:
+    """常驻的 nvidia-smi 进程：以 -lms 循环输出，后台线程持续解析最新的每卡记录
+
+    可执行文件可以通过参数或环境变量 NOTOS_NVIDIA_SMI 指定，方便在没有GPU的机器上
+    用一个假的 nvidia-smi 脚本测试。
+    """
+
+    def __init__(self, executable=None, interval_ms=1000, max_backoff=30.0, startup_grace=5.0):
+        self.executable = executable or os.environ.get('NOTOS_NVIDIA_SMI', 'nvidia-smi')
+        self.interval_ms = interval_ms
+        self.max_backoff = max_backoff
+        # nvidia-smi 第一次输出要等驱动初始化（未开启持久模式时可能要好几秒）
+        self.startup_grace = max(startup_grace, interval_ms / 1000.0 * 3)
+
+        self.available = True  # 找不到可执行文件时置为 False，不再重启
+        self.restarts = 0
+        self.started_at = None
+        self.got_data = False  # 是否读到过记录
+        self._records = {}  # GPU序号 -> (GpuRecord, 单调时间戳)
+        self._lock = threading.Lock()
+        self._process = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def command(self):
+        """构造 nvidia-smi 命令行"""
+        return [
+            self.executable,
+            '--query-gpu=' + ','.join(QUERY_FIELDS),
+            '--format=csv,noheader,nounits',
+            '-lms', str(self.interval_ms),
+        ]
+
+    def start(self):
+        """启动读取线程（重复调用无副作用）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="NvidiaSmiStream", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """停止读取线程并结束 nvidia-smi 进程"""
+        self._stop_event.set()
+        self._kill_process()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def latest(self, max_age=None):
+        """返回按序号排序的最新记录列表；没有新鲜数据时返回空列表"""
+        if max_age is None:
+            # 默认允许错过两次输出
+            max_age = self.interval_ms / 1000.0 * 3
+        now = time.monotonic()
+        with self._lock:
+            items = sorted(self._records.items())
+        return [record for _, (record, stamp) in items if now - stamp <= max_age]
+
+    def starting(self):
+        """进程刚启动、还没有第一次输出：既没有超过宽限时间，也还没有退出过"""
+        return (self.available and not self.got_data and self.restarts == 0
+                and self.started_at is not None
+                and time.monotonic() - self.started_at < self.startup_grace)
+
+    def _kill_process(self):
+        process = self._process
+        if process is not None and process.poll() is None:
+            try:
+                process.kill()
+                process.wait(1.0)
+            except Exception:
+                # 进程已经自己退出或等待超时：读取线程随后会重启它（或者正在停止），不必处理
+                pass
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                self._process = subprocess.Popen(
+                    self.command(),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+                    text=True, bufsize=1, creationflags=CREATE_NO_WINDOW
+                )
+            except (FileNotFoundError, PermissionError):
+                # 没有 nvidia-smi，不再尝试
+                self.available = False
+                return
+            except OSError:
+                # 偶发的启动失败（资源不足等）：退避后重试，期间 GpuSource 会标记 nvidia-smi 暂无输出
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            if self._stop_event.is_set():
+                # 启动期间被要求停止
+                self._kill_process()
+                break
+
+            got_data = False
+            for line in self._process.stdout:
+                record = parse_line(line)
+                if record is None:
+                    continue
+                got_data = self.got_data = True
+                with self._lock:
+                    self._records[record.index] = (record, time.monotonic())
+
+            self._process.stdout.close()
+            self._kill_process()
+            if self._stop_event.is_set():
+                break
+
+            # 进程意外退出：有过数据说明只是偶发故障，退避时间复位；否则指数退避
+            self.restarts += 1
+            if got_data:
+                backoff = 1.0
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+from gpu_backend import NvidiaSmiStream
+from health import ProviderHealth, OK, BACKOFF, OPEN, UNAVAILABLE
+from providers import MetricProvider
+
+
+class GpuSource:
+    """GPU数据源：优先读取常驻 nvidia-smi 的输出，拿不到时回退到 GPUtil
+
+    GPU使用率和GPU温度共用同一个实例，同一轮采样内只读取一次。
+    """
+
+    _shared = None
+    _users = 0
+    _lock = threading.Lock()
+
+    def __init__(self, cache_time=0.5):
+        self.cache_time = cache_time
+        self.stream = NvidiaSmiStream().start()
+        self.smi_health = ProviderHealth('nvidia-smi')
+        self.gputil_health = ProviderHealth('gputil')
+        self._cached = None
+        self._cached_at = None
+
+    @classmethod
+    def acquire(cls):
+        """获取共享实例（引用计数）"""
+        with cls._lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            cls._users += 1
+            return cls._shared
+
+    @classmethod
+    def release(cls):
+        """释放共享实例，最后一个使用者负责关闭"""
+        with cls._lock:
+            cls._users -= 1
+            if cls._users <= 0 and cls._shared is not None:
+                cls._shared.stream.stop()
+                cls._shared = None
+                cls._users = 0
+
+    def read(self):
+        """获取每块GPU的 (使用率%, 温度) 列表，拿不到时返回 None"""
+        now = time.monotonic()
+        if self._cached_at is not None and now - self._cached_at < self.cache_time:
+            return self._cached
+        self._cached = self._read()
+        self._cached_at = now
+        return self._cached
+
+    def _read(self):
+        # 首先使用常驻 nvidia-smi 进程的最新记录（只是读内存，不需要退避）
+        if not self.stream.available:
+            self.smi_health.mark_unavailable("找不到 nvidia-smi")
+        else:
+            records = self.stream.latest()
+            if records:
+                self.smi_health.record_success()
+                return [(r.utilization, r.temperature) for r in records]
+            if self.stream.starting():
+                # 还在等第一次输出，这时回退到 GPUtil 只会再启动一个 nvidia-smi
+                return None
+            self.smi_health.record_failure("nvidia-smi 暂无输出")
+
+        # 回退到 GPUtil 获取（它每次也会启动 nvidia-smi，所以要受退避控制）
+        if not self.stream.available and os.name != 'nt':
+            # 非 Windows 下 GPUtil 同样依赖 PATH 中的 nvidia-smi，不必再试
+            self.gputil_health.mark_unavailable("找不到 nvidia-smi")
+        if not self.gputil_health.should_sample():
+            return None
+        try:
+            # GPUtil 导入很慢（会拉进 distutils/setuptools），只在第一次需要回退时才导入
+            import GPUtil
+
+            gpus = GPUtil.getGPUs()
+        except Exception as e:
+            self.gputil_health.record_failure(e)
+            return None
+        if not gpus:
+            # 没有GPU也按失败处理，让退避和熔断生效
+            self.gputil_health.record_failure("GPUtil 未找到GPU")
+            return None
+        self.gputil_health.record_success()
+        return [(gpu.load * 100, getattr(gpu, 'temperature', None)) for gpu in gpus]
+
+    def health_state(self):
+        """两个数据源只要有一个正常就算正常"""
+        order = (OK, BACKOFF, OPEN, UNAVAILABLE)
+        healths = (self.smi_health, self.gputil_health)
+        state = min((h.state for h in healths), key=order.index)
+        return state, "\n".join(h.describe() for h in healths)
+
+
+class GpuProvider(MetricProvider):
+    """GPU指标的公共部分"""
+
+    title = "GPU: "
+
+    def __init__(self):
+        super().__init__()
+        self.source = None
+
+    def open(self):
+        self.source = GpuSource.acquire()
+
+    def close(self):
+        if self.source is not None:
+            GpuSource.release()
+            self.source = None
+
+    def values(self, index):
+        """取每块GPU的某一项数值"""
+        gpus = self.source.read()
+        if gpus is None:
+            return []
+        return [gpu[index] for gpu in gpus if gpu[index] is not None]
+
+    def health_state(self):
+        if self.source is None:
+            # 还没有 open 或已经 close
+            return super().health_state()
+        return self.source.health_state()
+
+
+class GpuUsageProvider(GpuProvider):
+    """GPU使用率（多个GPU时取平均值）"""
+
+    name = 'gpu'
+    unit = "percent"
+    sparkline = True
+    spark_max = 100
+
+    def sample(self):
+        usage_values = self.values(0)
+        return sum(usage_values) / len(usage_values) if usage_values else None
+
+    def format(self, value):
+        return "N/A" if value is None else f"{value:.0f}%"
+
+
+class GpuTempProvider(GpuProvider):
+    """GPU温度（多个GPU时取平均值）"""
+
+    name = 'gpu_temp'
+    row = 2
+    placeholder = "N/A"
+    unit = "celsius"
+
+    def sample(self):
+        valid_temps = self.values(1)
+        return sum(valid_temps) / len(valid_temps) if valid_temps else None
+
+    def format(self, value):
+        return "N/A" if value is None else f"{value:.0f}°C"
@@ -0,0 +1,202 @@
+"""无界面采集模式：复用同一套指标提供者，每个节拍输出一行 JSON，不加载 PyQt5
+
+    python headless.py --interval 0.25 --format jsonl --output metrics.jsonl
+    python main_v1.2.py --headless --interval 0.25
+"""
+import argparse
+import json
+import queue
+import signal
+import sys
+import time
+
+import alerts
+import backends
+from collector import CollectorThread, MetricCollector
+from devices import add_device_arguments, apply_device_arguments
+from exporter import MetricsExporter, add_exporter_arguments
+from instrumentation import Instrumentation
+from pressure import add_pressure_arguments, apply_pressure_arguments
+from providers import REGISTRY, names_list
+from scheduler import HEADLESS, SamplingScheduler
+from store import HistoryStore, add_store_arguments, series_names
+
+
+def parse_args(argv):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotosIsland 无界面采集模式")
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="采样间隔（秒），较慢的指标按原有比例放慢，默认 1.0")
+    parser.add_argument('--format', choices=['jsonl'], default='jsonl', help="输出格式")
+    parser.add_argument('--output', default='-', help="输出文件，默认标准输出")
+    parser.add_argument('--count', type=int, default=0, help="输出多少条后退出，0 表示一直运行")
+    parser.add_argument('--buffer', type=int, default=64,
+                        help="最多缓存多少条未写出的记录，写出跟不上时丢弃最旧的")
+    parser.add_argument('--only', type=names_list, default=None, metavar='NAME[,NAME...]',
+                        help="只启用这些指标")
+    parser.add_argument('--disable', type=names_list, default=(), metavar='NAME[,NAME...]',
+                        help="禁用这些指标")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="同时输出监控程序自身的CPU/内存（self 指标）；收到 SIGUSR1 时把诊断数据写到标准错误")
+    add_device_arguments(parser)
+    add_pressure_arguments(parser)
+    backends.add_backend_argument(parser)
+    add_exporter_arguments(parser)
+    add_store_arguments(parser, replay=False)
+    alerts.add_alert_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def scale_intervals(providers, interval):
+    """让最快的指标按 interval 采样，其他指标保持原有的相对比例"""
+    fastest = min((p.interval for p in providers), default=interval)
+    factor = interval / fastest
+    for provider in providers:
+        provider.interval = provider.interval * factor
+
+
+def snapshot_record(snapshot, providers):
+    """把快照转换成一条可序列化的记录：原始数值按序列名展开，最忙设备放在 top 中，各核心放在 cores 中"""
+    values = {}
+    top = {}
+    cores = None
+    for provider in providers:
+        value = snapshot.values.get(provider.name)
+        if provider.row == 'devices':
+            # 最忙设备：{指标名: [[设备名, 速率a, 速率b], ...]}
+            if value is not None:
+                top[provider.name] = value
+            continue
+        if provider.row == 'cores' and value:
+            # 各逻辑 CPU 的使用率，按核心序号排列；cores.max 照常放在 values 中
+            cores = value
+        for name, series_value in provider.series(value):
+            values[name] = series_value
+    record = {
+        'time': time.time(),
+        'values': values,
+        'health': {name: state for name, (state, _) in snapshot.health.items()},
+    }
+    if top:
+        record['top'] = top
+    if cores is not None:
+        record['cores'] = cores
+    return record
+
+
+class BoundedQueue:
+    """有界队列：满了就丢弃最旧的记录，采集线程永远不会被写出阻塞"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.interval <= 0:
+        print("--interval 必须大于 0", file=sys.stderr)
+        return 2
+    apply_device_arguments(args)
+    apply_pressure_arguments(args)
+    try:
+        backends.select(args.backend)
+    except OSError as e:
+        print(f"无法使用 {args.backend} 后端: {e}", file=sys.stderr)
+        return 2
+
+    providers = REGISTRY.create(enabled=args.only, disabled=args.disable,
+                                extra=('self',) if args.diagnostics else ())
+    scale_intervals(providers, args.interval)
+    instruments = Instrumentation()
+    collector = MetricCollector(providers, instruments=instruments,
+                                scheduler=SamplingScheduler(providers, mode=HEADLESS))
+
+    try:
+        alert_engine = alerts.create_engine(args, providers)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if hasattr(signal, 'SIGUSR1'):
+        # kill -USR1 <pid> 随时导出诊断数据
+        signal.signal(signal.SIGUSR1, lambda *_: print(instruments.dump(), file=sys.stderr, flush=True))
+
+    pending = BoundedQueue(args.buffer)
+    if alert_engine is not None:
+        # 和快照一起排队的是当时正在告警的规则
+        def publish(snapshot):
+            pending.put((snapshot, alert_engine.firing_rules))
+        publish = alert_engine.publisher(publish)
+    else:
+        def publish(snapshot):
+            pending.put((snapshot, ()))
+    exporter = None
+    if args.metrics_port is not None:
+        try:
+            exporter = MetricsExporter(providers, args.metrics_host, args.metrics_port).start()
+        except OSError as e:
+            print(f"无法启动抓取端点 {args.metrics_host}:{args.metrics_port}: {e}", file=sys.stderr)
+            return 2
+        publish = exporter.publisher(publish)
+    store = None
+    if args.record is not None:
+        try:
+            store = HistoryStore(args.record, series_names(providers))
+        except (OSError, ValueError) as e:
+            print(f"无法打开历史文件 {args.record}: {e}", file=sys.stderr)
+            if exporter is not None:
+                exporter.stop()
+            return 2
+        publish = store.publisher(providers, publish)
+    thread = CollectorThread(collector, publish)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8', buffering=1)
+    written = 0
+    thread.start()
+    try:
+        while not args.count or written < args.count:
+            try:
+                snapshot, firing = pending.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            record = snapshot_record(snapshot, providers)
+            if firing:
+                record['alerts'] = [rule.text for rule in firing]
+            if pending.dropped:
+                record['dropped'] = pending.dropped
+            out.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            out.flush()
+            written += 1
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        thread.stop()
+        if exporter is not None:
+            exporter.stop()
+        if store is not None:
+            store.flush()
+            store.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import time
+
+# 探针状态
+OK = 'ok'  # 正常采样
+BACKOFF = 'backoff'  # 连续失败，按指数退避跳过若干次采样
+OPEN = 'open'  # 熔断：失败次数过多，长时间停止采样，到期后试探一次
+UNAVAILABLE = 'unavailable'  # 已确认不可用（如找不到 nvidia-smi），不再采样
+
+STATE_TEXT = {
+    OK: "正常",
+    BACKOFF: "重试中",
+    OPEN: "已熔断",
+    UNAVAILABLE: "不可用",
+}
+
+
+class ProviderHealth:
+    """单个采样探针的健康状态：记住失败、指数退避、熔断
+
+    用法：
+        if health.should_sample():
+            try:
+                ...
+                health.record_success()
+            except Exception as e:
+                health.record_failure(e)
+    """
+
+    def __init__(self, name, base_delay=1.0, max_delay=60.0, failure_threshold=5,
+                 open_duration=300.0, clock=time.monotonic):
+        self.name = name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self.clock = clock
+
+        self.state = OK
+        self.failures = 0  # 连续失败次数
+        self.total_failures = 0
+        self.skipped = 0  # 因退避/熔断跳过的采样次数
+        self.last_error = None
+        self.next_attempt = 0.0
+
+    def should_sample(self):
+        """本次是否应该真正调用探针"""
+        if self.state == UNAVAILABLE or self.clock() < self.next_attempt:
+            self.skipped += 1
+            return False
+        return True
+
+    def record_success(self):
+        """探针调用成功，恢复正常状态"""
+        self.state = OK
+        self.failures = 0
+        self.next_attempt = 0.0
+
+    def record_failure(self, error=None):
+        """探针调用失败，计算下一次允许调用的时间"""
+        self.failures += 1
+        self.total_failures += 1
+        self.last_error = str(error) if error is not None else None
+        if self.state == UNAVAILABLE:
+            return
+
+        now = self.clock()
+        if self.failures >= self.failure_threshold:
+            # 熔断：长时间不再调用，到期后只试探一次
+            self.state = OPEN
+            self.next_attempt = now + self.open_duration
+        else:
+            self.state = BACKOFF
+            delay = min(self.base_delay * (2 ** (self.failures - 1)), self.max_delay)
+            self.next_attempt = now + delay
+
+    def mark_unavailable(self, reason=None):
+        """确认数据源不可用，之后不再采样（直到 reset）"""
+        self.state = UNAVAILABLE
+        if reason is not None:
+            self.last_error = str(reason)
+
+    def reset(self):
+        """清除所有失败记录"""
+        self.record_success()
+        self.last_error = None
+
+    @property
+    def available(self):
+        return self.state != UNAVAILABLE
+
+    def describe(self):
+        """生成状态说明文字（用于界面提示）"""
+        text = f"{self.name}: {STATE_TEXT[self.state]}"
+        if self.state != OK:
+            if self.failures:
+                text += f"，连续失败 {self.failures} 次"
+            if self.state in (BACKOFF, OPEN):
+                wait = max(self.next_attempt - self.clock(), 0)
+                text += f"，{wait:.0f}s 后重试"
+            if self.last_error:
+                text += f"\n{self.last_error}"
+        return text
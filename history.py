@@ -0,0 +1,133 @@
+import math
+import threading
+from array import array
+from collections import namedtuple
+
+# 一个窗口内的汇总结果
+Rollup = namedtuple('Rollup', ['min', 'max', 'avg', 'count'])
+
+# 汇总窗口：名称 -> 秒数
+WINDOWS = {'1m': 60, '10m': 600, '1h': 3600}
+
+# 每个汇总窗口划分的桶数，桶越多精度越高
+ROLLUP_BUCKETS = 60
+
+
+class SeriesBuffer:
+    """单个序列的定长环形缓冲区：时间戳和数值分别存放在两个 array('d') 中"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0  # 下一个写入位置
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self):
+        """最近一个 (时间戳, 数值)，没有数据时返回 None"""
+        if not self.count:
+            return None
+        index = (self.head - 1) % self.capacity
+        return self.times[index], self.values[index]
+
+
+class RollupRing:
+    """固定桶数的汇总环：每个桶保存一段时间内的 最小/最大/总和/个数
+
+    追加和查询的代价都与历史长度无关，内存固定为 ROLLUP_BUCKETS 个桶。
+    """
+
+    def __init__(self, window, buckets=ROLLUP_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = window / buckets
+        self.slots = array('q', [-1] * buckets)  # 每个桶对应的时间片编号，-1 表示空
+        self.mins = array('d', [0.0] * buckets)
+        self.maxs = array('d', [0.0] * buckets)
+        self.sums = array('d', [0.0] * buckets)
+        self.counts = array('q', [0] * buckets)
+
+    def add(self, timestamp, value):
+        slot = int(timestamp // self.bucket_seconds)
+        i = slot % self.buckets
+        if self.slots[i] != slot:
+            # 桶已过期，复用
+            self.slots[i] = slot
+            self.mins[i] = self.maxs[i] = self.sums[i] = value
+            self.counts[i] = 1
+            return
+        if value < self.mins[i]:
+            self.mins[i] = value
+        if value > self.maxs[i]:
+            self.maxs[i] = value
+        self.sums[i] += value
+        self.counts[i] += 1
+
+    def summary(self, now):
+        """汇总最近一个窗口内的数据，没有数据时返回 None"""
+        current = int(now // self.bucket_seconds)
+        oldest = current - self.buckets + 1
+        lo, hi, total, count = math.inf, -math.inf, 0.0, 0
+        for i in range(self.buckets):
+            if oldest <= self.slots[i] <= current:
+                lo = min(lo, self.mins[i])
+                hi = max(hi, self.maxs[i])
+                total += self.sums[i]
+                count += self.counts[i]
+        if not count:
+            return None
+        return Rollup(lo, hi, total / count, count)
+
+
+class MetricHistory:
+    """所有指标的内存历史：每个序列一个原始环形缓冲区，外加 1分钟/10分钟/1小时 的汇总环
+
+    采集线程写入，界面和导出程序读取；所有方法都在内部加锁，调用方不需要（也不能）持有 lock。
+    """
+
+    def __init__(self, capacity=3600, windows=WINDOWS):
+        self.capacity = capacity
+        self.windows = dict(windows)
+        self.lock = threading.Lock()
+        self._buffers = {}
+        self._rollups = {}
+
+    def append(self, name, timestamp, value):
+        """追加一个采样点（时间戳为 time.monotonic()）"""
+        value = float(value)
+        with self.lock:
+            buffer = self._buffers.get(name)
+            if buffer is None:
+                buffer = self._buffers[name] = SeriesBuffer(self.capacity)
+                self._rollups[name] = {key: RollupRing(seconds) for key, seconds in self.windows.items()}
+            buffer.append(timestamp, value)
+            for ring in self._rollups[name].values():
+                ring.add(timestamp, value)
+
+    def names(self):
+        """所有序列名"""
+        with self.lock:
+            return list(self._buffers)
+
+    def latest(self, name):
+        """某序列最近一个 (时间戳, 数值)"""
+        with self.lock:
+            buffer = self._buffers.get(name)
+            return buffer.latest() if buffer is not None else None
+
+    def rollup(self, name, window='1m', now=None):
+        """某序列在 '1m' / '10m' / '1h' 窗口内的 最小/最大/平均，没有数据时返回 None"""
+        with self.lock:
+            rings = self._rollups.get(name)
+            if rings is None:
+                return None
+            if now is None:
+                now = self._buffers[name].latest()[0]
+            return rings[window].summary(now)
@@ -0,0 +1,150 @@
+import json
+import math
+import threading
+import time
+from array import array
+from collections import deque
+
+# 直方图：从 1us 开始，每倍程 4 个桶，共 24 倍程（约 16 秒）
+SUB_BUCKETS = 4
+OCTAVES = 24
+
+
+class LatencyHistogram:
+    """对数刻度的延迟直方图，内存固定，记录和查询都是常数代价"""
+
+    def __init__(self):
+        self.counts = array('q', [0] * (SUB_BUCKETS * OCTAVES + 1))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds):
+        micros = seconds * 1e6
+        if micros <= 1.0:
+            index = 0
+        else:
+            index = min(int(math.log2(micros) * SUB_BUCKETS) + 1, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """估算分位数（取所在桶的上界，单位秒）"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(2 ** (index / SUB_BUCKETS) / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        """汇总为毫秒数值"""
+        return {
+            'count': self.count,
+            'mean_ms': self.mean * 1e3,
+            'p50_ms': self.percentile(0.5) * 1e3,
+            'p99_ms': self.percentile(0.99) * 1e3,
+            'max_ms': self.max * 1e3,
+            'last_ms': self.last * 1e3,
+        }
+
+
+class Instrumentation:
+    """监控程序自身的诊断数据：各环节耗时直方图 + 最近的异常
+
+    采集线程和界面线程都会写入，读取方通过 summary()/dump() 拿到一份副本。
+    常用的直方图名称：
+        sample.<指标名>  单个指标的采样耗时
+        tick             一整轮采样耗时
+        jitter           采集节拍相对计划时间的偏差
+        paint            paintEvent 耗时
+    """
+
+    def __init__(self, max_errors=50):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.error_counts = {}
+        self.errors = deque(maxlen=max_errors)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        """with instruments.timer('paint'): ... 记录代码块耗时"""
+        return _Timer(self, name)
+
+    def record_error(self, where, error):
+        """记录被吞掉的异常，代替原来注释掉的 print"""
+        with self.lock:
+            self.error_counts[where] = self.error_counts.get(where, 0) + 1
+            self.errors.append((time.time(), where, f"{type(error).__name__}: {error}"))
+
+    def histogram_summary(self, name):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            return histogram.summary() if histogram is not None else None
+
+    def slowest(self, prefix='sample.'):
+        """p99 最高的直方图，返回 (名称, p99秒)"""
+        with self.lock:
+            candidates = [(name, h.percentile(0.99)) for name, h in self.histograms.items()
+                          if name.startswith(prefix)]
+        return max(candidates, key=lambda item: item[1], default=(None, 0.0))
+
+    def summary(self):
+        """全部诊断数据的副本"""
+        with self.lock:
+            return {
+                'started': self.started,
+                'uptime_s': time.time() - self.started,
+                'histograms': {name: h.summary() for name, h in sorted(self.histograms.items())},
+                'error_counts': dict(self.error_counts),
+                'recent_errors': [
+                    {'time': stamp, 'where': where, 'error': text} for stamp, where, text in self.errors
+                ],
+            }
+
+    def dump(self, path=None, extra=None):
+        """导出诊断数据为 JSON；给出 path 时写入文件并返回路径，否则返回字符串"""
+        data = self.summary()
+        if extra:
+            data.update(extra)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if path is None:
+            return text
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+
+class _Timer:
+    __slots__ = ('instruments', 'name', 'start')
+
+    def __init__(self, instruments, name):
+        self.instruments = instruments
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.observe(self.name, time.perf_counter() - self.start)
+        return False
@@ -1,21 +1,124 @@
-import subprocess
+import argparse
+import os
 import sys
-import GPUtil
-import psutil
+import time
+
+STARTED = time.perf_counter()  # 启动计时的起点（解释器本身的启动不计入）
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # 无界面模式：在导入 PyQt5 之前就转交给 headless 模块
+    from headless import main as headless_main
+    sys.exit(headless_main(sys.argv[1:]))
+
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QFileDialog)
-from PyQt5.QtCore import Qt, QTimer, QRectF
-from PyQt5.QtGui import (QPainter, QBrush, QColor, QPen, QPixmap,
-                         QFont, QCursor, QPainterPath)
+                             QPushButton, QFileDialog, QShortcut, QToolTip, QScrollArea, QFrame)
+from PyQt5.QtCore import Qt, QEvent, QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QPixmap, QFont, QCursor, QKeySequence
+
+import alerts
+import backends
+from collector import CollectorThread, MetricCollector
+from devices import add_device_arguments, apply_device_arguments
+from exporter import MetricsExporter, add_exporter_arguments
+from health import BACKOFF, OPEN, UNAVAILABLE
+from history import MetricHistory
+from instrumentation import Instrumentation
+from pressure import add_pressure_arguments, apply_pressure_arguments
+from render import BackgroundCache, CoreHeatmap, LabelRenderer, Sparkline
+from remote import RemoteFleet, add_remote_arguments, hosts_from_arguments, status_text
+from scheduler import COLLAPSED, EXPANDED, HIDDEN
+from shared import SharedReaderThread, add_shared_arguments, connect, service_arguments, service_name
+from store import HistoryStore, ReplayThread, add_store_arguments, series_names
+from providers import REGISTRY, names_list
+
+IMPORTED = time.perf_counter()
+
+
+class SnapshotBridge(QObject):
+    """把采集线程的快照以信号形式转交给GUI线程"""
+    snapshot_ready = pyqtSignal(object)
+    fleet_ready = pyqtSignal(object)  # 远程主机的汇总结果
+
+
+class SparklineWidget(QWidget):
+    """显示一张 Sparkline 缓存的小部件：paintEvent 只画缓存的图和一个标题"""
+
+    def __init__(self, sparkline, caption):
+        super().__init__()
+        self.sparkline = sparkline
+        self.caption = caption
+        self.setFixedSize(sparkline.width, sparkline.height)
+        self.setToolTip(f"{caption} 最近 {sparkline.width / 10:.0f} 秒")
+
+    def paintEvent(self, event):
+        if self.sparkline.pixmap is None:
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.sparkline.pixmap)
+        painter.setPen(QColor(255, 255, 255, 160))
+        painter.setFont(self.font())
+        painter.drawText(2, 9, self.caption)
+        painter.end()
+
+
+class HeatmapWidget(QWidget):
+    """显示 CoreHeatmap 的小部件：一次 drawImage，悬停时提示所指核心的使用率"""
+
+    def __init__(self, heatmap):
+        super().__init__()
+        self.heatmap = heatmap
+        self.setFixedSize(heatmap.width, heatmap.height)
+
+    def set_values(self, values):
+        if self.heatmap.update(values):
+            # 核心数变了，格子重新排列后高度可能不同
+            self.setFixedSize(self.heatmap.width, self.heatmap.height)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.heatmap.paint(painter)
+        painter.end()
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            index = self.heatmap.core_at(event.pos().x(), event.pos().y())
+            if index is not None and index < len(self.heatmap.values):
+                QToolTip.showText(event.globalPos(), f"CPU {index}: {self.heatmap.values[index]:.1f}%", self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().event(event)
 
 
 class SystemMonitor(QWidget):
-    def __init__(self):
+    # 探针状态对应的文字颜色（正常时使用默认白色）
+    HEALTH_COLORS = {
+        BACKOFF: "rgb(255, 190, 90)",
+        OPEN: "rgb(255, 120, 120)",
+        UNAVAILABLE: "rgb(140, 140, 140)",
+    }
+    # 远程主机行最多同时显示几行，更多的主机滚动查看
+    FLEET_VISIBLE_LINES = 5
+
+    # 告警颜色优先于健康状态颜色
+    ALERT_COLORS = {
+        alerts.WARNING: "rgb(255, 215, 0)",
+        alerts.CRITICAL: "rgb(255, 60, 60)",
+    }
+
+    def __init__(self, enabled=None, disabled=(), diagnostics=False, metrics_port=None, metrics_host='127.0.0.1',
+                 record=None, replay=None, speed=10.0, tier='1s', alert_rules=(),
+                 shared_reader=None, remote_hosts=(), remote_interval=2.0, remote_timeout=1.0,
+                 startup_report=False):
         super().__init__()
+        construct_start = time.perf_counter()
+        self.startup = {}  # 启动各阶段的耗时（秒），见 mark_startup
         # 初始化配置
         self.expanded = False
         self.settings_open = False
-        self.bg_image = None
+        self.bg_image = None  # 背景原图（不缩放，各尺寸的合成结果在 bg_cache 中）
+        self.bg_cache = BackgroundCache()
         self.dragging = False
         self.drag_position = None
         self.bg_color = QColor(20, 20, 20, 160)  # 初始背景颜色
@@ -25,12 +128,23 @@ class SystemMonitor(QWidget):
         self.current_position = None  # 当前窗口位置
         # V1.2：手动展开标记
         self.manual_expanded = False  # 标记是否通过双击手动展开
+        self.diagnostics = diagnostics  # 展开时是否显示诊断行
+        self.remote_hosts = list(remote_hosts)  # 展开时逐行显示的远程主机
 
         # 设置窗口属性
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setFixedSize(450, 50)
 
+        # 按注册表创建指标提供者，界面的标签行由它们生成
+        self.providers = REGISTRY.create(enabled=enabled, disabled=disabled,
+                                         extra=('self',) if diagnostics else ())
+        self.history = MetricHistory()
+        self.instruments = Instrumentation()
+        # 数据源由采集线程打开，窗口先用占位文字显示出来；回放或使用共享采集进程时不打开
+        self.collector = MetricCollector(self.providers, history=self.history, instruments=self.instruments,
+                                         open_providers=False)
+
         # 创建UI
         self.init_ui()
 
@@ -41,38 +155,96 @@ class SystemMonitor(QWidget):
         self.original_position = self.pos()
         self.current_position = self.pos()
 
-        # 创建定时器更新数据
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_data)
-        self.timer.start(1000)  # 每秒更新一次
-
-        # 初始化数据
-        self.prev_net_io = psutil.net_io_counters()
-        self.prev_disk_io = psutil.disk_io_counters()
-        self.net_speed = "▼ 0B/s ▲ 0B/s "
-        self.cpu_usage = "0%"
-        self.gpu_usage = "0%"
-        self.mem_usage = "0%"
-        self.cpu_temp = "N/A"
-        self.gpu_temp = "N/A"
-        self.disk_speed = "0B/s R 0B/s W"
-
-        # 尝试初始化WMI用于获取温度
-        # self.ohm_available = False
-        # try:
-        #     self.w = wmi.WMI(namespace="root\\OpenHardwareMonitor")
-        #     # 测试连接是否成功
-        #     if len(self.w.Sensor()) > 0:
-        #         self.ohm_available = True
-        #         print("Open Hardware Monitor 已连接")
-        #     else:
-        #         print("警告: Open Hardware Monitor 未返回任何传感器数据")
-        # except Exception as e:
-        #     print(f"警告: 无法连接到Open Hardware Monitor: {str(e)}")
-        #     print("温度监控功能不可用，请安装Open Hardware Monitor")
-        #     self.w = None
-
-        self.update_data()
+        self.latest_values = {}  # 最近一次快照的原始数值（小图从这里取数）
+        self.label_states = {}  # 标签当前显示的健康状态
+        self.health_texts = {}  # 最近一次快照中的健康状态说明
+
+        # 后台采集线程：采样全部在线程中完成，快照通过排队信号回到GUI线程
+        self.snapshot_bridge = SnapshotBridge(self)
+        self.snapshot_bridge.snapshot_ready.connect(self.update_data, Qt.QueuedConnection)
+        publish = self.snapshot_bridge.snapshot_ready.emit
+
+        # 可选的 Prometheus 抓取端点：在采集线程中渲染好，界面线程不参与
+        self.exporter = None
+        if metrics_port is not None:
+            try:
+                self.exporter = MetricsExporter(self.providers, metrics_host, metrics_port).start()
+                publish = self.exporter.publisher(publish)
+            except OSError as e:
+                self.instruments.record_error("metrics_exporter", e)
+                print(f"无法启动抓取端点 {metrics_host}:{metrics_port}: {e}", file=sys.stderr)
+                self.exporter = None
+
+        # 可选的告警规则：在采集线程中判断，界面只读取结果改颜色
+        self.alerts = None
+        if alert_rules:
+            try:
+                self.alerts = alerts.AlertEngine(alert_rules, self.providers, instruments=self.instruments)
+                publish = self.alerts.publisher(publish)
+            except ValueError as e:
+                self.instruments.record_error("alerts", e)
+                print(e, file=sys.stderr)
+
+        # 可选的持久化历史文件
+        self.store = None
+        if record is not None and replay is None:
+            try:
+                self.store = HistoryStore(record, series_names(self.providers))
+                publish = self.store.publisher(self.providers, publish)
+            except (OSError, ValueError) as e:
+                self.instruments.record_error("history_store", e)
+                print(f"无法打开历史文件 {record}: {e}", file=sys.stderr)
+                self.store = None
+
+        if replay is not None:
+            self.collector_thread = ReplayThread(HistoryStore(replay, readonly=True), self.collector, publish,
+                                                 speed=speed, tier=tier)
+        elif shared_reader is not None:
+            # 快照来自共享采集进程，界面状态通过共享内存报告给它
+            self.collector_thread = SharedReaderThread(shared_reader, self.collector, publish)
+        else:
+            self.collector_thread = CollectorThread(self.collector, publish)
+        self.collector_thread.start()
+
+        # 远程主机：在后台线程的 asyncio 循环中轮询，每轮汇总后用一个信号交给界面
+        self.fleet = None
+        self.fleet_states = {}
+        if self.remote_hosts:
+            self.snapshot_bridge.fleet_ready.connect(self.update_fleet, Qt.QueuedConnection)
+            self.fleet = RemoteFleet(self.remote_hosts, self.snapshot_bridge.fleet_ready.emit,
+                                     interval=remote_interval, timeout=remote_timeout)
+            self.fleet.start()
+
+        # Ctrl+D 导出诊断数据
+        self.dump_shortcut = QShortcut(QKeySequence("Ctrl+D"), self)
+        self.dump_shortcut.activated.connect(self.dump_diagnostics)
+
+        # 启动耗时（秒）：导入、构造窗口、第一次绘制（占位文字）、第一次显示真实数据
+        self.startup['import'] = IMPORTED - STARTED
+        self.startup['construct'] = time.perf_counter() - construct_start
+        self.startup_report = startup_report
+        if startup_report:
+            # 数据源一直没有结果时也不要一直等下去
+            QTimer.singleShot(10000, self.report_startup)
+
+    def mark_startup(self, stage):
+        """记录某个启动阶段完成的时刻（相对进程开始导入的时间）"""
+        if stage in self.startup:
+            return
+        self.startup[stage] = time.perf_counter() - STARTED
+        if 'first_paint' in self.startup and 'first_data' in self.startup:
+            for name, seconds in self.startup.items():
+                self.instruments.observe('startup.' + name, seconds)
+            if self.startup_report:
+                self.report_startup()
+
+    def report_startup(self):
+        """--startup-report：把启动耗时（毫秒）作为一行 JSON 输出后退出"""
+        import json
+
+        print(json.dumps({name: round(seconds * 1000, 2) for name, seconds in self.startup.items()}), flush=True)
+        self.collector_thread.stop()
+        QApplication.quit()
 
     def center_on_top(self):
         """将窗口定位在屏幕顶部居中"""
@@ -144,29 +316,71 @@ class SystemMonitor(QWidget):
         self.row1.setSpacing(10)
         self.row1.setContentsMargins(15, 5, 15, 5)  # V1.2：左右边距15px，上下边距5px
 
-        self.net_label = self.create_label("0B/s")
-        self.cpu_label = self.create_label("CPU: 0%")
-        self.gpu_label = self.create_label("GPU: 0%")
-        self.mem_label = self.create_label("RAM: 0%")
-
-        self.row1.addWidget(self.net_label)
-        self.row1.addWidget(self.cpu_label)
-        self.row1.addWidget(self.gpu_label)
-        self.row1.addWidget(self.mem_label)
-
         # 第二行 - 扩展信息
         self.row2 = QHBoxLayout()
         self.row2.setSpacing(10)
         self.row2.setContentsMargins(25, 5, 15, 5)  # V1.2：左右边距15px，上下边距5px
 
-        self.cpu_temp_label = self.create_label("CPU: N/A")
-        self.gpu_temp_label = self.create_label("GPU: N/A")
-        self.disk_label = self.create_label(": 0B/s")
-
-        # 添加弹性空间使内容居中
-        self.row2.addWidget(self.disk_label)
-        self.row2.addWidget(self.cpu_temp_label)
-        self.row2.addWidget(self.gpu_temp_label)
+        # 设备行 - 最忙的网卡/磁盘，每个指标一行（展开时显示）
+        self.row_devices = QVBoxLayout()
+        self.row_devices.setSpacing(0)
+        self.row_devices.setContentsMargins(25, 0, 15, 5)
+
+        # 核心行 - 各逻辑 CPU 的热力条（展开时显示）
+        self.row_cores = QVBoxLayout()
+        self.row_cores.setSpacing(2)
+        self.row_cores.setContentsMargins(25, 0, 25, 5)
+
+        # 远程主机行 - 每台主机一行，超过 FLEET_VISIBLE_LINES 行时滚动（展开时显示）
+        self.row_fleet = QVBoxLayout()
+        self.row_fleet.setSpacing(0)
+        self.row_fleet.setContentsMargins(25, 0, 15, 5)
+
+        # 诊断行 - 监控程序自身的开销（--diagnostics 时展开显示）
+        self.row_diag = QHBoxLayout()
+        self.row_diag.setSpacing(10)
+        self.row_diag.setContentsMargins(15, 0, 15, 5)
+
+        # 根据注册的指标提供者生成标签，文字更新统一经过 renderer 做差量处理
+        self.renderer = LabelRenderer(self)
+        self.metric_labels = {}
+        # 压力行与设备行放在一起，每个指标占整行
+        rows = {1: self.row1, 2: self.row2, 'devices': self.row_devices, 'pressure': self.row_devices,
+                'cores': self.row_cores, 'diag': self.row_diag}
+        for provider in self.providers:
+            if provider.row in ('devices', 'pressure', 'cores'):
+                label = self.create_label(self.collector.texts[provider.name], font_size=9)
+                label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+            else:
+                label = self.create_label(self.collector.texts[provider.name])
+            self.metric_labels[provider.name] = label
+            self.renderer.add(provider.name, label)
+            # 提示文字在鼠标悬停时才生成
+            label.installEventFilter(self)
+            rows.get(provider.row, self.row2).addWidget(label)
+
+        # 热力条按当前的核心数排好格子，之后核心数变化时自动重新排列
+        self.heatmap_widget = None
+        if 'cores' in self.metric_labels:
+            self.heatmap_widget = HeatmapWidget(CoreHeatmap(os.cpu_count() or 1, width=400))
+            self.row_cores.addWidget(self.heatmap_widget)
+        self.heatmap_values = None
+
+        self.timing_label = self.create_label("采样: -", font_size=8)
+        self.paint_label = self.create_label("绘制: -", font_size=8)
+        self.row_diag.addWidget(self.timing_label)
+        self.row_diag.addWidget(self.paint_label)
+        self.renderer.add('diag.timing', self.timing_label)
+        self.renderer.add('diag.paint', self.paint_label)
+
+        self.fleet_labels = {}
+        for host in self.remote_hosts:
+            label = self.create_label(f"{host}: 连接中...", font_size=9)
+            label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+            label.setFixedHeight(20)
+            self.fleet_labels[host] = label
+            self.renderer.add('host:' + host, label)
+            self.row_fleet.addWidget(label)
 
         # 第三行 - 设置面板
         self.row3 = QHBoxLayout()
@@ -180,10 +394,61 @@ class SystemMonitor(QWidget):
         self.row1_widget = QWidget()
         self.row1_widget.setLayout(self.row1)
 
+        # 第二行下方的滚动小图：展开时每 100ms 前进一列，收起时完全停止
+        self.row_spark = QHBoxLayout()
+        self.row_spark.setSpacing(10)
+        self.row_spark.setContentsMargins(25, 0, 15, 5)
+        self.sparklines = []  # [(提供者, Sparkline, 小部件), ...]
+        for provider in self.providers:
+            if provider.sparkline and provider.row in (1, 2):
+                sparkline = Sparkline(fixed_max=provider.spark_max)
+                widget = SparklineWidget(sparkline, provider.title.strip(': ') or provider.name)
+                widget.setFont(QFont("Arial", 7))
+                self.sparklines.append((provider, sparkline, widget))
+                self.row_spark.addWidget(widget)
+        self.row_spark.addStretch(1)
+        self.spark_timer = QTimer(self)
+        self.spark_timer.setInterval(100)
+        self.spark_timer.timeout.connect(self.advance_sparklines)
+
+        row2_outer = QVBoxLayout()
+        row2_outer.setSpacing(0)
+        row2_outer.setContentsMargins(0, 0, 0, 0)
+        row2_outer.addLayout(self.row2)
+        if self.sparklines:
+            row2_outer.addLayout(self.row_spark)
         self.row2_widget = QWidget()
-        self.row2_widget.setLayout(self.row2)
+        self.row2_widget.setLayout(row2_outer)
         self.row2_widget.hide()
 
+        self.row_devices_widget = QWidget()
+        self.row_devices_widget.setLayout(self.row_devices)
+        self.row_devices_widget.hide()
+        # 设备行的文字行数（进程列表一个标签占三行）
+        self.devices_lines = sum(p.lines for p in self.providers if p.row in ('devices', 'pressure'))
+
+        self.row_cores_widget = QWidget()
+        self.row_cores_widget.setLayout(self.row_cores)
+        self.row_cores_widget.hide()
+
+        fleet_inner = QWidget()
+        fleet_inner.setLayout(self.row_fleet)
+        fleet_inner.setStyleSheet("background: transparent;")
+        self.row_fleet_widget = QScrollArea()
+        self.row_fleet_widget.setWidget(fleet_inner)
+        self.row_fleet_widget.setWidgetResizable(True)
+        self.row_fleet_widget.setFrameShape(QFrame.NoFrame)
+        self.row_fleet_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.row_fleet_widget.setStyleSheet("QScrollArea { background: transparent; }")
+        self.row_fleet_widget.viewport().setStyleSheet("background: transparent;")
+        self.fleet_lines = min(len(self.remote_hosts), self.FLEET_VISIBLE_LINES)
+        self.row_fleet_widget.setFixedHeight(20 * self.fleet_lines + 5)
+        self.row_fleet_widget.hide()
+
+        self.row_diag_widget = QWidget()
+        self.row_diag_widget.setLayout(self.row_diag)
+        self.row_diag_widget.hide()
+
         self.row3_widget = QWidget()
         self.row3_widget.setLayout(self.row3)
         self.row3_widget.hide()
@@ -191,6 +456,10 @@ class SystemMonitor(QWidget):
         # 添加到主布局
         self.main_layout.addWidget(self.row1_widget)
         self.main_layout.addWidget(self.row2_widget)
+        self.main_layout.addWidget(self.row_devices_widget)
+        self.main_layout.addWidget(self.row_cores_widget)
+        self.main_layout.addWidget(self.row_fleet_widget)
+        self.main_layout.addWidget(self.row_diag_widget)
         self.main_layout.addWidget(self.row3_widget)
 
         # 设置主布局
@@ -217,180 +486,126 @@ class SystemMonitor(QWidget):
         label.setFont(font)
         return label
 
-    def update_data(self):
-        """更新所有监控数据"""
-        # 更新网速
-        self.update_network_speed()
-
-        # 更新CPU使用率
-        self.cpu_usage = f"{psutil.cpu_percent()}%"
-        self.cpu_label.setText(f"CPU: {self.cpu_usage}")
-
-        # 更新内存使用率
-        mem = psutil.virtual_memory()
-        self.mem_usage = f"{mem.percent}%"
-        self.mem_label.setText(f"RAM: {self.mem_usage}")
-
-        # 更新GPU使用率
-        self.update_gpu_usage()
-
-        # 更新温度
-        self.update_temperatures()
-
-        # 更新磁盘速度
-        self.update_disk_speed()
-
-    def update_network_speed(self):
-        """计算并更新网络速度"""
-        try:
-            current_net_io = psutil.net_io_counters()
-            bytes_sent = current_net_io.bytes_sent - self.prev_net_io.bytes_sent
-            bytes_recv = current_net_io.bytes_recv - self.prev_net_io.bytes_recv
-
-            # 转换为合适的单位
-            sent_speed = self.format_speed(bytes_sent)
-            recv_speed = self.format_speed(bytes_recv)
-
-            self.net_speed = f"▼{recv_speed}/s ▲{sent_speed}/s"
-            self.net_label.setText(f"{self.net_speed}")
+    def update_data(self, snapshot):
+        """应用采集线程交来的快照（只更新界面，不做任何I/O）"""
+        self.latest_values = snapshot.values
+        if 'first_data' not in self.startup and snapshot.values:
+            self.mark_startup('first_data')
+        # 未变化和不可见的标签由 renderer 跳过，其余修改合并为一次重绘
+        self.renderer.apply(snapshot.texts)
+
+        self.update_health(snapshot.health)
+
+        if self.row_cores_widget.isVisible():
+            self.update_heatmap()
+
+        if self.row_diag_widget.isVisible():
+            self.update_diagnostics()
+
+    def update_fleet(self, results):
+        """应用远程主机的汇总结果：{主机: HostStatus}"""
+        self.renderer.apply({'host:' + host: status_text(status) for host, status in results.items()})
+        for host, status in results.items():
+            label = self.fleet_labels.get(host)
+            if label is None or self.fleet_states.get(host) == status.state:
+                continue
+            self.fleet_states[host] = status.state
+            color = self.HEALTH_COLORS.get(status.state)
+            label.setStyleSheet(f"color: {color};" if color else "")
+
+    def update_heatmap(self):
+        """核心使用率有新的采样时重新填充热力条（只在核心行可见时调用）"""
+        values = self.latest_values.get('cores')
+        if values is None or values is self.heatmap_values:
+            return
+        self.heatmap_values = values
+        height = self.heatmap_widget.height()
+        self.heatmap_widget.set_values(values)
+        if self.heatmap_widget.height() != height:
+            self.adjust_size()
+
+    def advance_sparklines(self):
+        """小图前进一列（10Hz，只在展开时运行），每张图只画最新的一列"""
+        values = self.latest_values
+        for provider, sparkline, widget in self.sparklines:
+            sparkline.push(provider.spark_value(values.get(provider.name)))
+            widget.update()
+
+    def update_diagnostics(self):
+        """刷新诊断行：最慢的采样、节拍抖动、绘制耗时"""
+        texts = {}
+        tick = self.instruments.histogram_summary('tick')
+        slowest, slowest_p99 = self.instruments.slowest('sample.')
+        if tick is not None:
+            text = f"采样 p99 {tick['p99_ms']:.1f}ms"
+            if slowest is not None:
+                text += f" 最慢 {slowest[len('sample.'):]} {slowest_p99 * 1e3:.1f}ms"
+            texts['diag.timing'] = text
+
+        jitter = self.instruments.histogram_summary('jitter')
+        paint = self.instruments.histogram_summary('paint')
+        parts = []
+        if jitter is not None:
+            parts.append(f"抖动 p99 {jitter['p99_ms']:.1f}ms")
+        if paint is not None:
+            parts.append(f"绘制 p99 {paint['p99_ms']:.1f}ms")
+        if parts:
+            texts['diag.paint'] = " ".join(parts)
+        self.renderer.apply(texts)
+
+    def dump_diagnostics(self):
+        """把诊断数据导出到临时目录的 JSON 文件"""
+        import tempfile
 
-            self.prev_net_io = current_net_io
-        except Exception as e:
-            # print(f"更新网络速度时出错: {str(e)}")
-            pass
-
-    def update_gpu_usage(self):
-        """使用隐藏窗口的方式获取GPU使用率"""
         try:
-            # 首先尝试使用 nvidia-smi 隐藏窗口获取
-            try:
-                result = subprocess.run([
-                    'nvidia-smi',
-                    '--query-gpu=utilization.gpu',
-                    '--format=csv,noheader,nounits'
-                ], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-                if result.returncode == 0 and result.stdout.strip():
-                    usage_values = result.stdout.strip().split('\n')
-                    if usage_values:
-                        # 取第一个GPU的使用率或计算平均值
-                        if len(usage_values) == 1:
-                            usage = float(usage_values[0].strip())
-                        else:
-                            usage = sum(float(u.strip()) for u in usage_values if u.strip()) / len(usage_values)
-
-                        self.gpu_usage = f"{usage:.0f}%"
-                        self.gpu_label.setText(f"GPU: {self.gpu_usage}")
-                        return
-            except (subprocess.SubprocessError, FileNotFoundError, ValueError):
-                # 如果 nvidia-smi 失败，回退到 GPUtil
-                pass
-
-            # 回退到 GPUtil 获取
-            gpus = GPUtil.getGPUs()
-            if gpus:
-                if len(gpus) == 1:
-                    # 单个GPU
-                    gpu = gpus[0]
-                    self.gpu_usage = f"{gpu.load * 100:.0f}%"
-                else:
-                    # 多个GPU，显示平均使用率
-                    total_usage = sum(gpu.load for gpu in gpus)
-                    avg_usage = total_usage / len(gpus)
-                    self.gpu_usage = f"{avg_usage * 100:.0f}%"
-            else:
-                self.gpu_usage = "N/A"
-
+            path = os.path.join(tempfile.gettempdir(),
+                                f"notos_diagnostics_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+            self.instruments.dump(path, extra={
+                'self': self.collector.values.get('self'),
+                'health': {p.name: p.health.state for p in self.providers},
+            })
+            QToolTip.showText(QCursor.pos(), f"诊断数据已导出到\n{path}", self)
         except Exception as e:
-            # print(f"获取GPU使用率时出错: {str(e)}")
-            self.gpu_usage = "Err"
-        self.gpu_label.setText(f"GPU: {self.gpu_usage}")
-
-    def update_temperatures(self):
-        """使用隐藏窗口的方式获取GPU温度"""
-        try:
-            # 使用 nvidia-smi 隐藏窗口获取温度
-            try:
-                result = subprocess.run([
-                    'nvidia-smi',
-                    '--query-gpu=temperature.gpu',
-                    '--format=csv,noheader,nounits'
-                ], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-                if result.returncode == 0 and result.stdout.strip():
-                    temp_values = result.stdout.strip().split('\n')
-                    if temp_values and temp_values[0].strip():
-                        if len(temp_values) == 1:
-                            temp = float(temp_values[0].strip())
-                        else:
-                            temp = sum(float(t.strip()) for t in temp_values if t.strip()) / len(temp_values)
-
-                        self.gpu_temp = f"{temp:.0f}°C"
-                        self.gpu_temp_label.setText(f"GPU: {self.gpu_temp}")
-                        return
-            except (subprocess.SubprocessError, FileNotFoundError, ValueError):
-                # 如果 nvidia-smi 失败，回退到 GPUtil
-                pass
-
-            # 回退到 GPUtil 获取温度
-            gpus = GPUtil.getGPUs()
-            if gpus:
-                if len(gpus) == 1:
-                    # 单个GPU
-                    gpu = gpus[0]
-                    if hasattr(gpu, 'temperature') and gpu.temperature is not None:
-                        self.gpu_temp = f"{gpu.temperature:.0f}°C"
-                    else:
-                        self.gpu_temp = "N/A"
-                else:
-                    # 多个GPU，显示平均温度
-                    valid_temps = [gpu.temperature for gpu in gpus
-                                   if hasattr(gpu, 'temperature') and gpu.temperature is not None]
-                    if valid_temps:
-                        avg_temp = sum(valid_temps) / len(valid_temps)
-                        self.gpu_temp = f"{avg_temp:.0f}°C"
-                    else:
-                        self.gpu_temp = "N/A"
-            else:
-                self.gpu_temp = "N/A"
-
-        except Exception as e:
-            # print(f"获取GPU温度时出错: {str(e)}")
-            self.gpu_temp = "Err"
-        self.gpu_temp_label.setText(f"GPU: {self.gpu_temp}")
-
-    def update_disk_speed(self):
-        """计算并更新磁盘读写速度"""
-        try:
-            current_disk_io = psutil.disk_io_counters()
-
-            # 计算读写字节差值
-            read_bytes = current_disk_io.read_bytes - self.prev_disk_io.read_bytes
-            write_bytes = current_disk_io.write_bytes - self.prev_disk_io.write_bytes
-
-            # 格式化速度
-            read_speed = self.format_speed(read_bytes)
-            write_speed = self.format_speed(write_bytes)
-
-            self.disk_speed = f"R {read_speed}/s W {write_speed}/s"
-            self.disk_label.setText(f"DSK: R {read_speed}/s W {write_speed}/s")
-
-            # 更新前值
-            self.prev_disk_io = current_disk_io
-        except Exception as e:
-            # print(f"更新磁盘速度时出错: {str(e)}")
-            pass
-
-    def format_speed(self, bytes):
-        """格式化速度显示"""
-        if bytes < 1024:
-            return f"{bytes}B"
-        elif bytes < 1024 * 1024:
-            return f"{bytes / 1024:.1f}KB"
-        elif bytes < 1024 * 1024 * 1024:
-            return f"{bytes / (1024 * 1024):.1f}MB"
-        else:
-            return f"{bytes / (1024 * 1024 * 1024):.1f}GB"
+            self.instruments.record_error("dump_diagnostics", e)
+
+    def update_health(self, health):
+        """用颜色显示各指标的健康状态和告警，说明文字留给悬停提示"""
+        self.health_texts = health
+        active = self.alerts.active if self.alerts is not None else {}
+        for name, (state, _) in health.items():
+            label = self.metric_labels.get(name)
+            state = active.get(name, state)
+            if label is None or self.label_states.get(name) == state:
+                continue
+            self.label_states[name] = state
+            color = self.ALERT_COLORS.get(state) or self.HEALTH_COLORS.get(state)
+            label.setStyleSheet(f"color: {color};" if color else "")
+
+    def eventFilter(self, obj, event):
+        """指标标签的悬停提示：显示时才生成健康状态和历史汇总"""
+        if event.type() == QEvent.ToolTip:
+            for name, label in self.metric_labels.items():
+                if label is obj:
+                    _, health_text = self.health_texts.get(name, (None, name))
+                    QToolTip.showText(event.globalPos(), self.history_tooltip(name, health_text), label)
+                    return True
+        return super().eventFilter(obj, event)
+
+    def history_tooltip(self, name, health_text):
+        """提示文字：健康状态 + 最近各窗口的 最小/最大/平均"""
+        lines = [health_text]
+        if self.alerts is not None:
+            lines.extend(f"告警: {text}" for text in self.alerts.describe(name))
+        prefix = name + "."
+        for series in self.history.names():
+            if series != name and not series.startswith(prefix):
+                continue
+            for window in ("1m", "10m", "1h"):
+                rollup = self.history.rollup(series, window)
+                if rollup is not None:
+                    lines.append(f"{series} {window}: 最小 {rollup.min:.1f} 最大 {rollup.max:.1f} "
+                                 f"平均 {rollup.avg:.1f}")
+        return "\n".join(lines)
 
     def update_display(self):
         """根据状态更新UI显示"""
@@ -403,24 +618,100 @@ class SystemMonitor(QWidget):
         else:
             self.row3_widget.hide()
 
-        # 第二行显示取决于是否展开
+        # 第二行显示取决于是否展开；小图只在展开时前进
         if self.expanded:
             self.row2_widget.show()
+            if self.sparklines and not self.spark_timer.isActive():
+                self.spark_timer.start()
         else:
             self.row2_widget.hide()
+            self.spark_timer.stop()
+
+        # 设备行只在展开且启用了设备指标时显示
+        if self.expanded and self.devices_lines:
+            self.row_devices_widget.show()
+        else:
+            self.row_devices_widget.hide()
+
+        # 核心行只在展开且启用了 cores 时显示
+        if self.expanded and self.heatmap_widget is not None:
+            self.row_cores_widget.show()
+            self.update_heatmap()
+        else:
+            self.row_cores_widget.hide()
+
+        # 远程主机行只在展开且配置了主机时显示
+        if self.expanded and self.fleet_lines:
+            self.row_fleet_widget.show()
+        else:
+            self.row_fleet_widget.hide()
+
+        # 诊断行只在展开且开启诊断时显示
+        if self.expanded and self.diagnostics:
+            self.row_diag_widget.show()
+            self.update_diagnostics()
+        else:
+            self.row_diag_widget.hide()
+
+        # 收起期间积压的文字在显示出来时一次性补上
+        self.renderer.flush()
 
         # 调整窗口大小
         self.adjust_size()
 
+        # 展开时加快采样，收起时放慢第二行
+        self.update_sampling_mode()
+
+    def update_sampling_mode(self):
+        """把窗口状态告诉采样调度器"""
+        if not self.isVisible() or self.isMinimized():
+            mode = HIDDEN
+        elif self.expanded:
+            mode = EXPANDED
+        else:
+            mode = COLLAPSED
+        scheduler = self.collector.scheduler
+        if scheduler.mode != mode:
+            scheduler.set_mode(mode)
+            self.collector_thread.wake()
+
+    def showEvent(self, event):
+        """窗口显示 - 恢复正常采样"""
+        super().showEvent(event)
+        self.update_sampling_mode()
+
+    def hideEvent(self, event):
+        """窗口隐藏 - 放慢采样"""
+        super().hideEvent(event)
+        self.update_sampling_mode()
+
+    def changeEvent(self, event):
+        """最小化/还原时调整采样"""
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_sampling_mode()
+
     def adjust_size(self):
         """根据状态调整窗口大小"""
         base_width = 450
+        # 设备行、诊断行额外占用的高度
+        extra_height = 0
+        if self.expanded:
+            extra_height += 20 * self.devices_lines
+            if self.sparklines:
+                extra_height += 23
+            if self.heatmap_widget is not None:
+                extra_height += 20 + 2 + self.heatmap_widget.height() + 5
+            if self.fleet_lines:
+                extra_height += 20 * self.fleet_lines + 5
+            if self.diagnostics:
+                extra_height += 25
         if self.settings_open:
             # 三行显示
-            self.setFixedSize(base_width, 150)
+            self.setFixedSize(base_width, 150 + extra_height)
         elif self.expanded:
             # 两行显示
-            self.setFixedSize(base_width, 100)
+            self.setFixedSize(base_width, 100 + extra_height)
         else:
             # 只显示第一行
             self.setFixedSize(base_width, 50)
@@ -432,14 +723,7 @@ class SystemMonitor(QWidget):
             # 如果用户拖动过窗口，保持当前位置，只更新大小
             self.move(self.current_position)
 
-        # 更新背景（如果有）
-        if hasattr(self, 'bg_image') and self.bg_image:
-            # 重新缩放背景
-            self.bg_image = QPixmap(self.bg_image).scaled(
-                self.size(),
-                Qt.IgnoreAspectRatio,
-                Qt.SmoothTransformation
-            )
+        # 背景由 bg_cache 按新尺寸取用（每种尺寸只从原图缩放一次）
         self.update()
 
     def change_background(self):
@@ -450,14 +734,10 @@ class SystemMonitor(QWidget):
         )
 
         if file_path:
-            # 加载图片并调整大小
+            # 加载图片，保留原图，绘制时按窗口尺寸缩放
             pixmap = QPixmap(file_path)
             if not pixmap.isNull():
-                self.bg_image = pixmap.scaled(
-                    self.size(),
-                    Qt.IgnoreAspectRatio,
-                    Qt.SmoothTransformation
-                )
+                self.bg_image = pixmap
                 # 重置图片透明度为默认值
                 self.image_alpha = 230
                 # 重置背景颜色设置
@@ -474,6 +754,14 @@ class SystemMonitor(QWidget):
 
     def close(self):
         """重写close函数"""
+        self.collector_thread.stop()
+        if self.fleet is not None:
+            self.fleet.stop()
+        if self.exporter is not None:
+            self.exporter.stop()
+        if self.store is not None:
+            self.store.flush()
+            self.store.close()
         sys.exit(0)
 
     def enterEvent(self, event):
@@ -540,8 +828,7 @@ class SystemMonitor(QWidget):
 
                 event.accept()
             except Exception as e:
-                # print(f"双击事件处理出错: {str(e)}")
-                pass
+                self.instruments.record_error("mouseDoubleClickEvent", e)
 
     def animate_move(self, target_position):
         """QPropertyAnimation移动到目标位置"""
@@ -559,7 +846,7 @@ class SystemMonitor(QWidget):
             # 如果动画不可用，直接移动
             self.move(target_position)
         except Exception as e:
-            # print(f"动画移动失败: {str(e)}")
+            self.instruments.record_error("animate_move", e)
             self.move(target_position)
 
     def adjust_image_alpha(self, delta):
@@ -578,8 +865,7 @@ class SystemMonitor(QWidget):
                 self.image_alpha = max(self.image_alpha - 15, 30)  # 最小透明度为30
 
         except Exception as e:
-            # print(f"调节图片透明度时出错: {str(e)}")
-            pass
+            self.instruments.record_error("adjust_image_alpha", e)
 
     def adjust_color_alpha(self, delta):
         """调节背景颜色的透明度"""
@@ -601,8 +887,7 @@ class SystemMonitor(QWidget):
             self.bg_color.setAlpha(new_alpha)
 
         except Exception as e:
-            # print(f"调节颜色透明度时出错: {str(e)}")
-            pass
+            self.instruments.record_error("adjust_color_alpha", e)
 
     def wheelEvent(self, event):
         """鼠标滚轮事件 - 改变背景透明度（支持颜色背景和图片背景）"""
@@ -625,55 +910,113 @@ class SystemMonitor(QWidget):
             event.accept()
 
         except Exception as e:
-            # print(f"处理滚轮事件时出错: {str(e)}")
-            pass
+            self.instruments.record_error("wheelEvent", e)
 
     def paintEvent(self, event):
-        """绘制窗口背景和边框 - 使用圆角裁剪"""
+        """绘制窗口背景和边框 - 直接使用预先合成的圆角背景"""
+        start = time.perf_counter()
         try:
+            has_image = self.bg_image is not None and not self.bg_image.isNull()
+            background = self.bg_cache.get(
+                self.width(), self.height(),
+                image=self.bg_image if has_image else None,
+                image_alpha=getattr(self, 'image_alpha', 230),
+                color=getattr(self, 'bg_color', None),
+                dpr=self.devicePixelRatioF(),
+            )
             painter = QPainter(self)
-            painter.setRenderHint(QPainter.Antialiasing)
-
-            radius = min(self.height() // 2, 25)
-
-            # 创建圆角矩形路径
-            path = QPainterPath()
-            rect = QRectF(0, 0, self.width(), self.height())
-            path.addRoundedRect(rect, radius, radius)
-
-            # 设置裁剪区域
-            painter.setClipPath(path)
-
-            # 绘制背景
-            if hasattr(self, 'bg_image') and self.bg_image and not self.bg_image.isNull():
-                # 绘制背景图片并应用透明度
-                painter.setOpacity(getattr(self, 'image_alpha', 230) / 255.0)
-                painter.drawPixmap(0, 0, self.bg_image)
-                painter.setOpacity(1.0)  # 恢复不透明度
-            else:
-                # 使用可调节的背景颜色
-                if hasattr(self, 'bg_color'):
-                    # 使用滚轮调节的颜色
-                    painter.setBrush(QBrush(self.bg_color))
-                else:
-                    # 默认黑色半透明背景
-                    painter.setBrush(QBrush(QColor(20, 20, 20, 230)))
-                painter.drawRect(self.rect())
-
-            # 绘制边框
-            painter.setPen(QPen(QColor(80, 80, 80), 1))
-            border_rect = QRectF(self.rect().adjusted(0, 0, -1, -1))
-            painter.drawRoundedRect(border_rect, radius, radius)
+            painter.drawPixmap(0, 0, background)
+            painter.end()
         except Exception as e:
-            # print(f"绘制错误: {str(e)}")
-            pass
+            self.instruments.record_error("paintEvent", e)
+        self.instruments.observe('paint', time.perf_counter() - start)
+        if 'first_paint' not in self.startup:
+            self.mark_startup('first_paint')
+
+
+def parse_args(argv):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotosIsland 系统监控")
+    parser.add_argument('--only', type=names_list, default=None, metavar='NAME[,NAME...]',
+                        help="只启用这些指标")
+    parser.add_argument('--disable', type=names_list, default=(), metavar='NAME[,NAME...]',
+                        help="禁用这些指标（例如无GPU的服务器上禁用 gpu,gpu_temp）")
+    parser.add_argument('--list-providers', action='store_true', help="列出所有可用指标后退出")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="展开时显示诊断行（自身CPU/内存、采样耗时、绘制耗时），Ctrl+D 导出诊断数据")
+    parser.add_argument('--headless', action='store_true',
+                        help="无界面模式，按行输出JSON（其余参数见 python headless.py --help）")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="输出启动耗时（导入、构造、第一次绘制、第一次显示数据，毫秒）后退出")
+    add_device_arguments(parser)
+    add_pressure_arguments(parser)
+    backends.add_backend_argument(parser)
+    add_exporter_arguments(parser)
+    add_store_arguments(parser)
+    alerts.add_alert_arguments(parser)
+    add_shared_arguments(parser)
+    add_remote_arguments(parser)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.list_providers:
+        print("\n".join(REGISTRY.names()))
+        sys.exit(0)
+    apply_device_arguments(args)
+    apply_pressure_arguments(args)
+    try:
+        backends.select(args.backend)
+    except OSError as e:
+        print(f"无法使用 {args.backend} 后端: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.replay is not None:
+        # 先检查一遍，文件不存在、被截断或不是历史记录文件时直接退出
+        try:
+            HistoryStore(args.replay, readonly=True).close()
+        except (OSError, ValueError) as e:
+            print(f"无法回放历史文件 {args.replay}: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    try:
+        alert_rules = alerts.load_rules(args.alert, args.alerts)
+        # 规则里的序列要对照启用的指标检查，窗口里的提供者要等构造窗口时才创建，这里按同样的参数
+        # 先建一份（只是实例化，不打开数据源）
+        providers = REGISTRY.create(enabled=args.only, disabled=args.disable,
+                                    extra=('self',) if args.diagnostics else ())
+        if alert_rules:
+            alerts.AlertEngine(alert_rules, providers, notifier=None)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        sys.exit(2)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+
+    shared_reader = None
+    if args.shared is not None and args.replay is None:
+        try:
+            shared_reader = connect(service_name(args), service_arguments(args))
+        except (OSError, ValueError) as e:
+            print(f"无法连接共享采集进程: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    try:
+        remote_hosts = hosts_from_arguments(args)
+    except (OSError, ValueError) as e:
+        print(f"无法读取远程主机列表: {e}", file=sys.stderr)
+        sys.exit(2)
+
     app = QApplication(sys.argv)
     # 不再检查是否已经有实例在运行，允许运行多个程序
     window_title = "NotosIsland"
-    monitor = SystemMonitor()
+    monitor = SystemMonitor(enabled=args.only, disabled=args.disable, diagnostics=args.diagnostics,
+                            metrics_port=args.metrics_port, metrics_host=args.metrics_host,
+                            record=args.record, replay=args.replay, speed=args.speed, tier=args.tier,
+                            alert_rules=alert_rules, shared_reader=shared_reader,
+                            remote_hosts=remote_hosts, remote_interval=args.remote_interval,
+                            remote_timeout=args.remote_timeout, startup_report=args.startup_report)
     monitor.setWindowTitle(window_title)
     monitor.show()
     sys.exit(app.exec_())
@@ -0,0 +1,244 @@
+"""Linux PSI（压力阻塞信息）：CPU、内存、I/O 上有多少时间花在等待资源上
+
+    python main_v1.2.py --pressure-cgroup                # 只看本进程所在的 cgroup，而不是整机
+    python main_v1.2.py --pressure-cgroup /sys/fs/cgroup/user.slice
+    python main_v1.2.py --pressure-trigger 0             # 不注册触发器，只按间隔读取
+
+内存占用率高不代表机器在卡，PSI 直接给出"有任务因为缺资源而停顿"的时间比例：some 为至少有
+一个任务在等，full 为所有非空闲任务都在等（整机的 CPU full 没有意义，总是 0）。界面显示 avg10，
+即最近 10 秒的平均值。
+
+除了按间隔读取，还给每种资源注册一个 PSI 触发器：2 秒窗口内停顿超过阈值时内核唤醒 poll。
+监视线程收到事件后立即让采集线程采样压力指标，停顿马上出现在界面和告警里，平时不需要加快
+轮询。注册不了触发器时（内核 6.4 之前需要 CAP_SYS_RESOURCE）只按间隔读取。
+"""
+import os
+import select
+import sys
+import threading
+
+from procfs import ProcFile
+from providers import MetricProvider
+
+RESOURCES = ('cpu', 'memory', 'io')
+SYSTEM_ROOT = '/proc/pressure'
+CGROUP_ROOT = '/sys/fs/cgroup'
+TRIGGER_WINDOW_US = 2000000  # 非特权进程注册的触发器，窗口必须是 2 秒的整数倍
+DEFAULT_TRIGGER_MS = 100
+
+# 由 --pressure-cgroup / --pressure-trigger 设置
+CGROUP = None  # None 表示整机（/proc/pressure），'self' 表示本进程所在的 cgroup，否则为 cgroup v2 目录
+TRIGGER_MS = DEFAULT_TRIGGER_MS  # 0 表示不注册触发器
+
+
+def own_cgroup(proc_root='/proc', cgroup_root=CGROUP_ROOT):
+    """本进程所在的 cgroup v2 目录（/proc/self/cgroup 中 0:: 开头的一行）"""
+    path = None
+    with open(os.path.join(proc_root, 'self', 'cgroup'), encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('0::'):
+                path = line[3:].strip().lstrip('/')
+                break
+    if path is None:
+        raise OSError("本进程不在 cgroup v2 中，没有 cgroup 的 *.pressure 文件")
+    # 混合模式（v1 + v2）下 v2 挂在 unified 目录
+    for root in (cgroup_root, os.path.join(cgroup_root, 'unified')):
+        directory = os.path.join(root, path)
+        if os.path.exists(os.path.join(directory, 'cpu.pressure')):
+            return directory
+    raise OSError(f"没有找到 cgroup /{path} 的 *.pressure 文件")
+
+
+def pressure_paths(cgroup=None):
+    """{资源名: 压力文件路径}；cgroup 为 None 时是整机的 /proc/pressure"""
+    if cgroup is None:
+        return {resource: os.path.join(SYSTEM_ROOT, resource) for resource in RESOURCES}
+    if cgroup == 'self':
+        cgroup = own_cgroup()
+    return {resource: os.path.join(cgroup, f'{resource}.pressure') for resource in RESOURCES}
+
+
+def parse_pressure(data):
+    """解析一个压力文件，返回 (some avg10, full avg10)，没有 full 行（老内核的 cpu）时为 None
+
+    文件内容：
+        some avg10=0.87 avg60=1.42 avg300=1.65 total=50044845
+        full avg10=0.00 avg60=0.00 avg300=0.00 total=0
+    """
+    some = full = None
+    for line in data.split(b'\n'):
+        if line.startswith(b'some '):
+            some = float(line.split()[1][6:])
+        elif line.startswith(b'full '):
+            full = float(line.split()[1][6:])
+    if some is None:
+        raise RuntimeError("压力文件中没有 some 行")
+    return some, full
+
+
+class PressureWatcher(threading.Thread):
+    """在 PSI 触发器上 poll，有停顿事件时在本线程中调用 callback(资源名)
+
+    每种资源一个触发器文件描述符；另有一个管道用来在 stop() 时唤醒 poll。
+    """
+
+    def __init__(self, paths, threshold_ms, callback, window_us=TRIGGER_WINDOW_US):
+        super().__init__(name="NotosPressure", daemon=True)
+        self.callback = callback
+        self.threshold_ms = threshold_ms
+        self.fds = {}  # 触发器文件描述符 -> 资源名
+        self.errors = {}  # 资源名 -> 注册失败或失效的原因
+        self.events = 0
+        self.callback_errors = 0
+        self.last_callback_error = None
+        # 内核把写入内容的最后一个字节当作结尾替换成 \0，所以要带上 \0 一起写
+        trigger = f"some {threshold_ms * 1000} {window_us}".encode('ascii') + b'\0'
+        for resource, path in paths.items():
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+            except OSError as e:
+                self.errors[resource] = e.strerror or str(e)
+                continue
+            try:
+                os.write(fd, trigger)
+            except OSError as e:
+                os.close(fd)
+                self.errors[resource] = e.strerror or str(e)
+                continue
+            self.fds[fd] = resource
+        self._wake_read, self._wake_write = os.pipe()
+
+    def run(self):
+        poller = select.poll()
+        for fd in self.fds:
+            poller.register(fd, select.POLLPRI)
+        poller.register(self._wake_read, select.POLLIN)
+        while True:
+            for fd, event in poller.poll():
+                if fd == self._wake_read:
+                    return
+                resource = self.fds[fd]
+                if event & (select.POLLERR | select.POLLNVAL):
+                    # cgroup 被删除等情况：这个触发器不会再有事件
+                    poller.unregister(fd)
+                    self.errors[resource] = "触发器已失效"
+                    continue
+                self.events += 1
+                try:
+                    self.callback(resource)
+                except Exception as e:
+                    # 回调只是提前唤醒采集线程，失败了按间隔采样照常进行；记下来在诊断信息里显示
+                    self.callback_errors += 1
+                    self.last_callback_error = str(e) or type(e).__name__
+
+    def describe(self):
+        parts = []
+        if self.fds:
+            resources = ",".join(sorted(self.fds.values()))
+            parts.append(f"触发器: {resources}（2 秒内停顿超过 {self.threshold_ms}ms），事件 {self.events} 次")
+        for resource, error in sorted(self.errors.items()):
+            parts.append(f"{resource} 触发器不可用: {error}")
+        if self.callback_errors:
+            parts.append(f"处理事件出错 {self.callback_errors} 次（最近: {self.last_callback_error}）")
+        return "\n".join(parts)
+
+    def stop(self, timeout=2.0):
+        if self.is_alive():
+            os.write(self._wake_write, b'x')
+            if threading.current_thread() is not self:
+                self.join(timeout)
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = {}
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+
+class PressureProvider(MetricProvider):
+    """CPU/内存/I/O 压力（PSI 的 some/full avg10），有停顿事件时立即刷新"""
+
+    name = 'pressure'
+    title = "压力: "
+    row = 'pressure'
+    interval = 2.0
+    placeholder = "-"
+    fields = ('cpu_some', 'cpu_full', 'memory_some', 'memory_full', 'io_some', 'io_full')
+    unit = "percent"
+
+    def __init__(self):
+        super().__init__()
+        self.paths = None
+        self.files = []
+        self.watcher = None
+
+    def open(self):
+        if not sys.platform.startswith('linux'):
+            self.health.mark_unavailable("PSI 只在 Linux（4.20 以上）上可用")
+            return
+        try:
+            self.paths = pressure_paths(CGROUP)
+            for resource in RESOURCES:
+                self.files.append(ProcFile(self.paths[resource], size=256))
+            # 内核没有开启 PSI（psi=0）时文件存在，但读取会失败
+            for proc_file in self.files:
+                parse_pressure(bytes(proc_file.read()))
+        except OSError as e:
+            self.close()
+            self.health.mark_unavailable(f"无法读取 PSI: {e.strerror or e}")
+
+    def watch(self, notify):
+        if not self.files or not TRIGGER_MS:
+            return
+        self.watcher = PressureWatcher(self.paths, TRIGGER_MS, lambda resource: notify())
+        if self.watcher.fds:
+            self.watcher.start()
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        for proc_file in self.files:
+            proc_file.close()
+        self.files = []
+
+    def sample(self):
+        """返回 (cpu some, cpu full, 内存 some, 内存 full, I/O some, I/O full)，单位为百分比"""
+        if not self.files:
+            return None
+        values = []
+        for proc_file in self.files:
+            values.extend(parse_pressure(bytes(proc_file.read())))
+        return tuple(values)
+
+    def format(self, value):
+        if value is None:
+            return "N/A"
+
+        def pair(some, full):
+            return f"{some:.1f}%" if full is None else f"{some:.1f}/{full:.1f}%"
+
+        return (f"CPU {pair(value[0], value[1])}  内存 {pair(value[2], value[3])}  "
+                f"I/O {pair(value[4], value[5])}")
+
+    def health_state(self):
+        state, text = super().health_state()
+        if self.paths is not None:
+            text = f"{text}\n数据源: {os.path.dirname(self.paths['cpu'])}（some/full avg10）"
+        if self.watcher is not None:
+            text = f"{text}\n{self.watcher.describe()}"
+        return state, text
+
+
+def add_pressure_arguments(parser):
+    parser.add_argument('--pressure-cgroup', nargs='?', const='self', default=None, metavar='DIR',
+                        help="PSI 压力读取 cgroup v2 目录下的 *.pressure（不带目录表示本进程所在的 cgroup），"
+                             "默认读取整机的 /proc/pressure")
+    parser.add_argument('--pressure-trigger', type=int, default=DEFAULT_TRIGGER_MS, metavar='MS',
+                        help=f"2 秒内停顿超过 MS 毫秒（小于 2000）时立即刷新压力指标（PSI 触发器），0 表示只按间隔读取，"
+                             f"默认 {DEFAULT_TRIGGER_MS}")
+
+
+def apply_pressure_arguments(args):
+    global CGROUP, TRIGGER_MS
+    CGROUP = args.pressure_cgroup
+    TRIGGER_MS = args.pressure_trigger
@@ -0,0 +1,139 @@
+import heapq
+import time
+
+from backends import load_psutil
+from providers import MetricProvider, format_speed
+
+# process_iter 每个进程在一次 oneshot 中读取的属性。名称不在其中：Linux 上名称被截断时
+# psutil 还要再读 cmdline，而真正需要显示名称的只有排在前面的几个进程
+ATTRS = ['create_time', 'cpu_times', 'memory_info', 'io_counters']
+
+# 超过这么久没有采样（例如收起期间），差值已经没有意义，重新取基准
+MAX_GAP = 30.0
+
+
+class ProcessTable:
+    """增量的进程表：按 (pid, 创建时间) 记住上一次的 CPU 时间和 I/O 字节数
+
+    psutil.process_iter 会复用已经创建过的 Process 对象，这里只额外保存差值需要的两个数，
+    pid 被新进程复用时创建时间不同，不会和旧进程的计数混在一起。进程名只在需要显示时读取，
+    同样按 (pid, 创建时间) 缓存。
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.known = {}  # (pid, 创建时间) -> (CPU时间, I/O字节数)
+        self.names = {}  # (pid, 创建时间) -> 进程名
+        self.prev_time = None
+        self.count = 0  # 最近一次遍历到的进程数
+
+    def reset(self):
+        self.known = {}
+        self.prev_time = None
+
+    def name(self, row):
+        """取 sample() 结果中某一行的进程名"""
+        key, proc = row[3], row[4]
+        name = self.names.get(key)
+        if name is None:
+            try:
+                name = proc.name()
+            except load_psutil().Error:
+                name = str(key[0])
+            self.names[key] = name
+        return name
+
+    def sample(self):
+        """遍历所有进程，返回 [(CPU%, RSS, I/O字节/秒, (pid, 创建时间), Process), ...]；刚取基准时返回 None"""
+        now = self.clock()
+        prev_time = self.prev_time
+        if prev_time is not None and now - prev_time > MAX_GAP:
+            self.known = {}
+            prev_time = None
+        elapsed = now - prev_time if prev_time is not None else 0.0
+
+        known = self.known
+        current = {}
+        rows = []
+        for proc in load_psutil().process_iter(ATTRS, ad_value=None):
+            info = proc.info
+            cpu_times = info['cpu_times']
+            memory = info['memory_info']
+            if cpu_times is None or memory is None:
+                continue
+            cpu_total = cpu_times.user + cpu_times.system
+            io = info['io_counters']
+            io_total = io.read_bytes + io.write_bytes if io is not None else 0
+            key = (proc.pid, info['create_time'])
+            current[key] = (cpu_total, io_total)
+            old = known.get(key)
+            if old is None or elapsed <= 0:
+                continue
+            rows.append((
+                max(cpu_total - old[0], 0.0) / elapsed * 100,
+                memory.rss,
+                int(max(io_total - old[1], 0) / elapsed),
+                key,
+                proc,
+            ))
+        # 只保留这一轮还活着的进程，退出的进程自然被丢掉
+        if len(self.names) > len(current):
+            self.names = {key: name for key, name in self.names.items() if key in current}
+        self.known = current
+        self.prev_time = now
+        self.count = len(current)
+        return rows if prev_time is not None else None
+
+
+class TopProcessesProvider(MetricProvider):
+    """占用 CPU、内存、I/O 最多的几个进程（展开时的设备行）
+
+    遍历全部进程的代价随进程数增长，所以只在窗口展开时采样。
+    """
+
+    name = 'procs'
+    title = ""
+    row = 'devices'
+    interval = 2.0
+    placeholder = "进程: -"
+    on_demand = True
+    lines = 3
+    top = 3  # 每项列出几个进程
+
+    def __init__(self):
+        super().__init__()
+        self.table = ProcessTable()
+
+    def reset(self):
+        self.table.reset()
+
+    def sample(self):
+        """返回 (按CPU, 按内存, 按I/O) 三个列表，每项为 (名称, 数值)"""
+        rows = self.table.sample()
+        if rows is None:
+            return None
+        by_cpu = heapq.nlargest(self.top, rows, key=lambda r: r[0])
+        by_rss = heapq.nlargest(self.top, rows, key=lambda r: r[1])
+        by_io = heapq.nlargest(self.top, (r for r in rows if r[2]), key=lambda r: r[2])
+        name = self.table.name
+        return ([(name(r), r[0]) for r in by_cpu],
+                [(name(r), r[1]) for r in by_rss],
+                [(name(r), r[2]) for r in by_io])
+
+    def format(self, value):
+        if value is None:
+            return "进程: 统计中…"
+        by_cpu, by_rss, by_io = value
+        return "\n".join((
+            "CPU  " + "  ".join(f"{name} {cpu:.0f}%" for name, cpu in by_cpu),
+            "内存 " + "  ".join(f"{name} {format_speed(rss)}" for name, rss in by_rss),
+            "I/O  " + ("  ".join(f"{name} {format_speed(rate)}/s" for name, rate in by_io) or "空闲"),
+        ))
+
+    def series(self, value):
+        # 进程随时出现和退出，不写入历史记录
+        return []
+
+    def health_state(self):
+        state, text = super().health_state()
+        return state, f"{text}\n进程数: {self.table.count}"
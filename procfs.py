@@ -0,0 +1,157 @@
+import os
+
+from backends import WholeDisks
+
+# /proc/diskstats 中的扇区固定按 512 字节计算（与内核、psutil 一致）
+SECTOR_SIZE = 512
+
+
+class ProcFile:
+    """常开的 /proc 文件：每次用 preadv 从偏移 0 读进同一块缓冲区，不重复打开、不分配新缓冲"""
+
+    def __init__(self, path, size=8192):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buffer = bytearray(size)
+
+    def read(self, limit=None):
+        """重新读取文件，返回有效部分的 memoryview（下次读取前有效）
+
+        limit 不为 None 时只读开头的 limit 字节（需要的字段都在文件开头时使用）。
+        """
+        if limit is not None:
+            head = memoryview(self.buffer)[:limit]
+            return head[:os.preadv(self.fd, [head], 0)]
+        while True:
+            length = os.preadv(self.fd, [self.buffer], 0)
+            if length < len(self.buffer):
+                return memoryview(self.buffer)[:length]
+            # 缓冲区被填满，文件可能更长：扩大后重读
+            self.buffer = bytearray(len(self.buffer) * 2)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class ProcfsBackend:
+    """直接读取 /proc 的 Linux 后端，接口与 backends.PsutilBackend 相同
+
+    四个文件在创建时打开并一直保持，每次只解析用到的字段；按设备的计数器直接返回
+    (字节a, 字节b) 元组，不构造 namedtuple。
+    """
+
+    name = 'procfs'
+    fields = {'net': None, 'disk': None}
+
+    def __init__(self, root='/proc', sys_block='/sys/block'):
+        self.root = root
+        self.sys_block = sys_block
+        self.files = []
+        try:
+            self.stat = self.open('stat')
+            self.meminfo = self.open('meminfo')
+            self.net_dev = self.open('net/dev')
+            self.diskstats = self.open('diskstats')
+        except OSError:
+            self.close()
+            raise
+        self.prev_cpu = None  # (总时间, 空闲时间)
+        self.percpu_limit = None  # 各 CPU 行在 /proc/stat 中大约占多少字节（之后的中断统计不读）
+        self.whole_disks = WholeDisks(sys_block)  # 分区不统计
+
+    def open(self, name):
+        proc_file = ProcFile(os.path.join(self.root, name))
+        self.files.append(proc_file)
+        return proc_file
+
+    def close(self):
+        for proc_file in self.files:
+            proc_file.close()
+        self.files = []
+
+    def cpu_percent(self):
+        """自上次调用以来的总 CPU 使用率（与 psutil.cpu_percent(interval=None) 相同的算法）"""
+        # 只需要第一行: cpu user nice system idle iowait irq softirq steal guest guest_nice
+        head = bytes(self.stat.read(256))
+        fields = head[:head.find(b'\n')].split()
+        times = [int(v) for v in fields[1:9]]
+        total = sum(times)
+        idle = times[3] + times[4]  # idle + iowait
+        prev, self.prev_cpu = self.prev_cpu, (total, idle)
+        if prev is None or total <= prev[0]:
+            return 0.0
+        busy = (total - prev[0]) - (idle - prev[1])
+        return round(max(busy, 0) / (total - prev[0]) * 100, 1)
+
+    def cpu_times_percpu(self):
+        """各逻辑 CPU 的累计时间：(总时间列表, 空闲时间列表)，单位为 jiffies
+
+        CPU 行之后的 intr 行在中断多的机器上很长，只读到 CPU 行结束的位置；各行字段数相同，
+        所以整段按空白切开后按列取值，每一列一次 map，不逐行解析。
+        """
+        limit = self.percpu_limit
+        data = bytes(self.stat.read(limit))
+        end = data.find(b'\nintr')
+        if end < 0 and limit is not None:
+            # 计数增长后超出了上次的长度：整个读一遍，重新确定长度
+            data = bytes(self.stat.read())
+            end = data.find(b'\nintr')
+            limit = None
+        if end < 0:
+            end = len(data)
+        if limit is None:
+            self.percpu_limit = end + 4096
+        tokens = data[:end].split()
+        width = data.find(b'\n')
+        width = len(data[:width].split()) if width > 0 else 0
+        if width < 9 or len(tokens) % width:
+            raise RuntimeError("无法解析 /proc/stat 中的 CPU 行")
+        # 跳过第一行（所有 CPU 的合计）；每行: cpuN user nice system idle iowait irq softirq steal ...
+        rows = tokens[width:]
+        columns = [list(map(int, rows[k::width])) for k in range(1, 9)]
+        totals = list(map(sum, zip(*columns)))
+        idles = list(map(int.__add__, columns[3], columns[4]))
+        return totals, idles
+
+    def memory_percent(self):
+        """(MemTotal - MemAvailable) / MemTotal，与 psutil.virtual_memory().percent 相同"""
+        # MemTotal 和 MemAvailable 在文件的前三行
+        data = bytes(self.meminfo.read(256))
+        total = available = None
+        for line in data.split(b'\n'):
+            if line.startswith(b'MemTotal:'):
+                total = int(line.split()[1])
+            elif line.startswith(b'MemAvailable:'):
+                available = int(line.split()[1])
+                break
+        if not total or available is None:
+            raise RuntimeError("/proc/meminfo 中没有 MemTotal/MemAvailable")
+        return round((total - available) / total * 100, 1)
+
+    def net_counters(self):
+        """{网卡名: (接收字节, 发送字节)}"""
+        counters = {}
+        # 前两行是表头；每行: 名称: rx_bytes rx_packets ... (8 项) tx_bytes ...
+        for line in bytes(self.net_dev.read()).split(b'\n')[2:]:
+            name, sep, rest = line.partition(b':')
+            if not sep:
+                continue
+            values = rest.split()
+            counters[name.strip().decode()] = (int(values[0]), int(values[8]))
+        return counters
+
+    def disk_counters(self):
+        """{磁盘名: (读字节, 写字节)}，只统计整块磁盘，不统计分区（与 psutil 后端相同）"""
+        counters = {}
+        whole_disks = self.whole_disks
+        # 每行: major minor 名称 reads merged sectors_read ms writes merged sectors_written ...
+        for line in bytes(self.diskstats.read()).split(b'\n'):
+            values = line.split()
+            if len(values) < 10:
+                continue
+            name = values[2].decode()
+            if whole_disks(name):
+                counters[name] = (int(values[5]) * SECTOR_SIZE, int(values[9]) * SECTOR_SIZE)
+        return counters
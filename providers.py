@@ -0,0 +1,473 @@
+import heapq
+import importlib
+import os
+import sys
+
+import backends
+import devices
+from health import ProviderHealth
+
+
+def format_speed(bytes):
+    """格式化速度显示"""
+    if bytes < 1024:
+        return f"{int(bytes)}B"
+    elif bytes < 1024 * 1024:
+        return f"{bytes / 1024:.1f}KB"
+    elif bytes < 1024 * 1024 * 1024:
+        return f"{bytes / (1024 * 1024):.1f}MB"
+    else:
+        return f"{bytes / (1024 * 1024 * 1024):.1f}GB"
+
+
+def names_list(text):
+    """逗号分隔的名称列表（命令行参数用）"""
+    return [name.strip() for name in text.split(',') if name.strip()]
+
+
+class MetricProvider:
+    """指标提供者基类
+
+    子类只需要给出名称、显示位置和 sample/format 两个方法，界面会根据注册表自动生成标签。
+    sample 在采集线程中调用，返回原始数值（拿不到时返回 None，出错时直接抛异常）；
+    format 把原始数值转换成标签上显示的文字。
+    """
+
+    name = None  # 唯一名称
+    title = ""  # 标签前缀，例如 "CPU: "
+    row = 1  # 显示在第几行（1 为常驻行，2 为展开行）
+    interval = 1.0  # 建议采样间隔（秒）
+    placeholder = "0%"  # 首次采样前显示的内容
+    fields = None  # 原始数值为元组时各分量的名称，用于生成历史序列名
+    on_demand = False  # 为 True 时只在所在行显示出来时才采样（代价较高的指标）
+    lines = 1  # 标签占几行文字
+    unit = ""  # 原始数值的单位（导出 Prometheus 指标时作为名称后缀），各分量不同时为 {分量名: 单位}
+    sparkline = False  # 展开时是否在第二行显示滚动小图
+    spark_max = None  # 小图纵轴的固定上限（百分比为 100），None 表示按可见范围自动缩放
+
+    def __init__(self):
+        self.health = ProviderHealth(self.name)
+
+    def open(self):
+        """采集开始前调用，可以在这里准备资源"""
+
+    def close(self):
+        """采集结束后调用，释放资源"""
+
+    def reset(self):
+        """跳过或失败后调用，差值类指标需要重新取基准"""
+
+    def watch(self, notify):
+        """采集线程开始后调用：事件驱动的提供者在这里开始监听，有事件时（在任意线程中）调用
+        notify()，采集线程会马上采样它；默认没有事件，只按间隔采样"""
+
+    def sample(self):
+        """采样一次，返回原始数值"""
+        raise NotImplementedError
+
+    def format(self, value):
+        """把原始数值格式化为显示文字"""
+        return "N/A" if value is None else str(value)
+
+    def series(self, value):
+        """把原始数值拆成 [(序列名, 数值), ...]，写入历史记录"""
+        if value is None:
+            return []
+        if self.fields:
+            return [(f"{self.name}.{field}", v) for field, v in zip(self.fields, value) if v is not None]
+        return [(self.name, value)]
+
+    def restore(self, series_values):
+        """从一条历史记录（{序列名: 数值}）还原原始数值（回放用），没有记录时返回 None"""
+        if not self.fields:
+            value = series_values.get(self.name)
+            return round(value, 1) if value is not None else None
+        # 取到第一个缺失的分量为止（例如没有开启高精度采样时没有峰值）
+        parts = []
+        for field in self.fields:
+            value = series_values.get(f"{self.name}.{field}")
+            if value is None:
+                break
+            parts.append(round(value, 1))
+        return tuple(parts) if parts else None
+
+    def spark_value(self, value):
+        """小图上画的数值（拿不到时返回 None，小图上留空）"""
+        return value
+
+    def unit_of(self, field):
+        """某个分量的单位"""
+        return self.unit.get(field, "") if isinstance(self.unit, dict) else self.unit
+
+    def counters(self):
+        """额外导出的累计计数器：[(指标名, 说明, [(标签字典, 数值), ...]), ...]"""
+        return []
+
+    def text(self, value):
+        """标签上显示的完整文字"""
+        return f"{self.title}{self.format(value)}"
+
+    def health_state(self):
+        """返回 (状态, 说明)"""
+        return self.health.state, self.health.describe()
+
+
+class DeviceProvider(MetricProvider):
+    """按设备采样的指标（网卡、磁盘）的公共部分，计数器的读取由 devices 模块共享"""
+
+    kind = None  # devices.SOURCE_SPECS 中的类别
+    unit = "bytes_per_second"
+    counter_names = None  # 导出的两个累计计数器 ((指标名, 说明), (指标名, 说明))
+
+    def __init__(self):
+        super().__init__()
+        self.rates = None
+
+    def open(self):
+        self.rates = devices.DeviceRates(self.kind)
+
+    def close(self):
+        if self.rates is not None:
+            self.rates.close()
+            self.rates = None
+
+    def reset(self):
+        if self.rates is not None:
+            self.rates.reset()
+
+    def read_totals(self):
+        """总速率 (a, b)；开启高精度采样时追加区间内的峰值 (a, b, 峰值a, 峰值b)"""
+        sample = self.rates.read()
+        if sample.peaks is None:
+            return sample.totals
+        return sample.totals + sample.peaks
+
+    def spark_value(self, value):
+        # 小图画两个方向之和（不含峰值）
+        return None if value is None else value[0] + value[1]
+
+    def format_totals(self, value, first, second):
+        text = f"{first}{format_speed(value[0])}/s {second}{format_speed(value[1])}/s"
+        if len(value) > 2:
+            # 第二行显示高精度采样得到的峰值
+            text += f"\n峰 {first}{format_speed(value[2])}/s {second}{format_speed(value[3])}/s"
+        return text
+
+    def counters(self):
+        # 各设备最近一次读到的累计字节数（只包含未被排除的设备）
+        if self.rates is None or not self.counter_names:
+            return []
+        devices_prev = self.rates.prev
+        return [(name, help_text, [({'device': device}, pair[index]) for device, pair in devices_prev.items()])
+                for index, (name, help_text) in enumerate(self.counter_names)]
+
+    def health_state(self):
+        state, text = super().health_state()
+        text = f"{text}\n{devices.FILTERS[self.kind].describe()}"
+        if self.rates is not None and self.rates.high_res:
+            text = f"{text}\n{self.rates.reader.high_res.describe()}"
+        return state, text
+
+
+class NetworkProvider(DeviceProvider):
+    """网络上下行速度（所有未被排除的网卡之和）"""
+
+    name = 'net'
+    kind = 'net'
+    counter_names = (('net_receive_bytes_total', "各网卡累计接收字节数"),
+                     ('net_transmit_bytes_total', "各网卡累计发送字节数"))
+    fields = ('recv', 'sent', 'recv_peak', 'sent_peak')
+    placeholder = "▼ 0B/s ▲ 0B/s "
+    sparkline = True
+
+    def sample(self):
+        """返回 (下载, 上传) 字节/秒，高精度采样时再加上两者的峰值"""
+        return self.read_totals()
+
+    def format(self, value):
+        return self.format_totals(value, "▼", "▲")
+
+
+class CpuProvider(MetricProvider):
+    """CPU使用率"""
+
+    name = 'cpu'
+    title = "CPU: "
+    unit = "percent"
+    sparkline = True
+    spark_max = 100
+
+    def sample(self):
+        return backends.current.cpu_percent()
+
+    def format(self, value):
+        return f"{value}%"
+
+
+class CoresProvider(MetricProvider):
+    """各逻辑 CPU 的使用率（展开时的热力条，一个核心一个格子）
+
+    所有核心的累计时间一次读出，差值在一次 zip 中算完；数值是按核心顺序排列的元组。
+    历史记录和告警只用最忙核心的使用率（cores.max），几百个核心不会变成几百个序列。
+    """
+
+    name = 'cores'
+    title = ""
+    row = 'cores'
+    placeholder = "核心: -"
+    on_demand = True
+    fields = ('max',)
+    unit = "percent"
+
+    def __init__(self):
+        super().__init__()
+        self.prev = None  # 上次的 (总时间列表, 空闲时间列表)
+
+    def reset(self):
+        self.prev = None
+
+    def sample(self):
+        """返回各核心的使用率元组，第一次采样（还没有基准）时返回 None"""
+        totals, idles = backends.current.cpu_times_percpu()
+        prev, self.prev = self.prev, (totals, idles)
+        if prev is None or len(prev[0]) != len(totals):
+            # 第一次采样，或有核心上线/下线：重新取基准
+            return None
+        return tuple([round(min(max(100.0 - (i1 - i0) * 100.0 / (t1 - t0), 0.0), 100.0), 1) if t1 > t0 else 0.0
+                      for t0, t1, i0, i1 in zip(prev[0], totals, prev[1], idles)])
+
+    def format(self, value):
+        if not value:
+            return "核心: 统计中…"
+        busiest = max(range(len(value)), key=value.__getitem__)
+        return (f"核心: {len(value)} 个  平均 {sum(value) / len(value):.0f}%  "
+                f"最忙 #{busiest} {value[busiest]:.0f}%")
+
+    def series(self, value):
+        if not value:
+            return []
+        return [('cores.max', max(value))]
+
+    def restore(self, series_values):
+        # 历史记录里只有 cores.max，还原不出各核心的数值
+        return None
+
+
+class MemoryProvider(MetricProvider):
+    """内存使用率"""
+
+    name = 'mem'
+    title = "RAM: "
+    unit = "percent"
+    sparkline = True
+    spark_max = 100
+
+    def sample(self):
+        return backends.current.memory_percent()
+
+    def format(self, value):
+        return f"{value}%"
+
+
+class DiskProvider(DeviceProvider):
+    """磁盘读写速度（所有未被排除的磁盘之和）"""
+
+    name = 'disk'
+    kind = 'disk'
+    counter_names = (('disk_read_bytes_total', "各磁盘累计读取字节数"),
+                     ('disk_written_bytes_total', "各磁盘累计写入字节数"))
+    title = "DSK: "
+    row = 2
+    placeholder = "R 0B/s W 0B/s"
+    sparkline = True
+    fields = ('read', 'write', 'read_peak', 'write_peak')
+
+    def sample(self):
+        """返回 (读, 写) 字节/秒，高精度采样时再加上两者的峰值"""
+        return self.read_totals()
+
+    def format(self, value):
+        return self.format_totals(value, "R ", "W ")
+
+
+class TopDevicesProvider(DeviceProvider):
+    """最忙的几个设备（展开时的设备行）"""
+
+    row = 'devices'
+    interval = 2.0
+    placeholder = "-"
+    top = 3  # 显示几个设备
+    labels = ("▼", "▲")  # 两个速率的前缀
+
+    def sample(self):
+        """返回按总速率排序的 [(设备名, 速率a, 速率b), ...]，空闲设备不列出"""
+        busy = [d for d in self.rates.read().devices if d[1] or d[2]]
+        return heapq.nlargest(self.top, busy, key=lambda d: d[1] + d[2])
+
+    def format(self, value):
+        if not value:
+            return "空闲"
+        first, second = self.labels
+        return "  ".join(f"{name} {first}{format_speed(a)} {second}{format_speed(b)}"
+                         for name, a, b in value)
+
+    def series(self, value):
+        # 设备名随时会变（容器、热插拔），不写入历史记录
+        return []
+
+
+class NetworkTopProvider(TopDevicesProvider):
+    name = 'net_top'
+    kind = 'net'
+    title = "网卡: "
+
+
+class DiskTopProvider(TopDevicesProvider):
+    name = 'disk_top'
+    kind = 'disk'
+    title = "磁盘: "
+    labels = ("R ", "W ")
+
+
+class CpuTempProvider(MetricProvider):
+    """CPU温度（Linux 上读取 hwmon/thermal zone，Windows 上暂无可用的数据源）"""
+
+    name = 'cpu_temp'
+    title = "CPU: "
+    row = 2
+    interval = 2.0
+    placeholder = "N/A"
+    unit = "celsius"
+
+    def __init__(self):
+        super().__init__()
+        self.reader = None
+
+    def open(self):
+        if os.name != 'nt':
+            self.open_sensors()
+            return
+        self.health.mark_unavailable("当前没有可用的CPU温度数据源")
+
+    def open_sensors(self):
+        """启动时扫描一次传感器，之后只重读打开着的 temp 文件"""
+        import sensors
+
+        found = sensors.cpu_sensors(sensors.discover())
+        if not found:
+            self.health.mark_unavailable("没有找到CPU温度传感器（hwmon/thermal zone）")
+            return
+        self.reader = sensors.TemperatureReader(found)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def sample(self):
+        if self.reader is None:
+            return None
+        temp = self.reader.read()
+        if temp is None:
+            raise RuntimeError("温度传感器读取失败")
+        return temp
+
+    def format(self, value):
+        return "N/A" if value is None else f"{value:.0f}°C"
+
+    def health_state(self):
+        state, text = super().health_state()
+        if self.reader is not None:
+            text = f"{text}\n{self.reader.describe()}"
+        return state, text
+
+
+class SelfProvider(MetricProvider):
+    """监控程序自身的CPU占用和常驻内存（诊断行）"""
+
+    name = 'self'
+    title = "自身: "
+    row = 'diag'
+    interval = 2.0
+    placeholder = "CPU 0% RSS 0MB"
+    fields = ('cpu', 'rss')
+    unit = {'cpu': "percent", 'rss': "bytes"}
+
+    def open(self):
+        self.process = backends.load_psutil().Process()
+        self.process.cpu_percent()
+
+    def sample(self):
+        with self.process.oneshot():
+            return self.process.cpu_percent(), self.process.memory_info().rss
+
+    def format(self, value):
+        cpu, rss = value
+        return f"CPU {cpu:.1f}% RSS {rss / (1024 * 1024):.0f}MB"
+
+
+class ProviderRegistry:
+    """指标提供者注册表
+
+    注册时只记录 "模块:类名"，真正用到时才导入，被禁用的提供者（比如无GPU服务器上的GPU）
+    连模块都不会加载。注册顺序就是界面上的显示顺序。
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._defaults = set()
+
+    def register(self, name, spec, default=True):
+        """注册提供者，spec 可以是类，也可以是 "模块:类名" 字符串
+
+        default=False 的提供者只有被显式启用时才会创建。
+        """
+        self._specs[name] = spec
+        if default:
+            self._defaults.add(name)
+        else:
+            self._defaults.discard(name)
+
+    def unregister(self, name):
+        self._specs.pop(name, None)
+        self._defaults.discard(name)
+
+    def names(self):
+        return list(self._specs)
+
+    def load(self, name):
+        """导入并返回提供者类"""
+        spec = self._specs[name]
+        if isinstance(spec, str):
+            module_name, class_name = spec.split(':')
+            spec = getattr(importlib.import_module(module_name), class_name)
+        return spec
+
+    def create(self, enabled=None, disabled=(), extra=()):
+        """按注册顺序实例化提供者
+
+        enabled 为 None 时启用所有默认提供者，extra 中的名称额外启用，disabled 中的名称会被跳过。
+        """
+        unknown = set(enabled or ()) | set(disabled) | set(extra)
+        unknown -= set(self._specs)
+        if unknown:
+            raise KeyError(f"未知的指标: {', '.join(sorted(unknown))}")
+        wanted = set(self._defaults if enabled is None else enabled) | set(extra)
+        return [self.load(name)() for name in self._specs
+                if name in wanted and name not in disabled]
+
+
+REGISTRY = ProviderRegistry()
+REGISTRY.register('net', NetworkProvider)
+REGISTRY.register('cpu', CpuProvider)
+REGISTRY.register('gpu', 'gpu_providers:GpuUsageProvider')
+REGISTRY.register('mem', MemoryProvider)
+REGISTRY.register('disk', DiskProvider)
+REGISTRY.register('cpu_temp', CpuTempProvider)
+REGISTRY.register('gpu_temp', 'gpu_providers:GpuTempProvider')
+REGISTRY.register('cores', CoresProvider)
+REGISTRY.register('pressure', 'pressure:PressureProvider', default=sys.platform.startswith('linux'))
+REGISTRY.register('net_top', NetworkTopProvider)
+REGISTRY.register('disk_top', DiskTopProvider)
+REGISTRY.register('procs', 'processes:TopProcessesProvider')
+REGISTRY.register('self', SelfProvider, default=False)
@@ -0,0 +1,306 @@
+"""远程主机汇总：在各台服务器上运行采集代理，桌面上的灵动岛轮询它们，展开时每台主机一行
+
+    python remote.py --bind 0.0.0.0 --port 9102          # 在服务器上运行代理
+    python main_v1.2.py --remote build1,build2:9102      # 桌面上显示这些主机
+
+协议：TCP 长连接，一问一答。客户端每次发 1 字节请求，代理回一帧：4 字节小端长度 + JSON
+（主机名、时间、第一行各指标的文字、原始数值、健康状态）。代理在每次采样后就把这一帧编码
+好缓存起来，请求只是把缓存写回，多少个客户端都不会触发额外采样。
+
+客户端在后台线程里跑一个 asyncio 事件循环，对每台主机保持一条连接，各自有超时和退避；
+每轮只把汇总结果用一个信号交给界面，主机再多也不会占用界面线程。asyncio 只在真正运行代理或
+轮询时才导入，不拖慢界面启动。
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import backends
+from collector import CollectorThread, MetricCollector
+from devices import add_device_arguments, apply_device_arguments
+from health import OK, ProviderHealth
+from pressure import add_pressure_arguments, apply_pressure_arguments
+from providers import REGISTRY, names_list
+from scheduler import HEADLESS, SamplingScheduler
+from store import series_names
+
+DEFAULT_PORT = 9102
+FRAME = struct.Struct('<I')
+MAX_FRAME = 1024 * 1024
+REQUEST = b'?'
+
+# 一台主机的最新状态：state 为探针状态（health.OK 等），data 为代理发来的内容（失败时为上次的）
+HostStatus = namedtuple('HostStatus', ['host', 'state', 'data', 'error', 'latency'])
+
+
+def encode_frame(payload):
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return FRAME.pack(len(data)) + data
+
+
+async def read_frame(reader):
+    length = FRAME.unpack(await reader.readexactly(FRAME.size))[0]
+    if length > MAX_FRAME:
+        raise ValueError(f"帧太大: {length} 字节")
+    return json.loads(await reader.readexactly(length))
+
+
+class Agent:
+    """代理一侧：每次采样后编码一帧缓存起来，请求时原样写回"""
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+        self.hostname = socket.gethostname()
+        self.frame = encode_frame({'host': self.hostname, 'time': time.time(), 'row': [],
+                                   'values': {}, 'health': {}})
+        self.requests = 0
+
+    def update(self, snapshot):
+        values = {}
+        for provider in self.providers:
+            for name, value in provider.series(snapshot.values.get(provider.name)):
+                values[name] = value
+        self.frame = encode_frame({
+            'host': self.hostname,
+            'time': time.time(),
+            'row': [snapshot.texts[p.name] for p in self.providers if p.row == 1],
+            'values': values,
+            'health': {name: state for name, (state, _) in snapshot.health.items()},
+        })
+
+    async def handle(self, reader, writer):
+        import asyncio
+
+        try:
+            while await reader.readexactly(1):
+                self.requests += 1
+                writer.write(self.frame)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        import asyncio
+
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class RemoteFleet(threading.Thread):
+    """客户端一侧：后台线程中的 asyncio 循环，每台主机一条长连接
+
+    callback 在本线程中调用，参数为 {主机: HostStatus} 的只读字典，每轮最多一次。
+    """
+
+    def __init__(self, hosts, callback, interval=2.0, timeout=1.0):
+        super().__init__(name="NotosRemote", daemon=True)
+        self.hosts = list(hosts)
+        self.callback = callback
+        self.interval = interval
+        self.timeout = timeout
+        self.health = {host: ProviderHealth(host, base_delay=interval, max_delay=interval * 8,
+                                            open_duration=60.0) for host in self.hosts}
+        self.results = {host: HostStatus(host, None, None, None, None) for host in self.hosts}
+        self.changed = True
+        self.loop = None
+        self._stop_event = None
+
+    def run(self):
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.main())
+        finally:
+            self.loop.close()
+
+    async def main(self):
+        import asyncio
+
+        self._stop_event = asyncio.Event()
+        tasks = []
+        for i, host in enumerate(self.hosts):
+            # 错开各主机的轮询时刻，避免所有请求挤在同一瞬间
+            offset = self.interval * i / max(len(self.hosts), 1)
+            tasks.append(asyncio.ensure_future(self.poll_host(host, offset)))
+        try:
+            while not self._stop_event.is_set():
+                if self.changed:
+                    self.changed = False
+                    self.callback(MappingProxyType(dict(self.results)))
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def poll_host(self, host, offset):
+        import asyncio
+
+        address, port = split_host(host)
+        health = self.health[host]
+        connection = None
+        await asyncio.sleep(offset)
+        try:
+            while True:
+                start = time.monotonic()
+                if health.should_sample():
+                    try:
+                        if connection is None:
+                            connection = await asyncio.wait_for(asyncio.open_connection(address, port),
+                                                                self.timeout)
+                        reader, writer = connection
+                        writer.write(REQUEST)
+                        data = await asyncio.wait_for(read_frame(reader), self.timeout)
+                        health.record_success()
+                        self.set_result(host, OK, data, None, time.monotonic() - start)
+                    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                        if connection is not None:
+                            connection[1].close()
+                            connection = None
+                        error = str(e) or type(e).__name__
+                        health.record_failure(error)
+                        # 保留上次的内容，界面上标出状态和原因
+                        self.set_result(host, health.state, self.results[host].data, error, None)
+                delay = max(self.interval - (time.monotonic() - start), 0.0)
+                if health.next_attempt > time.monotonic():
+                    delay = max(delay, health.next_attempt - time.monotonic())
+                await asyncio.sleep(delay)
+        finally:
+            if connection is not None:
+                connection[1].close()
+
+    def set_result(self, host, state, data, error, latency):
+        self.results[host] = HostStatus(host, state, data, error, latency)
+        self.changed = True
+
+    def wake(self):
+        pass
+
+    def stop(self, timeout=2.0):
+        if self.loop is not None and self._stop_event is not None:
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+def status_text(status):
+    """一台主机在界面上的一行文字"""
+    if status.data is None:
+        return f"{status.host}: {status.error or '连接中...'}"
+    text = f"{status.host}  " + "  ".join(status.data.get('row', []))
+    if status.state != OK:
+        text += f"  ({status.error})"
+    return text
+
+
+def split_host(host):
+    """把 HOST[:PORT] 拆成 (地址, 端口)，端口不合法时抛 ValueError
+
+    IPv6 地址带端口时要写成 [addr]:port；不带方括号、含多个冒号的当作不带端口的 IPv6 地址。
+    """
+    if host.startswith('['):
+        address, bracket, rest = host[1:].partition(']')
+        if not bracket or (rest and not rest.startswith(':')):
+            raise ValueError(f"无法解析远程主机 {host!r}，IPv6 地址应写成 [addr]:port")
+        port = rest[1:]
+    elif host.count(':') == 1:
+        address, _, port = host.partition(':')
+    else:
+        address, port = host, ''
+    if not port:
+        return address, DEFAULT_PORT
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"远程主机 {host!r} 的端口不合法")
+    return address, int(port)
+
+
+def hosts_from_arguments(args):
+    """--remote 和 --remote-file 中的所有主机（去重），写法有误时抛 ValueError"""
+    hosts = []
+    for group in args.remote:
+        hosts.extend(group)
+    for path in args.remote_file:
+        with open(path, encoding='utf-8') as f:
+            hosts.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    for host in hosts:
+        split_host(host)
+    # 去重但保持顺序
+    return list(dict.fromkeys(hosts))
+
+
+def add_remote_arguments(parser):
+    parser.add_argument('--remote', type=names_list, action='append', default=[], metavar='HOST[:PORT][,...]',
+                        help=f"展开时显示这些远程主机（需要在主机上运行 remote.py 代理，默认端口 {DEFAULT_PORT}）")
+    parser.add_argument('--remote-file', action='append', default=[], metavar='FILE',
+                        help="远程主机列表文件，每行一个 HOST[:PORT]（IPv6 地址带端口时写成 [addr]:port）")
+    parser.add_argument('--remote-interval', type=float, default=2.0, help="轮询远程主机的间隔（秒），默认 2")
+    parser.add_argument('--remote-timeout', type=float, default=1.0, help="每台主机的超时（秒），默认 1")
+
+
+def carried(provider):
+    """这个提供者的数据会不会放进帧里：第一行的文字，或者写入历史记录的那些序列
+
+    设备行（最忙网卡/磁盘、进程列表）既不在第一行也没有序列，代理采了也发不出去。
+    """
+    return provider.row == 1 or bool(series_names([provider]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NotosIsland 远程采集代理")
+    parser.add_argument('--bind', default='127.0.0.1', help="监听地址，默认只监听本机；给其他主机用时设为 0.0.0.0")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"监听端口，默认 {DEFAULT_PORT}")
+    parser.add_argument('--only', type=names_list, default=None, metavar='NAME[,NAME...]', help="只启用这些指标")
+    parser.add_argument('--disable', type=names_list, default=(), metavar='NAME[,NAME...]', help="禁用这些指标")
+    add_device_arguments(parser)
+    add_pressure_arguments(parser)
+    backends.add_backend_argument(parser)
+    args = parser.parse_args(argv)
+    apply_device_arguments(args)
+    apply_pressure_arguments(args)
+    try:
+        backends.select(args.backend)
+    except OSError as e:
+        print(f"无法使用 {args.backend} 后端: {e}", file=sys.stderr)
+        return 2
+
+    # 无界面模式下按需指标也一直采样，帧里带不走的就不创建
+    providers = [provider for provider in REGISTRY.create(enabled=args.only, disabled=args.disable)
+                 if carried(provider)]
+    agent = Agent(providers)
+    collector = MetricCollector(providers, scheduler=SamplingScheduler(providers, mode=HEADLESS))
+    thread = CollectorThread(collector, agent.update)
+
+    import asyncio
+
+    async def run():
+        try:
+            await agent.serve(args.bind, args.port)
+        except OSError as e:
+            print(f"无法监听 {args.bind}:{args.port}: {e}", file=sys.stderr)
+            return 2
+        return 0
+
+    thread.start()
+    try:
+        return asyncio.run(run())
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        thread.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
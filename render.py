@@ -0,0 +1,324 @@
+import struct
+from collections import deque
+
+
+class LabelRenderer:
+    """把快照差量地应用到标签上
+
+    - 文字没有变化的标签不调用 setText（避免无意义的重新布局和重绘）
+    - 当前不可见的标签（收起时的第二行等）只记下最新文字，显示出来时再 flush
+    - 只 setText 文字变了的标签：Qt 把同一轮事件循环里的 update() 合并，只重绘这些标签的区域，
+      不需要再关闭窗口的更新（重新打开时会让整个窗口连同半透明背景重绘一遍）
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.labels = {}  # 名称 -> QLabel
+        self.shown = {}  # 名称 -> 标签上当前的文字
+        self.pending = {}  # 名称 -> 不可见期间积压的最新文字
+        self.applied = 0  # 实际调用 setText 的次数
+        self.skipped = 0  # 因未变化或不可见而跳过的次数
+
+    def add(self, name, label):
+        self.labels[name] = label
+        self.shown[name] = label.text()
+
+    def apply(self, texts):
+        """应用一批 名称 -> 文字，返回实际修改的标签数"""
+        changes = []
+        for name, text in texts.items():
+            label = self.labels.get(name)
+            if label is None:
+                continue
+            if self.shown.get(name) == text:
+                self.pending.pop(name, None)
+                self.skipped += 1
+                continue
+            if not label.isVisibleTo(self.window):
+                self.pending[name] = text
+                self.skipped += 1
+                continue
+            self.pending.pop(name, None)
+            changes.append((name, label, text))
+        self._commit(changes)
+        return len(changes)
+
+    def flush(self):
+        """把积压的文字应用到已经可见的标签上（展开时调用）"""
+        changes = [(name, self.labels[name], text) for name, text in self.pending.items()
+                   if self.labels[name].isVisibleTo(self.window)]
+        for name, _, _ in changes:
+            del self.pending[name]
+        self._commit(changes)
+
+    def _commit(self, changes):
+        for name, label, text in changes:
+            label.setText(text)
+            self.shown[name] = text
+        self.applied += len(changes)
+
+
+class BackgroundCache:
+    """预先合成好的窗口背景：圆角裁剪、透明度、边框都画进一张 QPixmap
+
+    每种窗口尺寸缓存一张，paintEvent 只需要一次 drawPixmap。背景图片、图片透明度或背景颜色
+    变化时缓存自动失效；图片总是从原图缩放，反复展开/收起也不会降低画质。
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._style = None
+        self._pixmaps = {}
+        self.builds = 0  # 重新合成的次数
+
+    def get(self, width, height, image=None, image_alpha=230, color=None, dpr=1.0):
+        """取得指定尺寸的背景，必要时重新合成"""
+        style = (image.cacheKey() if image is not None and not image.isNull() else None,
+                 image_alpha, color.rgba() if color is not None else None)
+        if style != self._style:
+            self._style = style
+            self._pixmaps.clear()
+
+        key = (width, height, dpr)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            if len(self._pixmaps) >= self.max_entries:
+                self._pixmaps.clear()
+            pixmap = self._pixmaps[key] = self.build(width, height, image, image_alpha, color, dpr)
+            self.builds += 1
+        return pixmap
+
+    def invalidate(self):
+        self._style = None
+        self._pixmaps.clear()
+
+    @staticmethod
+    def build(width, height, image, image_alpha, color, dpr):
+        """合成一张背景（与原来 paintEvent 的绘制步骤相同）"""
+        from PyQt5.QtCore import Qt, QRectF
+        from PyQt5.QtGui import QBrush, QColor, QPainter, QPainterPath, QPen, QPixmap
+
+        pixmap = QPixmap(int(width * dpr), int(height * dpr))
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        radius = min(height // 2, 25)
+
+        # 创建圆角矩形路径并裁剪
+        path = QPainterPath()
+        rect = QRectF(0, 0, width, height)
+        path.addRoundedRect(rect, radius, radius)
+        painter.setClipPath(path)
+
+        if image is not None and not image.isNull():
+            # 从原图缩放到目标尺寸，并应用透明度
+            scaled = image.scaled(int(width * dpr), int(height * dpr),
+                                  Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            scaled.setDevicePixelRatio(dpr)
+            painter.setOpacity(image_alpha / 255.0)
+            painter.drawPixmap(0, 0, scaled)
+            painter.setOpacity(1.0)
+        else:
+            painter.setBrush(QBrush(color if color is not None else QColor(20, 20, 20, 230)))
+            painter.drawRect(0, 0, width, height)
+
+        # 绘制边框
+        painter.setPen(QPen(QColor(80, 80, 80), 1))
+        painter.drawRoundedRect(QRectF(0, 0, width - 1, height - 1), radius, radius)
+        painter.end()
+        return pixmap
+
+
+class Sparkline:
+    """展开时第二行的滚动小图，内容缓存在一张 QPixmap 中
+
+    每来一个新数值就把整张图左移一列，只清空并画出最右边的一列，paintEvent 只需要一次
+    drawPixmap；每帧的开销与显示了多少历史无关。只有自动缩放的纵轴上限变化时才需要按
+    可见的数值整张重画（很少发生）。
+    """
+
+    def __init__(self, width=70, height=18, fixed_max=None, color=(120, 200, 255)):
+        self.width = width
+        self.height = height
+        self.fixed_max = fixed_max
+        self.scale = fixed_max or 1.0
+        self.color = color
+        self.values = deque(maxlen=width)  # 每一列对应的数值，None 表示没有数据
+        self.pixmap = None
+        self.pushes = 0
+        self.redraws = 0  # 整张重画的次数
+
+    def push(self, value):
+        """追加一个数值（最右边的新一列）"""
+        self.pushes += 1
+        dropped = self.values[0] if len(self.values) == self.values.maxlen else None
+        previous = self.values[-1] if self.values else None
+        self.values.append(value)
+        if self.pixmap is None or self._rescale(value, dropped):
+            self.redraw()
+            return
+
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtGui import QPainter
+
+        self.pixmap.scroll(-1, 0, self.pixmap.rect())
+        painter = QPainter(self.pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(self.width - 1, 0, 1, self.height, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        self._draw_column(painter, self.width - 1, previous, value)
+        painter.end()
+
+    def _rescale(self, value, dropped):
+        """自动缩放：新数值超出上限、或最大值移出可见范围后明显变小时调整上限"""
+        if self.fixed_max is not None:
+            return False
+        if value is not None and value > self.scale:
+            self.scale = value * 1.25
+            return True
+        if dropped is not None and dropped * 1.25 >= self.scale:
+            # 移出去的是（接近）最大值，才需要看一遍可见的数值
+            peak = max((v for v in self.values if v is not None), default=0)
+            if peak * 4 < self.scale:
+                self.scale = max(peak * 1.25, 1.0)
+                return True
+        return False
+
+    def redraw(self):
+        """按可见的数值整张重画"""
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtGui import QPainter, QPixmap
+
+        if self.pixmap is None:
+            self.pixmap = QPixmap(self.width, self.height)
+        self.pixmap.fill(Qt.transparent)
+        painter = QPainter(self.pixmap)
+        x = self.width - len(self.values)
+        previous = None
+        for value in self.values:
+            self._draw_column(painter, x, previous, value)
+            previous = value
+            x += 1
+        painter.end()
+        self.redraws += 1
+
+    def _draw_column(self, painter, x, previous, value):
+        from PyQt5.QtGui import QColor
+
+        if value is None:
+            return
+        y = self._y(value)
+        # 下方半透明填充 + 顶部与上一列相连的折线
+        painter.fillRect(x, y, 1, self.height - y, QColor(*self.color, 60))
+        painter.setPen(QColor(*self.color, 230))
+        if previous is None:
+            painter.drawPoint(x, y)
+        else:
+            painter.drawLine(x - 1, self._y(previous), x, y)
+
+    def _y(self, value):
+        ratio = min(max(value / self.scale, 0.0), 1.0) if self.scale else 0.0
+        return int(round((self.height - 1) * (1.0 - ratio)))
+
+    def clear(self):
+        self.values.clear()
+        if self.pixmap is not None:
+            self.redraw()
+
+
+def _heat_palette(stops=((0, (45, 55, 75)), (30, (40, 150, 90)), (70, (255, 200, 0)), (100, (255, 50, 50)))):
+    """0..100% 每个整数一种颜色，按 QImage.Format_RGB32 的内存布局（B G R A）预先打包成 4 字节"""
+    palette = []
+    for percent in range(101):
+        for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+            if p0 <= percent <= p1:
+                t = (percent - p0) / (p1 - p0)
+                r, g, b = (int(x + (y - x) * t) for x, y in zip(c0, c1))
+                break
+        palette.append(struct.pack('4B', b, g, r, 255))
+    return palette
+
+
+HEAT_PALETTE = _heat_palette()
+
+
+class CoreHeatmap:
+    """各核心使用率的热力条：一个核心一个像素，全部放在一张 QImage 里，绘制时整体放大
+
+    更新时按调色板把所有核心的颜色一次 join 成整块像素数据，不逐格绘制；paintEvent 只需要
+    一次不平滑的 drawImage 加一张缓存好的格线。核心再多也只是一次 join 和一次绘制。
+    """
+
+    def __init__(self, count, width=400, cell_height=8, max_rows=4):
+        self.width = width
+        self.cell_height = cell_height
+        self.max_rows = max_rows
+        self.values = ()
+        self.image = None
+        self.grid = None
+        self.updates = 0
+        self.resize(count)
+
+    def resize(self, count):
+        """按核心数重新排列格子：一行最多 64 个（核心更多时加宽到 max_rows 行放得下）"""
+        self.count = count
+        self.columns = max(min(count, max(64, -(-count // self.max_rows))), 1)
+        self.rows = max(-(-count // self.columns), 1)
+        self.height = self.rows * self.cell_height
+        self.padding = HEAT_PALETTE[0] * (self.columns * self.rows - count)
+        self.data = HEAT_PALETTE[0] * (self.columns * self.rows)
+        self.image = None
+        self.grid = None
+
+    def update(self, values):
+        """换上一组新的使用率（核心数变化时重新排列，返回 True）"""
+        resized = len(values) != self.count
+        if resized:
+            self.resize(len(values))
+        self.values = values
+        palette = HEAT_PALETTE
+        self.data = b''.join([palette[int(v)] for v in values]) + self.padding
+        self.image = None
+        self.updates += 1
+        return resized
+
+    def core_at(self, x, y):
+        """窗口坐标对应的核心序号（悬停提示用），不在格子上时返回 None"""
+        column = int(x * self.columns / self.width)
+        row = int(y // self.cell_height)
+        index = row * self.columns + column
+        if 0 <= column < self.columns and 0 <= row < self.rows and index < self.count:
+            return index
+        return None
+
+    def paint(self, painter):
+        from PyQt5.QtCore import QRect
+        from PyQt5.QtGui import QImage
+
+        if self.image is None:
+            # QImage 直接引用 self.data，不复制像素
+            self.image = QImage(self.data, self.columns, self.rows, self.columns * 4, QImage.Format_RGB32)
+        painter.drawImage(QRect(0, 0, self.width, self.height), self.image)
+        if self.grid is None:
+            self.grid = self._build_grid()
+        painter.drawPixmap(0, 0, self.grid)
+
+    def _build_grid(self):
+        """格子之间的分隔线（每种排列只画一次）"""
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtGui import QColor, QPainter, QPixmap
+
+        pixmap = QPixmap(self.width, self.height)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setPen(QColor(20, 20, 20, 200))
+        if self.width / self.columns >= 3:
+            for column in range(1, self.columns):
+                x = column * self.width // self.columns
+                painter.drawLine(x, 0, x, self.height - 1)
+        for row in range(1, self.rows):
+            painter.drawLine(0, row * self.cell_height, self.width - 1, row * self.cell_height)
+        painter.end()
+        return pixmap
@@ -0,0 +1,153 @@
+import ctypes
+import math
+import os
+import time
+
+# 界面状态
+EXPANDED = 'expanded'  # 鼠标悬停或双击展开
+COLLAPSED = 'collapsed'  # 收起，只显示第一行
+HIDDEN = 'hidden'  # 窗口不可见（最小化、被全屏程序挡住）
+HEADLESS = 'headless'  # 无界面模式，所有指标按原间隔采样
+
+# 各状态下采样间隔的倍数：(当前显示出来的指标, 没有显示的指标)
+MODE_FACTORS = {
+    EXPANDED: (0.5, 0.5),
+    COLLAPSED: (1.0, 4.0),
+    HIDDEN: (4.0, 8.0),
+    HEADLESS: (1.0, 1.0),
+}
+
+# 用户长时间无操作时额外放慢的倍数
+IDLE_FACTOR = 2.0
+IDLE_AFTER = 300.0  # 秒
+
+
+class SamplingScheduler:
+    """按指标和界面状态自适应的采样调度
+
+    每个指标的实际间隔 = 自身建议间隔 × 当前状态的倍数。所有到期时间都向上对齐到
+    quantum 的整数倍，并且把稍后就会到期的指标提前合并到同一次唤醒里，这样进程醒来的
+    次数尽可能少（笔记本省电、VDI 主机上多个实例也不会各自频繁唤醒CPU）。
+    """
+
+    def __init__(self, providers, mode=COLLAPSED, quantum=0.25, coalesce=0.25,
+                 presence_interval=5.0, clock=time.monotonic):
+        self.providers = list(providers)
+        self.mode = mode
+        fastest = min((p.interval for p in self.providers), default=quantum)
+        self.quantum = min(quantum, fastest)
+        self.coalesce = coalesce  # 提前量：占指标自身间隔的比例
+        self.presence_interval = presence_interval
+        self.clock = clock
+
+        self.last = {}  # 指标名 -> 上次采样时间（对齐到 quantum）
+        self.wakeups = 0
+        self.idle = False
+        self.obscured = False  # 被全屏程序挡住
+        self._presence_checked = None
+
+    def set_mode(self, mode):
+        self.mode = mode
+
+    def effective_mode(self):
+        """被全屏程序挡住时按隐藏处理"""
+        return HIDDEN if self.obscured and self.mode != HEADLESS else self.mode
+
+    def paused(self, provider):
+        """按需采样的指标（例如进程列表）只在展开显示时采样"""
+        return provider.on_demand and self.effective_mode() not in (EXPANDED, HEADLESS)
+
+    def interval(self, provider):
+        """某指标当前的实际采样间隔"""
+        mode = self.effective_mode()
+        shown, hidden = MODE_FACTORS[mode]
+        if mode in (EXPANDED, HEADLESS):
+            factor = shown
+        else:
+            factor = shown if provider.row == 1 else hidden
+        if self.idle and mode != HEADLESS:
+            factor *= IDLE_FACTOR
+        return provider.interval * factor
+
+    def align(self, when):
+        """向上对齐到 quantum 的整数倍"""
+        return math.ceil(when / self.quantum - 1e-9) * self.quantum
+
+    def due_time(self, provider):
+        last = self.last.get(provider.name)
+        if last is None:
+            return 0.0
+        return self.align(last + self.interval(provider))
+
+    def due(self, now=None):
+        """本次唤醒需要采样的指标（包括很快就会到期、可以合并进来的）"""
+        if now is None:
+            now = self.clock()
+        self.wakeups += 1
+        self.check_presence(now)
+        return [p for p in self.providers
+                if not self.paused(p) and self.due_time(p) <= now + self.interval(p) * self.coalesce]
+
+    def expire(self, provider):
+        """让某个指标立即到期（事件驱动的指标有新事件时，由采集线程之外调用）"""
+        self.last.pop(provider.name, None)
+
+    def mark(self, provider, now):
+        # 记为所在的对齐时刻，醒来稍晚一点不会让后续到期时间逐渐漂移
+        self.last[provider.name] = math.floor(now / self.quantum + 1e-9) * self.quantum
+
+    def next_wakeup(self):
+        """下一次需要醒来的时间"""
+        return min((self.due_time(p) for p in self.providers if not self.paused(p)),
+                   default=self.clock() + self.presence_interval)
+
+    def check_presence(self, now):
+        """定期检查用户是否空闲、是否有全屏程序（只在 Windows 上有效）"""
+        if self.mode == HEADLESS:
+            return
+        if self._presence_checked is not None and now - self._presence_checked < self.presence_interval:
+            return
+        self._presence_checked = now
+        idle_seconds = user_idle_seconds()
+        self.idle = idle_seconds is not None and idle_seconds >= IDLE_AFTER
+        self.obscured = fullscreen_app_active()
+
+
+class _LastInputInfo(ctypes.Structure):
+    _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+
+
+def user_idle_seconds():
+    """距离用户最后一次键鼠操作的秒数，不支持的平台返回 None"""
+    if os.name != 'nt':
+        return None
+    try:
+        info = _LastInputInfo()
+        info.cbSize = ctypes.sizeof(info)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        # GetTickCount 约 49.7 天回绕，两者都是 32 位，取差值时按无符号处理
+        return ((ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000.0
+    except Exception:
+        # 取不到空闲时间只是不进入空闲降频，按用户在场处理，采样照常进行
+        return None
+
+
+# SHQueryUserNotificationState 返回值中表示有全屏程序的几种状态
+QUNS_BUSY = 2
+QUNS_RUNNING_D3D_FULL_SCREEN = 3
+QUNS_PRESENTATION_MODE = 4
+
+
+def fullscreen_app_active():
+    """是否有全屏程序（游戏、演示等）挡在最前面，不支持的平台返回 False"""
+    if os.name != 'nt':
+        return False
+    try:
+        state = ctypes.c_int()
+        if ctypes.windll.shell32.SHQueryUserNotificationState(ctypes.byref(state)) != 0:
+            return False
+        return state.value in (QUNS_BUSY, QUNS_RUNNING_D3D_FULL_SCREEN, QUNS_PRESENTATION_MODE)
+    except Exception:
+        # 老版本 Windows 没有这个接口等情况：当作没有全屏程序，只是不会因此降频
+        return False
@@ -0,0 +1,95 @@
+"""Linux 温度传感器：启动时扫描一次 hwmon 和 thermal zone，之后只重读常开的 temp 文件
+
+测试时可以用 NOTOS_SYSFS_ROOT 指向一棵假的 sysfs 目录树（结构与 /sys 相同）。
+"""
+import glob
+import os
+from collections import namedtuple
+
+from procfs import ProcFile
+
+# 一个传感器：来源（hwmon 芯片名或 thermal zone 类型）、标签、temp 文件路径
+Sensor = namedtuple('Sensor', ['chip', 'label', 'path'])
+
+# CPU 温度的候选，越靠前越优先；每项为 (芯片名集合或 None, 标签前缀集合或 None)
+CPU_SENSOR_RULES = (
+    (None, ('Package id',)),  # Intel coretemp 的整颗CPU温度
+    (None, ('Tdie',)),  # AMD k10temp 的真实温度
+    (None, ('Tctl',)),  # AMD k10temp 的控制温度（部分型号带偏移）
+    (('coretemp', 'k10temp', 'zenpower'), None),  # 其余核心温度
+    (('x86_pkg_temp', 'cpu-thermal', 'cpu_thermal', 'soc_thermal', 'cpu'), None),  # thermal zone
+    (('acpitz',), None),  # 主板 ACPI 温度，聊胜于无
+)
+
+
+def sysfs_root():
+    return os.environ.get('NOTOS_SYSFS_ROOT', '/')
+
+
+def read_text(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def discover(root=None):
+    """扫描所有温度传感器（启动时调用一次）"""
+    root = sysfs_root() if root is None else root
+    sensors = []
+    for hwmon in sorted(glob.glob(os.path.join(root, 'sys/class/hwmon/hwmon*'))):
+        chip = read_text(os.path.join(hwmon, 'name')) or os.path.basename(hwmon)
+        for path in sorted(glob.glob(os.path.join(hwmon, 'temp*_input'))):
+            label = read_text(path[:-len('_input')] + '_label') or chip
+            sensors.append(Sensor(chip, label, path))
+    for zone in sorted(glob.glob(os.path.join(root, 'sys/class/thermal/thermal_zone*'))):
+        zone_type = read_text(os.path.join(zone, 'type'))
+        path = os.path.join(zone, 'temp')
+        if zone_type and os.path.exists(path):
+            sensors.append(Sensor(zone_type, zone_type, path))
+    return sensors
+
+
+def cpu_sensors(sensors):
+    """按 CPU_SENSOR_RULES 挑出最合适的一组传感器（多路CPU时会有多个）"""
+    for chips, labels in CPU_SENSOR_RULES:
+        matched = [s for s in sensors
+                   if (chips is None or s.chip in chips)
+                   and (labels is None or s.label.startswith(labels))]
+        if matched:
+            return matched
+    return []
+
+
+class TemperatureReader:
+    """一组常开的温度文件，每次读取返回其中的最高温度（摄氏度）"""
+
+    def __init__(self, sensors):
+        self.sensors = list(sensors)
+        self.files = []
+        try:
+            for sensor in self.sensors:
+                self.files.append(ProcFile(sensor.path, size=32))
+        except OSError:
+            self.close()
+            raise
+
+    def read(self):
+        temps = []
+        for temp_file in self.files:
+            try:
+                # 单位为千分之一摄氏度
+                temps.append(int(bytes(temp_file.read(32))) / 1000.0)
+            except (OSError, ValueError):
+                # 个别传感器偶尔读不到（休眠中的设备等），跳过
+                continue
+        return max(temps) if temps else None
+
+    def describe(self):
+        return "\n".join(f"{s.chip} {s.label}: {s.path}" for s in self.sensors)
+
+    def close(self):
+        for temp_file in self.files:
+            temp_file.close()
+        self.files = []
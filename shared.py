@@ -0,0 +1,446 @@
+"""多个实例共用一个采集进程：采集进程把最新快照写进共享内存，各实例只读取
+
+    python main_v1.2.py --shared        # 第一个实例会自动在后台启动采集进程
+    python shared.py --linger 0         # 也可以手动启动常驻的采集进程
+
+共享内存布局（小端）：
+    控制区   magic(8s) 版本号(Q) 数据长度(I) 采集进程 pid(I)
+    实例表   SLOTS 个 实例 pid(I) 界面状态(I) 心跳时间(d)
+    数据区   marshal 编码的 (时间戳, 数值, 文字, 健康状态)
+
+版本号是一个 seqlock：写入前加一（变成奇数），写完再加一（变回偶数）。读取方先读版本号，
+直接从共享内存解码（不先复制出来），再读一次版本号，两次相同且为偶数才算读到了完整的快照。
+
+采集进程按所有实例中"最需要"的界面状态采样（有一个展开就按展开的频率），所有实例都退出
+一段时间后自动结束。后端、设备过滤等参数以启动采集进程的那个实例为准。
+"""
+import argparse
+import getpass
+import marshal
+import os
+import re
+import signal
+import struct
+import sys
+import threading
+import time
+import zlib
+from types import MappingProxyType
+
+import backends
+from collector import CollectorThread, MetricCollector, Snapshot
+from devices import add_device_arguments, apply_device_arguments
+from pressure import add_pressure_arguments, apply_pressure_arguments
+from providers import REGISTRY, names_list
+from scheduler import COLLAPSED, EXPANDED, HIDDEN, SamplingScheduler
+
+MAGIC = b'NOTOSSHM'
+CONTROL = struct.Struct('<8sQII')
+SLOT = struct.Struct('<IId')
+SLOTS = 32
+DATA_OFFSET = 576  # CONTROL + SLOTS 个 SLOT，向上取整
+DEFAULT_SIZE = 512 * 1024
+
+# 界面状态在共享内存中的编号，数值越大越"需要"数据
+MODE_CODES = {HIDDEN: 1, COLLAPSED: 2, EXPANDED: 3}
+CODE_MODES = {code: mode for mode, code in MODE_CODES.items()}
+
+STALE_AFTER = 10.0  # 实例超过这么久没有心跳就视为已退出
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_name():
+    """每个用户一个采集进程"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        # 没有用户名（容器里没有 passwd 条目等）：POSIX 上用 uid，仍然每个用户一个；
+        # 否则用 pid，只是这个实例不和别人共用采集进程
+        user = str(os.getuid()) if hasattr(os, 'getuid') else str(os.getpid())
+    return "notos_" + re.sub(r'[^A-Za-z0-9_]', '_', user)
+
+
+def _attach(name):
+    """连接已有的共享内存，不让本进程退出时把它删掉"""
+    from multiprocessing import shared_memory
+
+    memory = shared_memory.SharedMemory(name=name)
+    if os.name != 'nt':
+        # 3.13 之前连接方也会被 resource_tracker 登记，进程退出时会把共享内存删掉
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        except Exception:
+            # 注销失败最多是本实例退出时把共享内存删掉，之后启动的实例找不到它会另起采集进程，
+            # 已经连上的实例不受影响（映射还在）
+            pass
+    return memory
+
+
+class SharedSnapshotWriter:
+    """采集进程一侧：创建共享内存，每个快照写一次"""
+
+    def __init__(self, name, size=DEFAULT_SIZE):
+        from multiprocessing import shared_memory
+
+        # 已经有采集进程时抛 FileExistsError
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buf = self.memory.buf
+        self.seq = 0
+        self.published = 0
+        self.oversized = 0
+        CONTROL.pack_into(self.buf, 0, MAGIC, 0, 0, os.getpid())
+
+    def publish(self, snapshot):
+        data = marshal.dumps((snapshot.timestamp, dict(snapshot.values), dict(snapshot.texts),
+                              dict(snapshot.health)))
+        if DATA_OFFSET + len(data) > len(self.buf):
+            self.oversized += 1
+            return
+        buf = self.buf
+        self.seq += 1
+        struct.pack_into('<Q', buf, 8, self.seq)  # 奇数：正在写
+        buf[DATA_OFFSET:DATA_OFFSET + len(data)] = data
+        struct.pack_into('<I', buf, 16, len(data))
+        self.seq += 1
+        struct.pack_into('<Q', buf, 8, self.seq)  # 偶数：写完
+        self.published += 1
+
+    def readers(self, now=None):
+        """仍在心跳的实例：[(pid, 界面状态), ...]"""
+        now = time.time() if now is None else now
+        result = []
+        for i in range(SLOTS):
+            pid, code, heartbeat = SLOT.unpack_from(self.buf, CONTROL.size + i * SLOT.size)
+            if pid and now - heartbeat < STALE_AFTER:
+                result.append((pid, CODE_MODES.get(code, COLLAPSED)))
+        return result
+
+    def close(self):
+        self.buf = None
+        self.memory.close()
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedSnapshotReader:
+    """界面一侧：连接共享内存，在实例表中占一个位置报告自己的界面状态"""
+
+    def __init__(self, name):
+        self.name = name
+        self.argv = []  # 启动采集进程用的参数，重新连接时沿用（由 connect 设置）
+        self.slot = None
+        self.memory = _attach(name)
+        self.buf = self.memory.buf
+        magic = CONTROL.unpack_from(self.buf, 0)[0]
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"共享内存 {name} 不是 NotosIsland 的采集数据")
+        self.pid = os.getpid()
+        self.mode = COLLAPSED
+        self.last_seq = None
+        self.torn = 0  # 读到正在写入的数据、重试的次数
+
+    def service_pid(self):
+        return CONTROL.unpack_from(self.buf, 0)[3]
+
+    def service_alive(self):
+        """采集进程是否还在（被杀掉时共享内存还在，只是不再更新）"""
+        psutil = backends.load_psutil()
+        try:
+            # 启动采集进程的那个实例没有回收它时，退出后会留下僵尸进程
+            return psutil.Process(self.service_pid()).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    def heartbeat(self, mode=None):
+        """写入心跳和界面状态（实例表满了就只读不报告）"""
+        if mode is not None:
+            self.mode = mode
+        now = time.time()
+        if self.slot is None or SLOT.unpack_from(self.buf, self._slot_offset(self.slot))[0] != self.pid:
+            self.slot = self._claim(now)
+            if self.slot is None:
+                return
+        SLOT.pack_into(self.buf, self._slot_offset(self.slot), self.pid, MODE_CODES.get(self.mode, MODE_CODES[COLLAPSED]), now)
+
+    def _slot_offset(self, slot):
+        return CONTROL.size + slot * SLOT.size
+
+    def _claim(self, now):
+        for i in range(SLOTS):
+            pid, _, heartbeat = SLOT.unpack_from(self.buf, self._slot_offset(i))
+            if not pid or pid == self.pid or now - heartbeat >= STALE_AFTER:
+                return i
+        return None
+
+    def read(self, retries=5):
+        """有新快照时返回 Snapshot，没有变化时返回 None"""
+        buf = self.buf
+        for _ in range(retries):
+            seq = struct.unpack_from('<Q', buf, 8)[0]
+            if seq == self.last_seq:
+                return None
+            if seq & 1 or seq == 0:
+                self.torn += seq & 1
+                time.sleep(0.001)
+                continue
+            length = struct.unpack_from('<I', buf, 16)[0]
+            try:
+                timestamp, values, texts, health = marshal.loads(buf[DATA_OFFSET:DATA_OFFSET + length])
+            except (EOFError, ValueError, TypeError):
+                decoded = False
+            else:
+                decoded = True
+            if decoded and struct.unpack_from('<Q', buf, 8)[0] == seq:
+                self.last_seq = seq
+                return Snapshot(
+                    timestamp=timestamp,
+                    values=MappingProxyType(values),
+                    texts=MappingProxyType(texts),
+                    health=MappingProxyType(health),
+                )
+            self.torn += 1
+        return None
+
+    def close(self):
+        if self.buf is None:
+            return
+        if self.slot is not None:
+            SLOT.pack_into(self.buf, self._slot_offset(self.slot), 0, 0, 0.0)
+        self.buf = None
+        self.memory.close()
+
+
+class SharedReaderThread(threading.Thread):
+    """读取共享快照交给界面，接口与 CollectorThread 相同"""
+
+    poll_interval = 0.1
+    check_interval = 1.0  # 没有新快照时，每隔多久确认一次采集进程还在
+    retry_interval = 2.0  # 重新连接失败后等多久再试
+
+    def __init__(self, reader, collector, callback):
+        super().__init__(name="NotosSharedReader", daemon=True)
+        self.reader = reader
+        self.segment_name = reader.name  # 共享内存名（不能用 name，那是线程名）
+        self.argv = reader.argv
+        self.collector = collector
+        self.callback = callback
+        self.reconnects = 0
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def run(self):
+        last_seen = time.monotonic()
+        while not self._stop_event.is_set():
+            wait = self.poll_interval
+            if self.reader is None:
+                if not self.reconnect():
+                    wait = self.retry_interval
+                last_seen = time.monotonic()
+            else:
+                self.reader.heartbeat(self.collector.scheduler.mode)
+                snapshot = self.reader.read()
+                now = time.monotonic()
+                if snapshot is not None:
+                    last_seen = now
+                    self.callback(self.collector.apply(snapshot))
+                elif now - last_seen >= self.check_interval:
+                    last_seen = now
+                    if not self.reader.service_alive():
+                        self.service_lost()
+            self._wake_event.wait(wait)
+            self._wake_event.clear()
+
+    def service_lost(self):
+        """采集进程异常退出：界面上保留最后的数值但标为不可用，然后重新连接"""
+        self.reader.close()
+        self.reader = None
+        self.callback(self.collector.stale("共享采集进程已退出，正在重新启动"))
+
+    def reconnect(self):
+        """重新连接（需要时重新启动采集进程），成功返回 True"""
+        try:
+            reader = connect(self.segment_name, self.argv)
+        except (OSError, ValueError) as e:
+            self.callback(self.collector.stale(f"无法重新启动共享采集进程: {e}"))
+            return False
+        if self._stop_event.is_set():
+            reader.close()
+            return False
+        self.reader = reader
+        self.reconnects += 1
+        return True
+
+    def wake(self):
+        """界面状态变了：马上报告给采集进程"""
+        self._wake_event.set()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        if self.reader is not None:
+            self.reader.close()
+
+
+def service_name(args):
+    """共享内存名称：指定了 --only/--disable 时按所选的指标区分，不同选择各用一个采集进程"""
+    name = args.shared or default_name()
+    only = sorted(args.only) if args.only is not None else None
+    disable = sorted(args.disable or ())
+    if only is None and not disable:
+        return name
+    key = f"{','.join(only) if only is not None else '*'}-{','.join(disable)}"
+    return f"{name}_{zlib.crc32(key.encode('utf-8')):08x}"
+
+
+def service_arguments(args):
+    """把需要与采集进程一致的命令行参数原样传过去"""
+    argv = ['--backend', args.backend]
+    # 被禁用的指标在采集进程中也不创建（连模块都不导入）
+    if args.only is not None:
+        argv += ['--only', ",".join(args.only)]
+    if args.disable:
+        argv += ['--disable', ",".join(args.disable)]
+    for option in ('net_include', 'net_exclude', 'disk_include', 'disk_exclude'):
+        value = getattr(args, option, None)
+        if value is not None:
+            argv += ['--' + option.replace('_', '-'), ",".join(value)]
+    if getattr(args, 'high_res', None):
+        argv += ['--high-res', str(args.high_res)]
+    if getattr(args, 'pressure_cgroup', None):
+        argv += ['--pressure-cgroup', args.pressure_cgroup]
+    if getattr(args, 'pressure_trigger', None) is not None:
+        argv += ['--pressure-trigger', str(args.pressure_trigger)]
+    return argv
+
+
+def _remove_stale(name, pid):
+    """删掉已经退出的采集进程留下的共享内存（确认仍是那个进程的，避免删掉别的实例刚启动的）"""
+    from multiprocessing import shared_memory
+
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    try:
+        if CONTROL.unpack_from(memory.buf, 0)[3] == pid:
+            memory.unlink()
+    finally:
+        memory.close()
+
+
+def _ready_reader(name, argv):
+    """连接已有的、采集进程还活着的共享内存，没有时返回 None"""
+    try:
+        reader = SharedSnapshotReader(name)
+    except (FileNotFoundError, ValueError):
+        # ValueError：采集进程刚创建共享内存，还没写入控制区
+        return None
+    if not reader.service_alive():
+        pid = reader.service_pid()
+        reader.close()
+        if pid:
+            _remove_stale(name, pid)
+        return None
+    reader.argv = list(argv)
+    return reader
+
+
+def connect(name=None, argv=(), timeout=5.0):
+    """连接采集进程，没有（或已经异常退出）时在后台启动一个并等待它就绪"""
+    name = name or default_name()
+    reader = _ready_reader(name, argv)
+    if reader is not None:
+        return reader
+
+    import subprocess
+
+    command = [sys.executable, os.path.join(HERE, 'shared.py'), '--name', name, *argv]
+    options = {}
+    if os.name == 'nt':
+        options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options['start_new_session'] = True
+    subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, close_fds=True, **options)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        reader = _ready_reader(name, argv)
+        if reader is not None:
+            return reader
+        if time.monotonic() >= deadline:
+            raise OSError(f"采集进程 {name} 没有在 {timeout:g} 秒内启动")
+        time.sleep(0.05)
+
+
+def add_shared_arguments(parser):
+    parser.add_argument('--shared', nargs='?', const='', default=None, metavar='NAME',
+                        help="与其他实例共用一个后台采集进程（没有时自动启动），可以指定共享内存名称")
+
+
+def serve(name, linger=30.0, check_interval=0.25, enabled=None, disabled=()):
+    """采集进程主循环：按各实例的界面状态采样，没有实例后 linger 秒退出（0 表示一直运行）"""
+    writer = SharedSnapshotWriter(name)
+    providers = REGISTRY.create(enabled=enabled, disabled=disabled, extra=('self',))
+    scheduler = SamplingScheduler(providers, mode=COLLAPSED)
+    collector = MetricCollector(providers, scheduler=scheduler)
+    thread = CollectorThread(collector, writer.publish)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    thread.start()
+    last_reader = time.monotonic()
+    try:
+        while not stop.wait(check_interval):
+            readers = writer.readers()
+            if readers:
+                last_reader = time.monotonic()
+                mode = CODE_MODES[max(MODE_CODES[m] for _, m in readers)]
+            else:
+                mode = HIDDEN
+                if linger and time.monotonic() - last_reader > linger:
+                    break
+            if scheduler.mode != mode:
+                scheduler.set_mode(mode)
+                thread.wake()
+    finally:
+        thread.stop()
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NotosIsland 共享采集进程")
+    parser.add_argument('--name', default=None, help="共享内存名称，默认每个用户一个")
+    parser.add_argument('--linger', type=float, default=30.0,
+                        help="所有实例退出后再等多少秒结束，0 表示一直运行")
+    parser.add_argument('--only', type=names_list, default=None, metavar='NAME[,NAME...]', help="只启用这些指标")
+    parser.add_argument('--disable', type=names_list, default=(), metavar='NAME[,NAME...]', help="禁用这些指标")
+    add_device_arguments(parser)
+    add_pressure_arguments(parser)
+    backends.add_backend_argument(parser)
+    args = parser.parse_args(argv)
+    apply_device_arguments(args)
+    apply_pressure_arguments(args)
+    try:
+        backends.select(args.backend)
+    except OSError as e:
+        print(f"无法使用 {args.backend} 后端: {e}", file=sys.stderr)
+        return 2
+    try:
+        serve(args.name or default_name(), linger=args.linger, enabled=args.only, disabled=args.disable)
+    except FileExistsError:
+        # 另一个实例同时启动了采集进程
+        return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""持久化的历史记录：定长、内存映射的环形文件，退出后数据还在，可以回放
+
+文件结构（小端）：
+    文件头   magic(8s) 版本(H) 层数(H) 指标数(I) 名称长度(I)
+    名称     JSON 数组，补齐到 8 字节
+    层级表   每层 桶秒数(I) 容量(I) 写入位置(I) 条数(I) 数据偏移(Q)
+    数据区   每层 容量 条记录，每条为 时间戳(d) + 每个指标一个 float(f)
+
+默认三层：1 秒（保留 6 小时）、1 分钟（保留 7 天）、1 小时（保留 90 天），二十来个指标时
+整个文件约 4MB。每层记录的是桶内所有采样的平均值，缺失的指标记为 NaN。追加一条记录就是
+一次 pack_into 写进映射内存。
+
+写入时在旁边的 FILE.lock 上加排他锁，同一个文件同时只能有一个实例在记录；另一个实例再用
+--record 写同一个文件会报错并不记录（请给它另指一个文件）。
+
+    python main_v1.2.py --record                       # 记录到默认文件
+    python main_v1.2.py --replay ~/.notos_history.bin --speed 60
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'NOTOSHST'
+VERSION = 1
+HEADER = struct.Struct('<8sHHII')
+TIER = struct.Struct('<IIIIQ')
+
+# 默认层级：(桶秒数, 容量)
+DEFAULT_TIERS = ((1, 6 * 3600), (60, 7 * 24 * 60), (3600, 90 * 24))
+TIER_NAMES = {'1s': 0, '1m': 1, '1h': 2}
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.notos_history.bin')
+
+
+def series_names(providers):
+    """所有提供者可能产生的序列名（顺序固定，决定记录中各 float 的位置）"""
+    names = []
+    for provider in providers:
+        if provider.fields:
+            names.extend(f"{provider.name}.{field}" for field in provider.fields)
+        elif provider.row != 'devices':
+            # 设备行（最忙设备、进程）不写入历史记录
+            names.append(provider.name)
+    return names
+
+
+class FileLock:
+    """跨进程的排他锁（POSIX 上用 flock，Windows 上用 msvcrt.locking），已被占用时抛 OSError
+
+    锁加在单独的锁文件上：重建历史文件时旧文件会被改名，锁不能跟着它走。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.file.close()
+            raise
+
+    def release(self):
+        if self.file is not None:
+            # 关闭文件即释放锁
+            self.file.close()
+            self.file = None
+
+
+class HistoryStore:
+    """内存映射的多层环形历史文件"""
+
+    def __init__(self, path, names=None, tiers=DEFAULT_TIERS, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self.file_lock = None
+        if not readonly:
+            try:
+                self.file_lock = FileLock(path + '.lock')
+            except OSError as e:
+                raise OSError(e.errno, f"已有其他实例在记录到这个文件，请用 --record FILE 另指一个文件"
+                                       f"（{e.strerror or e}）") from e
+        try:
+            if readonly or (names is None and os.path.exists(path)):
+                self._open_existing()
+            else:
+                self._open_or_create(list(names), tiers)
+        except Exception:
+            self.close()
+            raise
+        self.record = struct.Struct('<d%df' % len(self.names))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        # 各层正在累积的桶：[桶开始时间, 各指标之和, 各指标计数]
+        self.pending = [None] * len(self.tiers)
+        if not readonly:
+            self._restore_pending(time.time())
+
+    def _open_existing(self):
+        """打开已有的文件；不是历史记录文件或文件被截断时抛 ValueError"""
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER.size)
+            size = os.fstat(f.fileno()).st_size
+        if len(header) < HEADER.size:
+            raise ValueError(f"{self.path} 不是历史记录文件（文件太短）")
+        magic, version, tier_count, metric_count, names_length = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} 不是历史记录文件")
+        tier_offset = HEADER.size + _pad(names_length)
+        if tier_offset + TIER.size * tier_count > size:
+            raise ValueError(f"{self.path} 已损坏（文件被截断）")
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self.file = open(self.path, 'rb' if self.readonly else 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+        try:
+            self.names = json.loads(bytes(self.map[HEADER.size:HEADER.size + names_length]))
+            self.tier_offset = tier_offset
+            self.tiers = [list(TIER.unpack_from(self.map, tier_offset + TIER.size * i))
+                          for i in range(tier_count)]
+            record_size = 8 + 4 * metric_count
+            if not isinstance(self.names, list) or len(self.names) != metric_count:
+                raise ValueError(f"{self.path} 已损坏（指标名称与文件头不符）")
+            for bucket, capacity, head, used, data_offset in self.tiers:
+                if not bucket or not capacity or head >= capacity or used > capacity \
+                        or data_offset + capacity * record_size > size:
+                    raise ValueError(f"{self.path} 已损坏（文件被截断或层级表有误）")
+        except ValueError:
+            self._unmap()
+            raise
+
+    def _open_or_create(self, names, tiers):
+        if os.path.exists(self.path):
+            try:
+                self._open_existing()
+                if self.names == names:
+                    return
+                self._unmap()
+            except (OSError, ValueError, struct.error):
+                pass
+            # 指标集合变了（例如换了 --only），旧文件留作备份，重新开始
+            os.replace(self.path, self.path + '.old')
+
+        names_bytes = json.dumps(names).encode('utf-8')
+        record_size = 8 + 4 * len(names)
+        tier_offset = HEADER.size + _pad(len(names_bytes))
+        data_offset = tier_offset + TIER.size * len(tiers)
+        table = []
+        for bucket, capacity in tiers:
+            table.append([bucket, capacity, 0, 0, data_offset])
+            data_offset += capacity * record_size
+
+        with open(self.path, 'wb') as f:
+            f.truncate(data_offset)
+            f.write(HEADER.pack(MAGIC, VERSION, len(tiers), len(names), len(names_bytes)))
+            f.write(names_bytes)
+            f.seek(tier_offset)
+            for entry in table:
+                f.write(TIER.pack(*entry))
+        self._open_existing()
+
+    def _unmap(self):
+        if getattr(self, 'map', None) is not None:
+            if not self.readonly:
+                self.map.flush()
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+    def close(self):
+        self._unmap()
+        if self.file_lock is not None:
+            self.file_lock.release()
+            self.file_lock = None
+
+    def append(self, timestamp, values):
+        """写入一次采样：values 为 {序列名: 数值}，按各层的桶累积，桶结束时写一条平均值"""
+        row = [float('nan')] * len(self.names)
+        index = self.index
+        for name, value in values.items():
+            position = index.get(name)
+            if position is not None:
+                row[position] = value
+        with self.lock:
+            for tier_index, tier in enumerate(self.tiers):
+                bucket_start = timestamp - timestamp % tier[0]
+                pending = self.pending[tier_index]
+                if pending is not None and pending[0] != bucket_start:
+                    self._write_bucket(tier_index, pending)
+                    pending = None
+                if pending is None:
+                    pending = self.pending[tier_index] = [bucket_start, [0.0] * len(row), [0] * len(row)]
+                sums, counts = pending[1], pending[2]
+                for position, value in enumerate(row):
+                    if value == value:  # 跳过 NaN
+                        sums[position] += value
+                        counts[position] += 1
+
+    def flush(self):
+        """把尚未结束的桶也写进去（退出时调用）"""
+        with self.lock:
+            for tier_index, pending in enumerate(self.pending):
+                if pending is not None:
+                    self._write_bucket(tier_index, pending)
+                    self.pending[tier_index] = None
+            self.map.flush()
+
+    def _write_bucket(self, tier_index, pending):
+        bucket_start, sums, counts = pending
+        averages = [s / c if c else float('nan') for s, c in zip(sums, counts)]
+        tier = self.tiers[tier_index]
+        bucket, capacity, head, used, data_offset = tier
+        last = self._last_record(tier_index)
+        if last is not None and last[0] == bucket_start:
+            # 上次退出时 flush 写进去的同一个桶：原地覆盖，不追加第二条
+            position = (head - 1) % capacity
+            self.record.pack_into(self.map, data_offset + position * self.record.size, bucket_start, *averages)
+            return
+        self.record.pack_into(self.map, data_offset + head * self.record.size, bucket_start, *averages)
+        tier[2] = (head + 1) % capacity
+        tier[3] = min(used + 1, capacity)
+        TIER.pack_into(self.map, self.tier_offset + TIER.size * tier_index, *tier)
+
+    def _last_record(self, tier_index):
+        """某一层最后一条记录 (时间戳, 各指标数值)，没有记录时返回 None"""
+        bucket, capacity, head, used, data_offset = self.tiers[tier_index]
+        if not used:
+            return None
+        timestamp, *values = self.record.unpack_from(self.map, data_offset + (head - 1) % capacity * self.record.size)
+        return timestamp, values
+
+    def _restore_pending(self, now):
+        """接着上次退出时还没结束的桶继续累积
+
+        上次退出时 flush 把没结束的桶按已有的采样写成了一条平均值。较粗的层用最细一层里落在
+        这个桶内的记录重建各指标之和与计数，这样平均值仍然按采样次数计算；最细一层找不到记录
+        时把那条平均值当作一次采样。桶写出时与最后一条记录的时间相同，会原地覆盖它。
+        """
+        for tier_index, (bucket, capacity, head, used, data_offset) in enumerate(self.tiers):
+            last = self._last_record(tier_index)
+            if last is None or now >= last[0] + bucket:
+                continue
+            bucket_start, values = last
+            sums, counts = [0.0] * len(values), [0] * len(values)
+            if tier_index > 0:
+                for timestamp, record in self.records(0, since=bucket_start):
+                    if timestamp < bucket_start + bucket:
+                        for name, value in record.items():
+                            sums[self.index[name]] += value
+                            counts[self.index[name]] += 1
+            if not any(counts):
+                for position, value in enumerate(values):
+                    if value == value:
+                        sums[position], counts[position] = value, 1
+            self.pending[tier_index] = [bucket_start, sums, counts]
+
+    def records(self, tier='1s', since=None):
+        """按时间顺序返回某一层的 [(时间戳, {序列名: 数值}), ...]，NaN 的指标不包含在内"""
+        bucket, capacity, head, used, data_offset = self.tiers[TIER_NAMES.get(tier, tier)]
+        size = self.record.size
+        start = (head - used) % capacity
+        result = []
+        for i in range(used):
+            position = (start + i) % capacity
+            timestamp, *values = self.record.unpack_from(self.map, data_offset + position * size)
+            if since is not None and timestamp < since:
+                continue
+            result.append((timestamp, {name: value for name, value in zip(self.names, values)
+                                       if not math.isnan(value)}))
+        return result
+
+    def publisher(self, providers, callback):
+        """包装采集线程的回调：先把快照写进历史文件，再交给原来的回调"""
+        def publish(snapshot):
+            values = {}
+            for provider in providers:
+                for name, value in provider.series(snapshot.values.get(provider.name)):
+                    values[name] = value
+            self.append(time.time(), values)
+            callback(snapshot)
+        return publish
+
+
+def _pad(length):
+    return (length + 7) // 8 * 8
+
+
+class ReplayThread(threading.Thread):
+    """把记录下来的历史按 N 倍速重新交给界面，接口与 CollectorThread 相同"""
+
+    max_pause = 2.0  # 记录中的空档（程序没在运行的时间）最多停顿这么久
+
+    def __init__(self, store, collector, callback, speed=1.0, tier='1s'):
+        if not speed > 0:
+            raise ValueError(f"回放速度必须大于 0: {speed}")
+        super().__init__(name="NotosReplay", daemon=True)
+        self.store = store
+        self.collector = collector
+        self.callback = callback
+        self.speed = speed
+        self.tier = tier
+        self._stop_event = threading.Event()
+
+    def run(self):
+        previous = None
+        for timestamp, values in self.store.records(self.tier):
+            if previous is not None:
+                pause = min((timestamp - previous) / self.speed, self.max_pause)
+                if self._stop_event.wait(pause):
+                    return
+            elif self._stop_event.is_set():
+                return
+            previous = timestamp
+            label = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+            self.callback(self.collector.replay(values, f"回放 {label}"))
+
+    def wake(self):
+        pass
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        self.store.close()
+
+
+def positive_speed(text):
+    """--speed 的参数类型：大于 0 的倍数"""
+    try:
+        speed = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"不是数字: {text!r}")
+    if not speed > 0:
+        raise argparse.ArgumentTypeError(f"回放速度必须大于 0: {text}")
+    return speed
+
+
+def add_store_arguments(parser, replay=True):
+    parser.add_argument('--record', nargs='?', const=DEFAULT_PATH, default=None, metavar='FILE',
+                        help=f"把采样写进持久化的历史文件，默认 {DEFAULT_PATH}")
+    if replay:
+        parser.add_argument('--replay', default=None, metavar='FILE',
+                            help="不采样，把历史文件中的记录回放到界面上")
+        parser.add_argument('--speed', type=positive_speed, default=10.0, help="回放速度倍数，默认 10")
+        parser.add_argument('--tier', choices=list(TIER_NAMES), default='1s', help="回放哪一层，默认 1s")
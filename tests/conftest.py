@@ -0,0 +1,16 @@
+import os
+import sys
+import time
+
+# 模块都在仓库根目录下，没有打包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def wait_for(predicate, timeout=5.0, interval=0.02):
+    """等到 predicate() 为真，超时返回 False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
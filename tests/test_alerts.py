@@ -0,0 +1,87 @@
+"""告警规则的解析和判断，以及通知、钩子命令失败时的错误记录"""
+import subprocess
+
+import pytest
+
+import alerts
+from instrumentation import Instrumentation
+from providers import REGISTRY
+
+
+def make_engine(rules, notifier=None, instruments=None):
+    return alerts.AlertEngine(alerts.load_rules(rules, []), REGISTRY.create(enabled=['cpu']),
+                              notifier=notifier, instruments=instruments)
+
+
+def test_parse_rule():
+    rule = alerts.parse_rule("cpu > 90 for 30s clear 80 critical notify run 'echo hi'")
+    assert (rule.series, rule.operator, rule.threshold) == ('cpu', '>', 90.0)
+    assert (rule.duration, rule.clear, rule.level) == (30.0, 80.0, 'critical')
+    assert rule.notify and rule.command == 'echo hi'
+
+
+@pytest.mark.parametrize('text', ["cpu", "cpu >> 90", "cpu > 90 for", "cpu > 90 loudly"])
+def test_parse_rule_rejects(text):
+    with pytest.raises(ValueError):
+        alerts.parse_rule(text)
+
+
+def test_unknown_series_is_rejected():
+    with pytest.raises(ValueError):
+        make_engine(["gpu > 1"])
+
+
+def test_rule_fires_after_duration_and_clears():
+    engine = make_engine(["cpu > 50 for 10 clear 40"])
+    assert engine.evaluate(0, {'cpu': 60}) == []
+    assert len(engine.evaluate(10, {'cpu': 60})) == 1
+    assert dict(engine.active) == {'cpu': 'warning'}
+    assert engine.evaluate(11, {'cpu': 45}) == []
+    assert len(engine.evaluate(12, {'cpu': 30})) == 1
+    assert dict(engine.active) == {}
+
+
+def test_notifier_failure_is_recorded():
+    instruments = Instrumentation()
+    engine = make_engine(["cpu > 1 notify"], notifier=lambda title, message: False, instruments=instruments)
+    engine.evaluate(0, {'cpu': 50})
+    assert instruments.error_counts == {'alerts.notify': 1}
+
+
+def test_notifier_failure_without_instruments_goes_to_stderr(capsys):
+    engine = make_engine(["cpu > 1 notify"], notifier=lambda title, message: False)
+    engine.evaluate(0, {'cpu': 50})
+    assert capsys.readouterr().err
+
+
+def test_notifier_exception_is_recorded():
+    def notifier(title, message):
+        raise RuntimeError("boom")
+
+    instruments = Instrumentation()
+    engine = make_engine(["cpu > 1 notify"], notifier=notifier, instruments=instruments)
+    assert len(engine.evaluate(0, {'cpu': 50})) == 1
+    assert instruments.error_counts == {'alerts.notify': 1}
+    assert 'boom' in instruments.errors[-1][2]
+
+
+def test_successful_notification_records_nothing(capsys):
+    sent = []
+    instruments = Instrumentation()
+    engine = make_engine(["cpu > 1 notify"], notifier=lambda *args: sent.append(args) or True,
+                         instruments=instruments)
+    engine.evaluate(0, {'cpu': 50})
+    assert len(sent) == 1 and instruments.error_counts == {}
+    assert capsys.readouterr().err == ""
+
+
+def test_command_failure_is_recorded(monkeypatch):
+    def popen(*args, **kwargs):
+        raise OSError("no shell")
+
+    monkeypatch.setattr(subprocess, 'Popen', popen)
+    instruments = Instrumentation()
+    engine = make_engine(["cpu > 1 run 'true'"], instruments=instruments)
+    engine.evaluate(0, {'cpu': 50})
+    assert instruments.error_counts == {'alerts.command': 1}
+    assert engine.processes == []
@@ -0,0 +1,93 @@
+"""用一个假的 nvidia-smi 脚本（NOTOS_NVIDIA_SMI）测试常驻进程的读取、重启和回退"""
+import os
+import sys
+
+import pytest
+
+from conftest import wait_for
+from gpu_backend import GpuRecord, NvidiaSmiStream, parse_line
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="假的 nvidia-smi 是带 shebang 的脚本")
+
+# 参数：输出几轮后退出（0 表示一直输出）、第一次输出前等待的秒数
+FAKE_SMI = """#!{python}
+import sys, time
+rounds = int({rounds!r})
+time.sleep({delay!r})
+n = 0
+while True:
+    print("0, 37, 55, 1000, 8000")
+    print("1, [N/A], 61, 2000, 8000")
+    sys.stdout.flush()
+    n += 1
+    if rounds and n >= rounds:
+        sys.exit(1)
+    time.sleep(0.05)
+"""
+
+
+def fake_smi(tmp_path, rounds=0, delay=0.0):
+    path = tmp_path / 'nvidia-smi'
+    path.write_text(FAKE_SMI.format(python=sys.executable, rounds=rounds, delay=delay))
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def stream():
+    streams = []
+
+    def make(executable, **kwargs):
+        streams.append(NvidiaSmiStream(executable, **kwargs))
+        return streams[-1]
+
+    yield make
+    for s in streams:
+        s.stop()
+
+
+def test_parse_line():
+    assert parse_line("0, 37, 55, 1000, 8000") == GpuRecord(0, 37.0, 55.0, 1000.0, 8000.0)
+    assert parse_line("1, [N/A], 61, 2000, 8000").utilization is None
+    assert parse_line("garbage") is None
+    assert parse_line("x, 1, 2, 3, 4") is None
+
+
+def test_reads_latest_records(tmp_path, stream):
+    s = stream(fake_smi(tmp_path), interval_ms=50).start()
+    assert wait_for(lambda: len(s.latest()) == 2)
+    first, second = s.latest()
+    assert (first.index, first.utilization, first.temperature) == (0, 37.0, 55.0)
+    assert (second.index, second.utilization, second.temperature) == (1, None, 61.0)
+    assert s.got_data and not s.starting()
+    assert '-lms' in s.command() and '50' in s.command()
+
+
+def test_restarts_after_exit(tmp_path, stream):
+    s = stream(fake_smi(tmp_path, rounds=1), interval_ms=50).start()
+    assert wait_for(lambda: s.restarts >= 2, timeout=10.0)
+    assert s.available
+
+
+def test_missing_executable(tmp_path, stream):
+    s = stream(str(tmp_path / 'missing')).start()
+    assert wait_for(lambda: not s.available)
+    assert not s.starting()
+    assert s.latest() == []
+
+
+def test_source_waits_for_first_output(tmp_path, monkeypatch):
+    """第一次输出之前既不记失败，也不回退到 GPUtil"""
+    monkeypatch.setenv('NOTOS_NVIDIA_SMI', fake_smi(tmp_path, delay=1.0))
+    monkeypatch.delitem(sys.modules, 'GPUtil', raising=False)
+    from gpu_providers import GpuSource
+    from health import OK
+
+    source = GpuSource(cache_time=0)
+    try:
+        assert source.read() is None
+        assert source.smi_health.state == OK
+        assert 'GPUtil' not in sys.modules
+        assert wait_for(lambda: source.read() == [(37.0, 55.0), (None, 61.0)])
+    finally:
+        source.stream.stop()
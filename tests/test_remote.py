@@ -0,0 +1,166 @@
+"""在本机起两个代理，用 RemoteFleet 轮询它们"""
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import remote
+from collector import Snapshot
+from conftest import wait_for
+from health import OK
+from providers import REGISTRY
+
+
+def free_port(family=socket.AF_INET, address='127.0.0.1'):
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        s.bind((address, 0))
+        return s.getsockname()[1]
+
+
+def ipv6_available():
+    try:
+        free_port(socket.AF_INET6, '::1')
+    except OSError:
+        return False
+    return True
+
+
+class LocalAgent:
+    """在后台线程的事件循环里运行一个代理"""
+
+    def __init__(self, address, port, cpu):
+        self.address = address
+        self.port = port
+        providers = REGISTRY.create(enabled=['cpu', 'mem'])
+        self.agent = remote.Agent(providers)
+        self.agent.update(Snapshot(time.monotonic(), {'cpu': cpu, 'mem': 40.0},
+                                   {p.name: p.format({'cpu': cpu, 'mem': 40.0}[p.name]) for p in providers},
+                                   {p.name: (OK, "") for p in providers}))
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        ready = threading.Event()
+
+        def begin():
+            self.task = self.loop.create_task(self.agent.serve(self.address, self.port))
+            ready.set()
+
+        self.loop.call_soon_threadsafe(begin)
+        ready.wait(2.0)
+        # 等到端口真的在监听
+        family = socket.AF_INET6 if ':' in self.address else socket.AF_INET
+        assert wait_for(lambda: self._connectable(family))
+        return self
+
+    def _connectable(self, family):
+        try:
+            with socket.create_connection((self.address, self.port), timeout=0.2):
+                return True
+        except OSError:
+            return False
+
+    def stop(self):
+        async def shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(2.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(2.0)
+        self.loop.close()
+
+
+@pytest.fixture
+def agents():
+    started = []
+
+    def start(address, cpu):
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        started.append(LocalAgent(address, free_port(family, address), cpu).start())
+        return started[-1]
+
+    yield start
+    for agent in started:
+        agent.stop()
+
+
+@pytest.fixture
+def fleet():
+    fleets = []
+
+    def start(hosts):
+        results = {}
+
+        def callback(statuses):
+            results.update(statuses)
+
+        fleets.append(remote.RemoteFleet(hosts, callback, interval=0.1, timeout=0.5))
+        fleets[-1].start()
+        return results
+
+    yield start
+    for f in fleets:
+        f.stop()
+
+
+@pytest.mark.parametrize('host, expected', [
+    ('build1', ('build1', remote.DEFAULT_PORT)),
+    ('build1:9200', ('build1', 9200)),
+    ('10.0.0.5:9200', ('10.0.0.5', 9200)),
+    ('::1', ('::1', remote.DEFAULT_PORT)),
+    ('[::1]', ('::1', remote.DEFAULT_PORT)),
+    ('[::1]:9300', ('::1', 9300)),
+    ('fe80::1%eth0', ('fe80::1%eth0', remote.DEFAULT_PORT)),
+])
+def test_split_host(host, expected):
+    assert remote.split_host(host) == expected
+
+
+@pytest.mark.parametrize('host', ['[::1', '[::1]x', 'build1:http', 'build1:70000'])
+def test_split_host_rejects(host):
+    with pytest.raises(ValueError):
+        remote.split_host(host)
+
+
+def test_agent_creates_only_carried_providers():
+    providers = REGISTRY.create(enabled=['cpu', 'cores', 'net_top', 'procs'])
+    assert [p.name for p in providers if remote.carried(p)] == ['cpu', 'cores']
+
+
+def test_fleet_polls_two_agents(agents, fleet):
+    first = agents('127.0.0.1', 12.0)
+    second = agents('127.0.0.1', 34.0)
+    hosts = [f"127.0.0.1:{first.port}", f"127.0.0.1:{second.port}"]
+    results = fleet(hosts)
+    assert wait_for(lambda: all(results.get(h) is not None and results[h].state == OK for h in hosts))
+    assert results[hosts[0]].data['values']['cpu'] == 12.0
+    assert results[hosts[1]].data['values']['cpu'] == 34.0
+    assert remote.status_text(results[hosts[0]]) == f"{hosts[0]}  12.0%  40.0%"
+    # 长连接：每台主机一条连接上反复请求
+    assert wait_for(lambda: first.agent.requests >= 3 and second.agent.requests >= 3)
+
+
+@pytest.mark.skipif(not ipv6_available(), reason="本机没有 IPv6 回环地址")
+def test_fleet_polls_ipv6_agent(agents, fleet):
+    agent = agents('::1', 56.0)
+    host = f"[::1]:{agent.port}"
+    results = fleet([host])
+    assert wait_for(lambda: results.get(host) is not None and results[host].state == OK)
+    assert results[host].data['values']['cpu'] == 56.0
+
+
+def test_dead_host_does_not_block_others(agents, fleet):
+    alive = agents('127.0.0.1', 12.0)
+    hosts = [f"127.0.0.1:{alive.port}", f"127.0.0.1:{free_port()}"]
+    results = fleet(hosts)
+    assert wait_for(lambda: results.get(hosts[0]) is not None and results[hosts[0]].state == OK
+                    and results.get(hosts[1]) is not None and results[hosts[1]].error is not None)
+    assert results[hosts[1]].state != OK
+    assert results[hosts[1]].data is None
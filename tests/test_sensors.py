@@ -0,0 +1,94 @@
+"""用一棵假的 sysfs 目录树（NOTOS_SYSFS_ROOT）测试温度传感器的发现、挑选和读取"""
+import os
+
+import pytest
+
+import sensors
+from providers import CpuTempProvider
+
+
+def make_hwmon(root, index, name, temps):
+    """temps 为 [(编号, 标签或 None, 千分之一摄氏度), ...]"""
+    hwmon = root / 'sys' / 'class' / 'hwmon' / f'hwmon{index}'
+    hwmon.mkdir(parents=True)
+    (hwmon / 'name').write_text(name + "\n")
+    for number, label, value in temps:
+        (hwmon / f'temp{number}_input').write_text(f"{value}\n")
+        if label is not None:
+            (hwmon / f'temp{number}_label').write_text(label + "\n")
+    return hwmon
+
+
+def make_zone(root, index, zone_type, value):
+    zone = root / 'sys' / 'class' / 'thermal' / f'thermal_zone{index}'
+    zone.mkdir(parents=True)
+    (zone / 'type').write_text(zone_type + "\n")
+    (zone / 'temp').write_text(f"{value}\n")
+    return zone
+
+
+@pytest.fixture
+def sysfs(tmp_path, monkeypatch):
+    monkeypatch.setenv('NOTOS_SYSFS_ROOT', str(tmp_path))
+    return tmp_path
+
+
+def test_discover_hwmon_and_thermal_zones(sysfs):
+    make_hwmon(sysfs, 0, 'acpitz', [(1, None, 40000)])
+    make_hwmon(sysfs, 1, 'coretemp', [(1, 'Package id 0', 52000), (2, 'Core 0', 50000)])
+    make_zone(sysfs, 0, 'x86_pkg_temp', 53000)
+    found = sensors.discover()
+    assert [(s.chip, s.label) for s in found] == [
+        ('acpitz', 'acpitz'), ('coretemp', 'Package id 0'), ('coretemp', 'Core 0'),
+        ('x86_pkg_temp', 'x86_pkg_temp'),
+    ]
+
+
+def test_cpu_sensors_prefers_package_temperature(sysfs):
+    make_hwmon(sysfs, 0, 'acpitz', [(1, None, 40000)])
+    make_hwmon(sysfs, 1, 'coretemp', [(1, 'Package id 0', 52000), (2, 'Core 0', 50000)])
+    make_hwmon(sysfs, 2, 'coretemp', [(1, 'Package id 1', 58000)])
+    chosen = sensors.cpu_sensors(sensors.discover())
+    assert [s.label for s in chosen] == ['Package id 0', 'Package id 1']
+
+
+def test_cpu_sensors_falls_back_to_acpi(sysfs):
+    make_hwmon(sysfs, 0, 'nvme', [(1, 'Composite', 35000)])
+    make_hwmon(sysfs, 1, 'acpitz', [(1, None, 40000)])
+    assert [s.chip for s in sensors.cpu_sensors(sensors.discover())] == ['acpitz']
+
+
+def test_reader_rereads_open_files(sysfs):
+    hwmon = make_hwmon(sysfs, 0, 'k10temp', [(1, 'Tctl', 61000), (2, 'Tdie', 51500)])
+    reader = sensors.TemperatureReader(sensors.cpu_sensors(sensors.discover()))
+    try:
+        assert reader.read() == 51.5
+        (hwmon / 'temp2_input').write_text("63250\n")
+        assert reader.read() == 63.25
+    finally:
+        reader.close()
+
+
+def test_provider_without_sensors_is_unavailable(sysfs):
+    from health import UNAVAILABLE
+
+    provider = CpuTempProvider()
+    provider.open()
+    try:
+        assert provider.health.state == UNAVAILABLE
+        assert provider.sample() is None
+    finally:
+        provider.close()
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="Windows 上 CPU 温度不读 sysfs")
+def test_provider_reads_highest_package_temperature(sysfs):
+    make_hwmon(sysfs, 0, 'coretemp', [(1, 'Package id 0', 52000)])
+    make_hwmon(sysfs, 1, 'coretemp', [(1, 'Package id 1', 58000)])
+    provider = CpuTempProvider()
+    provider.open()
+    try:
+        assert provider.sample() == 58.0
+        assert provider.format(provider.sample()) == "58°C"
+    finally:
+        provider.close()
@@ -0,0 +1,105 @@
+"""历史记录文件：退出再打开不重复写桶、坏文件、文件锁、回放速度"""
+import argparse
+
+import pytest
+
+import store
+from store import HistoryStore, ReplayThread, positive_speed
+
+# 整点，1 分钟和 1 小时的桶都从这里开始
+T0 = 3600 * 472222
+TIERS = ((1, 100), (60, 100), (3600, 10))
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'history.bin')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """打开文件时用来判断桶是否已经结束的“当前时间”"""
+    now = [T0]
+    monkeypatch.setattr(store.time, 'time', lambda: now[0])
+    return now
+
+
+def cpu(records):
+    return [(timestamp - T0, values['cpu']) for timestamp, values in records]
+
+
+def test_flush_then_reopen_does_not_duplicate_bucket(path, clock):
+    history = HistoryStore(path, ['cpu', 'mem'], TIERS)
+    history.append(T0, {'cpu': 10.0})
+    history.append(T0 + 1, {'cpu': 20.0})
+    history.flush()
+    history.close()
+
+    clock[0] = T0 + 2
+    history = HistoryStore(path, ['cpu', 'mem'], TIERS)
+    try:
+        history.append(T0 + 2, {'cpu': 60.0})
+        history.flush()
+        assert cpu(history.records('1s')) == [(0, 10.0), (1, 20.0), (2, 60.0)]
+        # 同一个桶只有一条，平均值按三次采样计算，而不是 (15 + 60) / 2
+        assert cpu(history.records('1m')) == [(0, 30.0)]
+        assert cpu(history.records('1h')) == [(0, 30.0)]
+        assert history.records('1m')[0][1] == {'cpu': 30.0}
+    finally:
+        history.close()
+
+
+def test_reopen_after_bucket_ended_appends(path, clock):
+    history = HistoryStore(path, ['cpu'], TIERS)
+    history.append(T0, {'cpu': 10.0})
+    history.flush()
+    history.close()
+
+    clock[0] = T0 + 90
+    history = HistoryStore(path, ['cpu'], TIERS)
+    try:
+        history.append(T0 + 90, {'cpu': 30.0})
+        history.flush()
+        assert cpu(history.records('1m')) == [(0, 10.0), (60, 30.0)]
+        assert cpu(history.records('1h')) == [(0, 20.0)]
+    finally:
+        history.close()
+
+
+def test_foreign_file_is_rejected(path):
+    with open(path, 'wb') as f:
+        f.write(b'not a history file at all')
+    with pytest.raises(ValueError):
+        HistoryStore(path, readonly=True)
+
+
+def test_truncated_file_is_rejected(path):
+    HistoryStore(path, ['cpu'], TIERS).close()
+    with open(path, 'r+b') as f:
+        f.truncate(store.HEADER.size + 64)
+    with pytest.raises(ValueError):
+        HistoryStore(path, readonly=True)
+
+
+def test_second_writer_is_refused(path):
+    history = HistoryStore(path, ['cpu'], TIERS)
+    try:
+        with pytest.raises(OSError):
+            HistoryStore(path, ['cpu'], TIERS)
+        # 只读打开（回放）不受锁影响
+        HistoryStore(path, readonly=True).close()
+    finally:
+        history.close()
+    HistoryStore(path, ['cpu'], TIERS).close()
+
+
+@pytest.mark.parametrize('text', ['0', '-1', 'nan', 'fast'])
+def test_positive_speed_rejects(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive_speed(text)
+
+
+def test_replay_rejects_zero_speed():
+    assert positive_speed('0.5') == 0.5
+    with pytest.raises(ValueError):
+        ReplayThread(None, None, None, speed=0)